@@ -0,0 +1,77 @@
+"""
+bench_catalogs.py
+
+benchmarks for the catalog helpers: the EHB projection, the volcano list and the GCMT helpers
+"""
+from eara2022.utils import get_vol_list
+from eara2022.utils.volcano import VolcanoStore
+from eara2022.utils.ehb_catalog import EHBCatalog
+from eara2022.utils.gcmt import collect_gcmt_information, gcmt_to_psmeca
+from eara2022.utils.project_ehb import project_ehb_catalog
+from eara2022.utils.slice import extend_line
+
+from .fixtures import (SLAB_LINES, synthetic_track, write_ehb_binary_catalog,
+                       write_ehb_catalog, write_gcmt_dir, write_volcanoes)
+
+
+class TimeProjectEHB:
+    """project_ehb_catalog for one slab_base panel"""
+    timeout = 300
+
+    def setup_cache(self):
+        return write_ehb_catalog()
+
+    def time_project_ehb_catalog(self, ehb_path):
+        startlon, startlat, endlon, endlat = SLAB_LINES[1]
+        start = (startlon, startlat)
+        end = extend_line(start, (endlon, endlat), 25)
+        project_ehb_catalog(start, end, width=100,
+                            degree_limit=25, ehb_catalog=ehb_path)
+
+
+class TimeEHBSwath:
+    """the candidate events of the ingested catalog for one slab_base panel"""
+
+    def setup_cache(self):
+        return write_ehb_binary_catalog()
+
+    def setup(self, catalog_dir):
+        self.catalog = EHBCatalog(catalog_dir)
+        startlon, startlat, endlon, endlat = SLAB_LINES[1]
+        self.start = (startlon, startlat)
+        self.end = extend_line(self.start, (endlon, endlat), 25)
+
+    def time_swath(self, catalog_dir):
+        self.catalog.swath(self.start, self.end, 100, 25)
+
+
+class TimeVolcanoes:
+    def setup_cache(self):
+        return write_volcanoes()
+
+    def setup(self, volcano_path):
+        self.store = VolcanoStore.from_tsv(volcano_path)
+        self.lons, self.lats = synthetic_track()
+
+    def time_get_vol_list(self, volcano_path):
+        # the store is parsed in the first call, then the filters are vectorised
+        get_vol_list(volcano_path)
+
+    def time_parse_volcano_tsv(self, volcano_path):
+        VolcanoStore.from_tsv(volcano_path)
+
+    def time_near_track(self, volcano_path):
+        self.store.near_track(self.lons, self.lats, max_distance=100)
+
+
+class TimeGCMT:
+    timeout = 600
+
+    def setup_cache(self):
+        return write_gcmt_dir()
+
+    def time_gcmt_to_psmeca(self, gcmt_dir):
+        gcmt_to_psmeca(gcmt_dir)
+
+    def time_collect_gcmt_information(self, gcmt_dir):
+        collect_gcmt_information(gcmt_dir)
@@ -0,0 +1,25 @@
+"""
+bench_layer_stats.py
+
+benchmarks for eara2022.utils.layer_stats
+"""
+import numpy as np
+from eara2022.utils.layer_stats import layer_stats
+
+from .fixtures import MODEL_DEPTH, MODEL_LATITUDE, synthetic_model
+
+
+class TimeLayerStats:
+    """the 1D reference of a production size volume, with the mask"""
+    params = [[5, 20]]
+    param_names = ["chunk_size"]
+    timeout = 600
+
+    def setup(self, chunk_size):
+        self.volume = synthetic_model().data
+        self.mask = np.random.default_rng(2022).uniform(
+            0, 1, self.volume.shape).astype(np.float32)
+
+    def time_layer_stats(self, chunk_size):
+        layer_stats(lambda start, end: self.volume[:, :, start:end], MODEL_DEPTH, MODEL_LATITUDE,
+                    mask=self.mask, chunk_size=chunk_size)
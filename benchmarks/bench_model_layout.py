@@ -0,0 +1,75 @@
+"""
+bench_model_layout.py
+
+benchmarks for eara2022.utils.model_layout
+"""
+import os
+import tempfile
+from os.path import join
+
+import numpy as np
+import xarray as xr
+from eara2022.utils.model_layout import ModelLayouts, layout_paths, write_layouts
+from eara2022.utils.slice import model_interp
+
+from .fixtures import MODEL_DEPTH, MODEL_LATITUDE, MODEL_LONGITUDE, synthetic_model, synthetic_track
+
+
+def evict(path: str) -> None:
+    # drop the pages of the file from the page cache, so the next read is from the disk
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+class TimeModelLayout:
+    """the profile (a slab_base perturbation panel) and slice (a vpvs_base depth) extraction from the profile and
+    slice layouts, and from the single (longitude, latitude, depth) volume of the model registry, with the cold
+    and warm page cache"""
+    params = [["profile", "slice"], ["profile", "slice", "volume"], ["cold", "warm"]]
+    param_names = ["access", "layout", "cache"]
+    timeout = 300
+
+    def setup_cache(self):
+        directory = tempfile.mkdtemp()
+        model = synthetic_model()
+        write_layouts(model, join(directory, "model"))
+        np.save(join(directory, "model.npy"), model.values)
+        return directory
+
+    def setup(self, directory, access, layout, cache):
+        if access == "profile":
+            self.lons, self.lats = synthetic_track()
+            self.deps = np.linspace(0, 1000, 1001)
+        else:
+            hlon, hlat = np.linspace(83, 155, 301), np.linspace(10, 58, 201)
+            self.lons, self.lats = np.repeat(hlon, len(hlat)), np.tile(hlat, len(hlon))
+            self.deps = np.array([200.])
+        prefix = join(directory, "model")
+        self.paths = [join(directory, "model.npy")] if layout == "volume" else list(layout_paths(prefix))
+        if cache == "warm":
+            self.model = self.attach(directory, layout)
+            self.extract(self.model, layout)
+
+    def attach(self, directory, layout):
+        if layout == "volume":
+            return xr.DataArray(np.load(join(directory, "model.npy"), mmap_mode="r"),
+                                dims=("longitude", "latitude", "depth"),
+                                coords={"longitude": MODEL_LONGITUDE, "latitude": MODEL_LATITUDE, "depth": MODEL_DEPTH})
+        return ModelLayouts(join(directory, "model"))
+
+    def extract(self, model, layout):
+        if layout == "volume":
+            return model_interp(model, self.lons, self.lats, self.deps)
+        return model.interp(self.lons, self.lats, self.deps, layout=layout)
+
+    def time_extract(self, directory, access, layout, cache):
+        if cache == "warm":
+            self.extract(self.model, layout)
+            return
+        # the pages are evicted and the memory maps opened again, the eviction is included in the time
+        for path in self.paths:
+            evict(path)
+        self.extract(self.attach(directory, layout), layout)
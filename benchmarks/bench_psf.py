@@ -0,0 +1,46 @@
+"""
+bench_psf.py
+
+benchmarks for eara2022.utils.psf
+"""
+import numpy as np
+from eara2022.utils.psf import MODEL_SHAPE, get_per, latlondep2xyz_sphere
+
+from .fixtures import (
+    MODEL_DEPTH,
+    MODEL_LATITUDE,
+    MODEL_LONGITUDE,
+    synthetic_psf_list,
+)
+
+
+class TimePerturbation:
+    """the two stages of get_perturbation_array, without the disk cache"""
+    params = [[20, 100]]
+    param_names = ["nsrc"]
+    timeout = 600
+
+    def setup(self, nsrc):
+        self.psf_list = synthetic_psf_list(nsrc)
+        self.lat_array = np.broadcast_to(
+            MODEL_LATITUDE[None, :, None], MODEL_SHAPE).astype(float)
+        self.lon_array = np.broadcast_to(
+            MODEL_LONGITUDE[:, None, None], MODEL_SHAPE).astype(float)
+        self.dep_array = np.broadcast_to(
+            MODEL_DEPTH[None, None, :], MODEL_SHAPE).astype(float)
+        self.x_array = np.zeros(MODEL_SHAPE)
+        self.y_array = np.zeros(MODEL_SHAPE)
+        self.z_array = np.zeros(MODEL_SHAPE)
+        latlondep2xyz_sphere(self.lat_array, self.lon_array, self.dep_array,
+                             self.x_array, self.y_array, self.z_array)
+        # compile outside the timing
+        get_per(np.zeros(MODEL_SHAPE), self.psf_list[:1],
+                self.x_array, self.y_array, self.z_array)
+
+    def time_latlondep2xyz_sphere(self, nsrc):
+        latlondep2xyz_sphere(self.lat_array, self.lon_array, self.dep_array,
+                             self.x_array, self.y_array, self.z_array)
+
+    def time_get_per(self, nsrc):
+        get_per(np.zeros(MODEL_SHAPE), self.psf_list,
+                self.x_array, self.y_array, self.z_array)
@@ -0,0 +1,113 @@
+"""
+bench_slice.py
+
+benchmarks for eara2022.utils.slice
+"""
+from eara2022.utils import slice as slice_module
+from eara2022.utils.slice import (
+    extend_line,
+    get_grid_sampler,
+    gmt_lat_as_dist,
+    gmt_lon_as_dist,
+    model_interp,
+    slab_interp,
+    topo_interp,
+)
+from eara2022.utils.sampling import plan_profile_sampling
+
+from .fixtures import (
+    SLAB_LINES,
+    synthetic_model,
+    synthetic_slab,
+    synthetic_topo,
+    synthetic_track,
+)
+
+
+class TimeModelInterp:
+    """model_interp on the 421x281x201 model, for the slab_base perturbation (1001 depths) and absolute (101 depths)
+    panels and the changbaishan_models_base panel (801 depths), with the native sampling and the sampling planned by
+    the panel sizes"""
+    params = [["per", "abs", "changbaishan"], ["native", "auto"]]
+    param_names = ["panel", "sampling"]
+    timeout = 300
+
+    def setup_cache(self):
+        return synthetic_model()
+
+    def setup(self, model, panel, sampling):
+        if panel == "per":
+            plan = plan_profile_sampling(
+                25, (0, 1000), 7.5, 2.7, mode=sampling)
+        elif panel == "abs":
+            plan = plan_profile_sampling(25, (0, 100), 7.5, 0.7, mode=sampling)
+        else:
+            plan = plan_profile_sampling(
+                25, (0, 800), 6.9, 2.16, mode=sampling)
+        # the track of the per panel is shared by the abs panel
+        track_plan = plan if panel == "changbaishan" else plan_profile_sampling(
+            25, (0, 1000), 7.5, 2.7, mode=sampling)
+        self.lons, self.lats = synthetic_track(
+            int(round(25 / track_plan.track_spacing)) + 1)
+        self.deps = plan.depths
+
+    def time_model_interp(self, model, panel, sampling):
+        model_interp(model, self.lons, self.lats, self.deps)
+
+    def peakmem_model_interp(self, model, panel, sampling):
+        model_interp(model, self.lons, self.lats, self.deps)
+
+
+class TimeGridInterp:
+    """topo_interp and slab_interp along one panel track and a 100k-point track"""
+    params = [[1251, 100000]]
+    param_names = ["npts"]
+
+    def setup(self, npts):
+        self.topo = synthetic_topo()
+        self.slab = synthetic_slab()
+        self.lons, self.lats = synthetic_track(npts)
+        # build the cached samplers, so the time_* methods measure the sampling only
+        topo_interp(self.topo, self.lons[:2], self.lats[:2])
+        slab_interp(self.slab, self.lons[:2], self.lats[:2])
+
+    def time_topo_interp(self, npts):
+        topo_interp(self.topo, self.lons, self.lats)
+
+    def time_slab_interp(self, npts):
+        slab_interp(self.slab, self.lons, self.lats)
+
+    def time_topo_interp_cold(self, npts):
+        # drop the cached samplers each time, include building the sampler
+        slice_module._grid_sampler_cache.clear()
+        topo_interp(self.topo, self.lons, self.lats)
+
+    def time_get_grid_sampler_cached(self, npts):
+        get_grid_sampler(self.topo, "lon", "lat")
+
+
+class TimeAxisAnnotation:
+    """the custom axis files and the line extension for the slab_base lines"""
+    params = [list(range(len(SLAB_LINES)))]
+    param_names = ["line"]
+
+    def setup(self, line):
+        startlon, startlat, endlon, endlat = SLAB_LINES[line]
+        self.start = (startlon, startlat)
+        self.end = extend_line(self.start, (endlon, endlat), 25)
+
+    def time_gmt_lat_as_dist(self, line):
+        start, end = self.start, self.end
+        if start[1] > end[1]:
+            start, end = end, start
+        gmt_lat_as_dist(start, end, a_interval=5, g_interval=1)
+
+    def time_gmt_lon_as_dist(self, line):
+        start, end = self.start, self.end
+        if start[0] > end[0]:
+            start, end = end, start
+        gmt_lon_as_dist(start, end, a_interval=5, g_interval=1)
+
+    def time_extend_line(self, line):
+        startlon, startlat, endlon, endlat = SLAB_LINES[line]
+        extend_line((startlon, startlat), (endlon, endlat), 25)
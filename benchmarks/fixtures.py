@@ -0,0 +1,194 @@
+"""
+fixtures.py
+
+synthetic inputs for the benchmarks, with the same sizes as the production data, so the benchmarks run
+without the large data files.
+"""
+import tempfile
+from os.path import join
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from eara2022.utils.ehb_catalog import EHB_DTYPE, write_catalog
+
+# * the production sizes
+MODEL_LONGITUDE = np.linspace(70, 175, 421, dtype=np.float32)
+MODEL_LATITUDE = np.linspace(0, 70, 281, dtype=np.float32)
+MODEL_DEPTH = np.linspace(0, 2000, 201, dtype=np.float32)
+# the lines in slab_base, (startlon, startlat, endlon, endlat)
+SLAB_LINES = [
+    (153, 35, 135, 55),
+    (150, 37, 130, 48),
+    (146, 36, 126, 42),
+    (150, 33, 130, 28),
+    (150, 28, 130, 23),
+    (141, 20, 133, 40),
+    (112, 36, 132, 23),
+]
+# pygmt.project(generate=0.02) along a 25 degree line
+TRACK_NPTS = 1251
+EHB_NPTS = 200000
+VOLCANO_NPTS = 1500
+GCMT_NPTS = 1000
+
+rng = np.random.default_rng(2022)
+
+
+def synthetic_model() -> xr.DataArray:
+    """a smooth 421x281x201 velocity model in the model_files format
+
+    Returns:
+        xr.DataArray: the model
+    """
+    lon, lat, dep = np.meshgrid(
+        MODEL_LONGITUDE, MODEL_LATITUDE, MODEL_DEPTH, indexing="ij", sparse=True)
+    data = (3.5+dep/1000+0.1*np.sin(np.deg2rad(lon)*8)
+            * np.cos(np.deg2rad(lat)*8)).astype(np.float32)
+    return xr.DataArray(data, dims=("longitude", "latitude", "depth"), coords={
+        "longitude": MODEL_LONGITUDE, "latitude": MODEL_LATITUDE, "depth": MODEL_DEPTH})
+
+
+def synthetic_topo() -> xr.DataArray:
+    """a 02m earth relief like grid in the region of the profile figures
+
+    Returns:
+        xr.DataArray: the topography, with dims (lat, lon)
+    """
+    lon = np.linspace(83, 160, 77*30+1)
+    lat = np.linspace(10, 60, 50*30+1)
+    data = 4000*np.sin(np.deg2rad(lon)[None, :]*20) * \
+        np.cos(np.deg2rad(lat)[:, None]*20)
+    return xr.DataArray(data, dims=("lat", "lon"), coords={"lat": lat, "lon": lon})
+
+
+def synthetic_slab() -> xr.Dataset:
+    """a 0.05 degree slab2 like depth grid, NaN outside the slab
+
+    Returns:
+        xr.Dataset: the slab with x, y and z (negative depth)
+    """
+    x = np.linspace(125, 160, 35*20+1)
+    y = np.linspace(15, 55, 40*20+1)
+    z = -(x[None, :]-125)*20-(y[:, None]-15)*2
+    z[:, x < 130] = np.nan
+    z[y > 50, :] = np.nan
+    return xr.Dataset({"z": (("y", "x"), z)}, coords={"x": x, "y": y})
+
+
+def synthetic_track(npts: int = TRACK_NPTS):
+    """a straight track across the slab region
+
+    Args:
+        npts (int, optional): the number of points. Defaults to TRACK_NPTS.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: lons and lats
+    """
+    return np.linspace(130, 150, npts), np.linspace(48, 37, npts)
+
+
+def synthetic_psf_list(nsrc: int = 20) -> np.ndarray:
+    """the psf_list in the format of psf_list.txt, x,y,z,radius,amplitude
+
+    Args:
+        nsrc (int, optional): the number of sources. Defaults to 20.
+
+    Returns:
+        np.ndarray: the (nsrc,5) list
+    """
+    lat = rng.uniform(10, 60, nsrc)
+    lon = rng.uniform(90, 150, nsrc)
+    r = (6371.-rng.uniform(0, 800, nsrc))/6371.
+    theta = np.deg2rad(90-lat)
+    phi = np.deg2rad(lon)
+    return np.column_stack((r*np.sin(theta)*np.cos(phi), r*np.sin(theta)*np.sin(phi), r*np.cos(theta),
+                            np.full(nsrc, 100.), rng.choice([-0.03, 0.03], nsrc)))
+
+
+def write_ehb_catalog(npts: int = EHB_NPTS) -> str:
+    """write an isc_ehb.csv like catalog with lat,lon,dep,id
+
+    Args:
+        npts (int, optional): the number of events. Defaults to EHB_NPTS.
+
+    Returns:
+        str: the csv path
+    """
+    path = tempfile.NamedTemporaryFile(delete=False, suffix=".csv").name
+    pd.DataFrame({
+        "lat": rng.uniform(0, 70, npts),
+        "lon": rng.uniform(70, 175, npts),
+        "dep": rng.uniform(0, 700, npts),
+        "id": np.arange(npts),
+    }).to_csv(path, index=False)
+    return path
+
+
+def write_ehb_binary_catalog(npts: int = EHB_NPTS) -> str:
+    """write the same kind of events as write_ehb_catalog as an ingested binary catalog
+
+    Args:
+        npts (int, optional): the number of events. Defaults to EHB_NPTS.
+
+    Returns:
+        str: the catalog directory
+    """
+    catalog_dir = tempfile.mkdtemp()
+    events = np.zeros(npts, dtype=EHB_DTYPE)
+    events["lat"] = rng.uniform(0, 70, npts)
+    events["lon"] = rng.uniform(70, 175, npts)
+    events["dep"] = rng.uniform(0, 700, npts)
+    events["id"] = np.arange(npts)
+    write_catalog(events, catalog_dir)
+    return catalog_dir
+
+
+def write_volcanoes(npts: int = VOLCANO_NPTS) -> str:
+    """write a volcanoes.tsv like table
+
+    Args:
+        npts (int, optional): the number of volcanoes. Defaults to VOLCANO_NPTS.
+
+    Returns:
+        str: the tsv path
+    """
+    path = tempfile.NamedTemporaryFile(delete=False, suffix=".tsv").name
+    countries = ["China", "Japan", "Russia", "Indonesia", "Korea"]
+    with open(path, "w") as f:
+        f.write('"Name"\t"Country"\t"Type"\t"Latitude"\t"Longitude"\t"Elevation"\n')
+        for index in range(npts):
+            f.write(f'"Volcano {index}"\t"{countries[index % len(countries)]}"\t"Stratovolcano"\t'
+                    f'{rng.uniform(0, 70):.3f}\t{rng.uniform(70, 175):.3f}\t{int(rng.uniform(0, 5000))}\n')
+    return path
+
+
+def write_gcmt_dir(npts: int = GCMT_NPTS) -> str:
+    """write a directory of CMTSOLUTION files
+
+    Args:
+        npts (int, optional): the number of events. Defaults to GCMT_NPTS.
+
+    Returns:
+        str: the directory path
+    """
+    gcmt_dir = tempfile.mkdtemp()
+    for index in range(npts):
+        day, minute = 1+index % 28, index % 60
+        name = f"SYN{index:06d}A"
+        mt = rng.uniform(-1, 1, 6)*10**rng.uniform(23, 26)
+        with open(join(gcmt_dir, name), "w") as f:
+            f.write(f" PDE 2008 {1+index % 12:2d} {day:2d} {index % 24:2d} {minute:2d} 27.50  36.1600  141.5300  36.0 0.0 6.9 SYNTHETIC\n"
+                    f"event name:     {name}\n"
+                    "time shift:     10.0000\n"
+                    "half duration:   6.5000\n"
+                    f"latitude:       {rng.uniform(10, 60):.4f}\n"
+                    f"longitude:     {rng.uniform(90, 150):.4f}\n"
+                    f"depth:          {rng.uniform(10, 600):.4f}\n"
+                    f"Mrr:      {mt[0]:.6e}\n"
+                    f"Mtt:      {mt[1]:.6e}\n"
+                    f"Mpp:      {mt[2]:.6e}\n"
+                    f"Mrt:      {mt[3]:.6e}\n"
+                    f"Mrp:      {mt[4]:.6e}\n"
+                    f"Mtp:      {mt[5]:.6e}\n")
+    return gcmt_dir
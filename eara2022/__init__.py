@@ -3,6 +3,8 @@ from typing import List, Union
 
 import pygmt
 
+from eara2022.instrument import profiled
+
 root_path = dirname(__file__)
 resource_path = join(root_path, "data")
 
@@ -21,6 +23,7 @@ def gmt_path(path: str) -> str:
     return f'"{path}"'
 
 
+@profiled()
 def resource(name: Union[str, List[str]], normal_path: bool = False,  check: bool = True) -> str:
     """get resource path from its name
 
@@ -0,0 +1,178 @@
+"""
+instrument.py
+
+lightweight timers, counters and peak memory samples for the figure scripts.
+the profiler is disabled by default, so the decorated functions only pay for a flag check.
+"""
+import json
+import time
+from contextlib import contextmanager
+from functools import wraps
+from os import makedirs
+from os.path import join
+from resource import RUSAGE_SELF, getrusage
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+def peak_rss_mb() -> float:
+    """the peak resident set size of the current process
+
+    Returns:
+        float: the peak rss in MB
+    """
+    # ru_maxrss is in KB on linux
+    return getrusage(RUSAGE_SELF).ru_maxrss/1024
+
+
+class Profiler:
+    """Collect the wall time, calls and peak memory for nested phases
+
+    Each phase is recorded by its stack, such as "slab_vs_ak135;slice.model_interp", so the report can be
+    converted to the folded format used by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.reset()
+
+    def reset(self) -> None:
+        """clear all the records
+        """
+        self.stack: List[str] = []
+        self.child_time: List[float] = []
+        self.records: Dict[str, dict] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """time a phase, nested phases are recorded under their parent
+
+        Args:
+            name (str): the phase name
+        """
+        if not self.enabled:
+            yield
+            return
+        self.stack.append(name)
+        self.child_time.append(0.)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter()-start
+            children = self.child_time.pop()
+            key = ";".join(self.stack)
+            self.stack.pop()
+            if len(self.child_time) != 0:
+                self.child_time[-1] += elapsed
+            record = self.records.setdefault(
+                key, {"calls": 0, "total": 0., "self": 0., "peak_rss_mb": 0.})
+            record["calls"] += 1
+            record["total"] += elapsed
+            record["self"] += elapsed-children
+            record["peak_rss_mb"] = max(record["peak_rss_mb"], peak_rss_mb())
+
+    def report(self, figure_name: str) -> dict:
+        """summarize the records
+
+        Args:
+            figure_name (str): the figure name
+
+        Returns:
+            dict: the json serializable report
+        """
+        phases = [{"stack": key, "name": key.split(";")[-1], **value}
+                  for key, value in self.records.items()]
+        total = sum(each["total"]
+                    for each in phases if ";" not in each["stack"])
+        return {
+            "figure": figure_name,
+            "total": total,
+            "peak_rss_mb": peak_rss_mb(),
+            "phases": sorted(phases, key=lambda x: x["total"], reverse=True),
+        }
+
+    def folded(self) -> str:
+        """the records in the folded stack format, with the self time in microseconds
+
+        Returns:
+            str: the folded stacks
+        """
+        return "".join(f"{key} {int(value['self']*1e6)}\n" for key, value in self.records.items())
+
+    def write_report(self, figure_name: str, report_dir: str) -> str:
+        """write the json report and the folded stacks to report_dir
+
+        Args:
+            figure_name (str): the figure name
+            report_dir (str): the report directory
+
+        Returns:
+            str: the json report path
+        """
+        makedirs(report_dir, exist_ok=True)
+        json_path = join(report_dir, figure_name+".json")
+        with open(json_path, "w") as f:
+            json.dump(self.report(figure_name), f, indent=2)
+        with open(join(report_dir, figure_name+".folded"), "w") as f:
+            f.write(self.folded())
+        return json_path
+
+
+PROFILER = Profiler()
+
+
+def phase(name: str):
+    """time a phase with the global profiler, used as `with phase("name"):`
+
+    Args:
+        name (str): the phase name
+    """
+    return PROFILER.phase(name)
+
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """decorator to time a function with the global profiler
+
+    Args:
+        name (Optional[str], optional): the phase name. Defaults to the function's module and name.
+
+    Returns:
+        Callable: the decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        phase_name = name if name is not None else f"{func.__module__.split('.')[-1]}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with PROFILER.phase(phase_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# * the pygmt calls to time when profiling
+PYGMT_FIGURE_METHODS = ["basemap", "coast", "colorbar", "grdcontour", "grdimage", "histogram",
+                        "meca", "plot", "savefig", "shift_origin", "text"]
+PYGMT_FUNCTIONS = ["makecpt", "project"]
+
+
+def instrument_pygmt() -> None:
+    """wrap the pygmt figure methods and functions with the profiler, calling it twice has no effect
+    """
+    import pygmt
+
+    def wrap(owner, attr: str) -> None:
+        func = getattr(owner, attr, None)
+        if func is None or getattr(func, "_eara2022_profiled", False):
+            return
+        wrapped = profiled(f"pygmt.{attr}")(func)
+        wrapped._eara2022_profiled = True
+        setattr(owner, attr, wrapped)
+
+    for attr in PYGMT_FIGURE_METHODS:
+        wrap(pygmt.Figure, attr)
+    for attr in PYGMT_FUNCTIONS:
+        wrap(pygmt, attr)
+    wrap(pygmt.datasets, "load_earth_relief")
@@ -4,6 +4,8 @@ from .misfit import main as misfit_main
 from .hist import main as hist_main
 from .psf import main as psf_main
 from .waveform import main as waveform_main
+from .waveform import batch_main as waveform_batch_main
+from .waveform import convert_tables as waveform_tables_main
 from .vs_eara2022 import main as vs_eara2022_main
 from .vs_ak135 import main as vs_ak135_main
 from .vs_stw105 import main as vs_stw105_main
@@ -47,6 +49,8 @@ __all__ = [
     'hist_main',
     'psf_main',
     'waveform_main',
+    'waveform_batch_main',
+    'waveform_tables_main',
     'vs_eara2022_main',
     'vs_ak135_main',
     'vs_stw105_main',
@@ -7,11 +7,24 @@ import numpy as np
 import pygmt
 import xarray as xr
 from eara2022 import resource, save_path
+from eara2022.instrument import profiled
 from eara2022.utils import get_vol_list
+from eara2022.utils.model_registry import get_model_registry
 from eara2022.utils.plot import plot_place_holder
+from eara2022.utils.sampling import plan_profile_sampling
 from eara2022.utils.slice import extend_line, gmt_lon_as_dist, model_interp
 from scipy import interpolate
 
+# * the resource inputs, the figures are rebuilt when they change, see utils.build
+INPUTS = [
+    ["model_files", "eara2021_per_ref.nc"],
+    ["model_files", "fwea18.nc"],
+    ["model_files", "AK135F_AVG.csv"],
+    ["model_files", "iasp91.txt"],
+    ["cpt", "dvs_6p_nan.cpt"],
+    ["Volcanoes", "volcanoes.tsv"],
+]
+
 # * settings
 np.seterr(divide='ignore')
 np.seterr(invalid='ignore')
@@ -30,9 +43,11 @@ iasp91_path = resource(['model_files', 'iasp91.txt'], normal_path=True)
 
 
 # * load models with the respect to certain reference model
-copy_model: xr.DataArray = xr.open_dataset(eara2021_per_path)["vs"]
+# the read-only grid shared by the processes, copy it before writing to it
+copy_model: xr.DataArray = get_model_registry().model("eara2021_per_ref", "vs")
 
 
+@profiled()
 def load_ak135(parameter: str) -> xr.DataArray:
     ak135 = np.loadtxt(ak135_path, delimiter=',')
     h = ak135[:, 0]
@@ -48,6 +63,7 @@ def load_ak135(parameter: str) -> xr.DataArray:
     return ak135_abs_data
 
 
+@profiled()
 def load_iasp91(parameter: str) -> xr.DataArray:
     iasp91 = np.loadtxt(iasp91_path)
     h = iasp91[:, 0]
@@ -63,6 +79,7 @@ def load_iasp91(parameter: str) -> xr.DataArray:
     return iasp91_abs_data
 
 
+@profiled()
 def load_fwea18(parameter: str, ref_model: xr.DataArray) -> xr.DataArray:
     fwea18_abs = xr.open_dataset(fwea18_abs_path)
     if parameter == "vs":
@@ -108,12 +125,13 @@ def plot_base(ref_key: str, save_name: str):
     fwea18_vs = smooth_model(fwea18_vs)
     fwea18_vp = smooth_model(fwea18_vp)
 
-    # the lons and lats
+    # the lons and lats, sampled by the panel pixels, see utils.sampling
+    plan = plan_profile_sampling(18, (0, 1000), 5.4, 2.7)
     points = pygmt.project(
-        center=start_point, endpoint=end_point, generate=0.02)
+        center=start_point, endpoint=end_point, generate=plan.track_spacing)
     lons: np.ndarray = points.r
     lats: np.ndarray = points.s
-    deps = np.linspace(0, 1000, 1001)
+    deps = plan.depths
 
     # * plot figure
     # * vs
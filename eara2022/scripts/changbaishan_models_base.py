@@ -3,175 +3,53 @@ changbaishan_models_base
 
 Compare models bfor the structure beneath the Changbaishan volcano, with the referencec model passed.
 """
+from os.path import isfile
+from typing import List, Optional
+
 import numpy as np
-import pandas as pd
 import pygmt
 import xarray as xr
-from scipy import interpolate
 
 from eara2022 import resource, save_path
 from eara2022.utils import get_vol_list
+from eara2022.utils.figure_plan import FigurePlan
 from eara2022.utils.plot import plot_place_holder
-from eara2022.utils.project_ehb import project_ehb_catalog
-from eara2022.utils.slice import extend_line, gmt_lon_as_dist, model_interp
-
-# * settings
-np.seterr(divide="ignore")
-np.seterr(invalid="ignore")
-# * old points
-# start_point = (113, 42)
-# end_point = (145.6063681055389, 38)
-# * new points
-start_point = (118, 42)
-end_point = (128.08, 41.98)
-LENGTH = 23
-end_point = extend_line(start_point, end_point, LENGTH)
-
-# * several paths for the models, some may unused
-eara2021_abs_path = resource(["model_files", "eara2021.nc"], normal_path=True)
-eara2021_per_path = resource(["model_files", "eara2021_per_ref.nc"], normal_path=True)
-eara2021_1d_ref_path = resource(
-    ["model_files", "eara2021_1dref_just_average_not_actual.csv"], normal_path=True
+from eara2022.utils.slab2 import plot_slab_contours
+from eara2022.utils.slice import gmt_lon_as_dist
+
+from .changbaishan_models_plan import (
+    changbaishan_layers,
+    changbaishan_plan,
+    changbaishan_plan_inputs,
+    changbaishan_plan_path,
+    end_point,
+    start_point,
 )
-eara2014_abs_path = resource(["model_files", "eara2014.nc"], normal_path=True)
-fwea18_abs_path = resource(["model_files", "fwea18.nc"], normal_path=True)
-gap_p4_per_path = resource(["model_files", "GAP_P4_dvp.nc"], normal_path=True)
-glad_m25_abs_path = resource(["model_files", "glad-m25-vs-0.0-n4.nc"], normal_path=True)
-
-ref_path = resource(["model_files", "ref.nc"], normal_path=True)
-stw105_path = resource(["model_files", "stw105.txt"], normal_path=True)
-ak135_path = resource(["model_files", "AK135F_AVG.csv"], normal_path=True)
-mask_path = resource(["model_files", "mask.npy"], normal_path=True)
-
-# * load models with the respect to certain reference model
-copy_model: xr.DataArray = xr.open_dataset(eara2021_per_path)["vs"]
-
-
-def load_stw105(parameter: str, get_only_xy: bool = False) -> xr.DataArray:
-    stw105 = np.loadtxt(stw105_path)
-    r = stw105[:, 0]
-    if parameter == "vs":
-        v_v = stw105[:, 3]
-        v_h = stw105[:, 7]
-        v = np.sqrt((2 * v_v**2 + v_h**2) / 3)
-    elif parameter == "vp":
-        v_v = stw105[:, 2]
-        v_h = stw105[:, 6]
-        v = np.sqrt((v_v**2 + 4 * v_h**2) / 5)
-    f = interpolate.interp1d((6371000 - r) / 1000, v)
-    stw105_depth = f(np.arange(0, 2005, 10)) / 1000
-    if get_only_xy:
-        return np.arange(0, 2005, 10), stw105_depth
-    stw105_abs_data = copy_model.copy()
-    for index in range(201):
-        stw105_abs_data.data[:, :, index] = stw105_depth[index]
-    return stw105_abs_data
-
-
-def load_ak135(parameter: str, get_only_xy: bool = False) -> xr.DataArray:
-    ak135 = np.loadtxt(ak135_path, delimiter=",")
-    h = ak135[:, 0]
-    if parameter == "vp":
-        v = ak135[:, 2]
-    else:
-        v = ak135[:, 3]
-    f = interpolate.interp1d(h, v)
-    ak135_depth = f(np.arange(0, 2005, 10))
-    if get_only_xy:
-        return np.arange(0, 2005, 10), ak135_depth
-    ak135_abs_data = copy_model.copy()
-    for index in range(201):
-        ak135_abs_data.data[:, :, index] = ak135_depth[index]
-    return ak135_abs_data
-
 
-def load_eara2021_ref(parameter: str) -> xr.DataArray:
-    eara2021_ref = xr.open_dataset(ref_path)[parameter]
-    return eara2021_ref
-
-
-def load_eara2021_1d_ref(parameter: str):
-    data = pd.read_csv(eara2021_1d_ref_path)
-    return data["depth"], data[parameter].values
-
-
-# * load other models based on the reference model
-
-
-def load_eara2021(parameter: str, ref_model: xr.DataArray) -> xr.DataArray:
-    eara2021_abs = xr.open_dataset(eara2021_abs_path)[parameter]
-    eara2021_per = copy_model.copy()
-    eara2021_per.data = eara2021_abs.data / ref_model.data - 1
-    return eara2021_per * 100
-
-
-def load_fwea18(parameter: str, ref_model: xr.DataArray) -> xr.DataArray:
-    fwea18_abs = xr.open_dataset(fwea18_abs_path)
-    if parameter == "vs":
-        fwea18_abs_iso = np.sqrt(
-            (2 * fwea18_abs["vsv"] ** 2 + fwea18_abs["vsh"] ** 2) / 3
-        )
-        fwea18_abs_iso_interp = fwea18_abs_iso.interp_like(copy_model)
-    else:
-        fwea18_abs_iso = np.sqrt(
-            (fwea18_abs["vpv"] ** 2 + 4 * fwea18_abs["vph"] ** 2) / 5
-        )
-        fwea18_abs_iso_interp = fwea18_abs_iso.interp_like(copy_model)
-    fwea18_per = copy_model.copy()
-    fwea18_per.data = fwea18_abs_iso_interp.data / ref_model.data - 1
-    return fwea18_per * 100
-
-
-def load_eara2014(parameter: str, ref_model: xr.DataArray) -> xr.DataArray:
-    eara2014_abs = xr.open_dataset(eara2014_abs_path)
-    if parameter == "vs":
-        eara2014_abs_iso = np.sqrt(
-            (2 * eara2014_abs["vsv"] ** 2 + eara2014_abs["vsh"] ** 2) / 3
-        )
-        eara2014_abs_iso_interp = eara2014_abs_iso.interp_like(copy_model)
-    else:
-        eara2014_abs_iso = np.sqrt(
-            (eara2014_abs["vpv"] ** 2 + 4 * eara2014_abs["vph"] ** 2) / 5
-        )
-        eara2014_abs_iso_interp = eara2014_abs_iso.interp_like(copy_model)
-    eara2014_per = copy_model.copy()
-    eara2014_per.data = eara2014_abs_iso_interp.data / ref_model.data - 1
-    return eara2014_per * 100
-
-
-def load_glad_m25(parameter: str, ref_model: xr.DataArray) -> xr.DataArray:
-    # only have vs model
-    glad_m25_abs = xr.open_dataset(glad_m25_abs_path)
-    glad_m25_abs_iso = np.sqrt(
-        (2 * glad_m25_abs["vsv"] ** 2 + glad_m25_abs["vsh"] ** 2) / 3
-    )
-    glad_m25_abs_iso_interp = glad_m25_abs_iso.interp_like(copy_model)
-    glad_m25_per = copy_model.copy()
-    glad_m25_per.data = np.transpose(glad_m25_abs_iso_interp.data) / ref_model.data - 1
-    return glad_m25_per * 100
-
-
-def load_gap_p4() -> xr.DataArray:
-    gapp4_per = xr.open_dataset(gap_p4_per_path)
-    gapp4_ref_vp = gapp4_per["v"].interp_like(copy_model)
-    # reverse direction
-    gapp4_ref_vp_corrected = copy_model.copy()
-    gapp4_ref_vp_corrected.data = np.transpose(gapp4_ref_vp.data)
-    return gapp4_ref_vp_corrected
-
-
-def load_mask() -> xr.DataArray:
-    mask = np.load(mask_path)
-    mask_xarray = copy_model.copy()
-    mask_xarray.data = mask
-    return mask_xarray
-
-
-def smooth_model(model: xr.DataArray) -> xr.DataArray:
-    model[:, :, 41] = (model[:, :, 40] + model[:, :, 42]) / 2
-    model[:, :, 65] = (3 * model[:, :, 64] + 1 * model[:, :, 67]) / 4
-    model[:, :, 66] = (1 * model[:, :, 64] + 3 * model[:, :, 67]) / 4
-    return model
+# * the resource inputs, the figures are rebuilt when they change, see utils.build
+INPUTS = [
+    ["model_files", "eara2021.nc"],
+    ["model_files", "eara2021_per_ref.nc"],
+    ["model_files", "mask.npy"],
+    ["model_files", "stw105.txt"],
+    ["model_files", "AK135F_AVG.csv"],
+    ["model_files", "eara2021_1dref_just_average_not_actual.csv"],
+    ["model_files", "eara2021_1dref_layer_stats.csv"],
+    ["model_files", "eara2014.nc"],
+    ["model_files", "fwea18.nc"],
+    ["model_files", "GAP_P4_dvp.nc"],
+    ["model_files", "glad-m25-vs-0.0-n4.nc"],
+    ["model_files", "ref.nc"],
+    ["cpt", "dvs_6p_nan.cpt"],
+    ["cpt", "land_sea.cpt"],
+    ["Plate_Boundaries", "nuvel1_boundaries"],
+    ["China_blocks", "block2d_mod.txt"],
+    ["China_blocks", "China_Basins"],
+    ["Volcanoes", "volcanoes.tsv"],
+    ["slab2"],
+    ["isc_ehb", "isc_ehb.csv"],
+    ["isc_ehb", "catalog", "events.npy"],
+]
 
 
 def plot_base_map(fig: pygmt.Figure) -> None:
@@ -183,12 +61,7 @@ def plot_base_map(fig: pygmt.Figure) -> None:
     fig.plot(data=resource(["Plate_Boundaries", "nuvel1_boundaries"]), pen="2p,red")
     fig.plot(data=resource(["China_blocks", "block2d_mod.txt"]), pen="0.5p")
     fig.plot(data=resource(["China_blocks", "China_Basins"]), pen="0.5p")
-    for slab in ["izu", "kur", "phi", "ryu", "man"]:
-        fig.grdcontour(
-            resource(["slab2", f"{slab}_slab2_depth.grd"]),
-            interval=100,
-            pen="1.5p,magenta",
-        )
+    plot_slab_contours(fig, level=100, pen="1.5p,magenta")
     vols = get_vol_list()
     fig.plot(x=vols[:, 1], y=vols[:, 0], style="kvolcano/0.4", pen="red")
     # arrows
@@ -196,24 +69,15 @@ def plot_base_map(fig: pygmt.Figure) -> None:
     fig.plot(data=[list(end_point) + list(start_point)], style=style, pen="0.05i,blue")
 
 
-def plot_base(parameter: str, ref_key: str, save_name: str, colorbar_content: str):
-    # * load models
-    mapper = {
-        "stw105": load_stw105,
-        "eara2021": load_eara2021_ref,
-        "ak135": load_ak135,
-    }
-    ref_model = mapper[ref_key](parameter)
-    if parameter == "vp":
-        ref_model_vs = mapper[ref_key]("vs")
-    else:
-        ref_model_vs = ref_model
-
-    eara2021 = load_eara2021(parameter, ref_model)
-    fwea18 = load_fwea18(parameter, ref_model)
-    eara2014 = load_eara2014(parameter, ref_model)
-    glad_m25 = load_glad_m25(parameter, ref_model_vs)
-    gap_p4 = load_gap_p4()
+def plot_base(
+    parameter: str,
+    ref_key: str,
+    save_name: str,
+    colorbar_content: str,
+    layers: Optional[FigurePlan] = None,
+):
+    # * the plan is cached, re-styling only renders again
+    plan = changbaishan_plan(parameter, ref_key, layers)
 
     # * draw the base plot
     fig = pygmt.Figure()
@@ -231,24 +95,13 @@ def plot_base(parameter: str, ref_key: str, save_name: str, colorbar_content: st
     Y = ["f8.3i"] * 2 + ["f5.4i"] * 2 + ["f2.5i"]
     tmp_xannote = gmt_lon_as_dist(start_point, end_point, a_interval=5, g_interval=1)
 
-    models = [eara2021, fwea18, eara2014, glad_m25, gap_p4]
     model_names = ["EARA2023", "FWEA18", "EARA2014", "GLAD_M25", "GAP_P4"]
-    for i, model in enumerate(models):
-        models[i] = smooth_model(model)
     if parameter == "vs":
         labels = ["Vs", "Vs", "Vs", "Vs", "Vp"]
     elif parameter == "vp":
         labels = ["Vp", "Vp", "Vp", "Vs", "Vp"]
 
-    # the lons and lats
-    points = pygmt.project(center=start_point, endpoint=end_point, generate=0.02)
-    lons: np.ndarray = points.r
-    lats: np.ndarray = points.s
-    deps = np.linspace(0, 800, 801)
-
-    # mask
-    mask_model = load_mask()
-    mask_cs = model_interp(mask_model, lons, lats, deps)
+    lons, lats, deps = plan["lons"], plan["lats"], plan["deps"]
 
     # * plot each figure
     for index in range(5):
@@ -278,14 +131,16 @@ def plot_base(parameter: str, ref_key: str, save_name: str, colorbar_content: st
                     ],
                 )
         # cs
-        cross_section = model_interp(models[index], lons, lats, deps)
         cross_section_xarray = xr.DataArray(
-            cross_section,
+            plan[f"{index}/image"],
+            dims=("h", "v"),
+            coords={"h": plan["h"], "v": deps},
+        )
+        cross_section_xarray_for_contour = xr.DataArray(
+            plan[f"{index}/contour"],
             dims=("h", "v"),
-            coords={"h": np.linspace(0, 25, len(lons)), "v": deps},
+            coords={"h": plan["h"], "v": deps},
         )
-        cross_section_xarray_for_contour = cross_section_xarray.copy()
-        cross_section_xarray.data[mask_cs < 0.3] = np.nan
         fig.grdimage(cross_section_xarray.T)
         for interval in ["+-2"]:
             fig.grdcontour(
@@ -312,12 +167,9 @@ def plot_base(parameter: str, ref_key: str, save_name: str, colorbar_content: st
         fig.plot(x=np.linspace(0, 25, len(lons)), y=y_650, pen="0.5p,black,dashed")
 
         # ehb catalog
-        ehb_catalog = project_ehb_catalog(
-            start_point, end_point, width=100, degree_limit=LENGTH
-        )
         fig.plot(
-            x=ehb_catalog["dist"],
-            y=ehb_catalog["dep"],
+            x=plan["ehb_dist"],
+            y=plan["ehb_dep"],
             style="c0.1c",
             pen="0.01c,magenta",
         )
@@ -382,12 +234,17 @@ def plot_base(parameter: str, ref_key: str, save_name: str, colorbar_content: st
             frame=["WSen", 'xaf+l"1-D Wave Speed (km/s)"', 'yaf+l"Depth (km)"'],
         )
     # stw 105
-    x_stw105, vs_stw105 = load_stw105("vs", get_only_xy=True)
-    x_stw105, vp_stw105 = load_stw105("vp", get_only_xy=True)
-    x_ak135, vs_ak135 = load_ak135("vs", get_only_xy=True)
-    x_ak135, vp_ak135 = load_ak135("vp", get_only_xy=True)
-    x_eara, vs_eara = load_eara2021_1d_ref("vs")
-    x_eara, vp_eara = load_eara2021_1d_ref("vp")
+    x_stw105, vs_stw105, vp_stw105 = (
+        plan["stw105_depth"],
+        plan["stw105_vs"],
+        plan["stw105_vp"],
+    )
+    x_ak135, vs_ak135, vp_ak135 = (
+        plan["ak135_depth"],
+        plan["ak135_vs"],
+        plan["ak135_vp"],
+    )
+    x_eara, vs_eara, vp_eara = plan["eara_depth"], plan["eara_vs"], plan["eara_vp"]
     with pygmt.config(FONT="6p"):
         fig.plot(x=vs_ak135, y=x_ak135, pen="2p,blue", label="AK135")
         fig.plot(x=vp_ak135, y=x_ak135, pen="2p,blue")
@@ -423,3 +280,22 @@ def plot_base(parameter: str, ref_key: str, save_name: str, colorbar_content: st
     )
 
     save_path(fig, save_name)
+
+
+def plot_family(confs: List[dict]) -> None:
+    """plot the figures of several reference models and parameters in one pass, the
+    track, the mask section, the ehb catalog and the 1D models are prepared once for
+    the figures without the cached plans
+
+    Args:
+        confs (List[dict]): the configurations of the figures, as the keywords of
+            plot_base
+    """
+    layers = None
+    for conf in confs:
+        if layers is None and not isfile(
+            changbaishan_plan_path(conf["parameter"], conf["ref_key"])
+        ):
+            inputs = changbaishan_plan_inputs(conf["parameter"], conf["ref_key"])
+            layers = changbaishan_layers(inputs)
+        plot_base(**conf, layers=layers)
@@ -0,0 +1,435 @@
+"""
+changbaishan_models_plan.py
+
+the plan stage of the changbaishan models figures, the track, the mask, the earthquakes, the 1D reference models and
+the sections of each model. the render code is in changbaishan_models_base, so re-styling does not compute the plans
+again, see utils.figure_plan.
+"""
+from functools import cache, partial
+from os.path import isfile
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pygmt
+import xarray as xr
+from scipy import interpolate
+
+from eara2022 import resource
+from eara2022.instrument import profiled
+from eara2022.utils.figure_plan import FigurePlan, plan_key, plan_path
+from eara2022.utils.model_layout import ModelLayouts
+from eara2022.utils.model_registry import get_model_registry
+from eara2022.utils.project_ehb import project_ehb_catalog
+from eara2022.utils.sampling import get_sampling_mode, plan_profile_sampling
+from eara2022.utils.slice import extend_line, model_interp
+
+# * settings
+np.seterr(divide="ignore")
+np.seterr(invalid="ignore")
+# * old points
+# start_point = (113, 42)
+# end_point = (145.6063681055389, 38)
+# * new points
+start_point = (118, 42)
+end_point = (128.08, 41.98)
+LENGTH = 23
+end_point = extend_line(start_point, end_point, LENGTH)
+
+# * several paths for the models, some may unused
+eara2021_abs_path = resource(["model_files", "eara2021.nc"], normal_path=True)
+eara2021_per_path = resource(["model_files", "eara2021_per_ref.nc"], normal_path=True)
+eara2021_1d_ref_path = resource(
+    ["model_files", "eara2021_1dref_just_average_not_actual.csv"], normal_path=True
+)
+# the 1D reference written by utils.layer_stats.build_eara2021_1d_ref
+eara2021_1d_stats_path = resource(
+    ["model_files", "eara2021_1dref_layer_stats.csv"], normal_path=True, check=False
+)
+eara2014_abs_path = resource(["model_files", "eara2014.nc"], normal_path=True)
+fwea18_abs_path = resource(["model_files", "fwea18.nc"], normal_path=True)
+gap_p4_per_path = resource(["model_files", "GAP_P4_dvp.nc"], normal_path=True)
+glad_m25_abs_path = resource(["model_files", "glad-m25-vs-0.0-n4.nc"], normal_path=True)
+
+ref_path = resource(["model_files", "ref.nc"], normal_path=True)
+stw105_path = resource(["model_files", "stw105.txt"], normal_path=True)
+ak135_path = resource(["model_files", "AK135F_AVG.csv"], normal_path=True)
+mask_path = resource(["model_files", "mask.npy"], normal_path=True)
+
+# * load models with the respect to certain reference model
+# the read-only grid shared by the processes, copy it before writing to it
+copy_model: xr.DataArray = get_model_registry().model("eara2021_per_ref", "vs")
+
+
+@profiled()
+def load_stw105(parameter: str, get_only_xy: bool = False) -> xr.DataArray:
+    stw105 = np.loadtxt(stw105_path)
+    r = stw105[:, 0]
+    if parameter == "vs":
+        v_v = stw105[:, 3]
+        v_h = stw105[:, 7]
+        v = np.sqrt((2 * v_v**2 + v_h**2) / 3)
+    elif parameter == "vp":
+        v_v = stw105[:, 2]
+        v_h = stw105[:, 6]
+        v = np.sqrt((v_v**2 + 4 * v_h**2) / 5)
+    f = interpolate.interp1d((6371000 - r) / 1000, v)
+    stw105_depth = f(np.arange(0, 2005, 10)) / 1000
+    if get_only_xy:
+        return np.arange(0, 2005, 10), stw105_depth
+    stw105_abs_data = copy_model.copy()
+    for index in range(201):
+        stw105_abs_data.data[:, :, index] = stw105_depth[index]
+    return stw105_abs_data
+
+
+@profiled()
+def load_ak135(parameter: str, get_only_xy: bool = False) -> xr.DataArray:
+    ak135 = np.loadtxt(ak135_path, delimiter=",")
+    h = ak135[:, 0]
+    if parameter == "vp":
+        v = ak135[:, 2]
+    else:
+        v = ak135[:, 3]
+    f = interpolate.interp1d(h, v)
+    ak135_depth = f(np.arange(0, 2005, 10))
+    if get_only_xy:
+        return np.arange(0, 2005, 10), ak135_depth
+    ak135_abs_data = copy_model.copy()
+    for index in range(201):
+        ak135_abs_data.data[:, :, index] = ak135_depth[index]
+    return ak135_abs_data
+
+
+@profiled()
+def load_eara2021_ref(parameter: str) -> xr.DataArray:
+    eara2021_ref = get_model_registry().model("ref", parameter)
+    return eara2021_ref
+
+
+@profiled()
+def load_eara2021_1d_ref(
+    parameter: str, statistic: str = "mean", path: str = eara2021_1d_ref_path
+):
+    # the csv from layer_stats also has the columns such as vs_median and vs_p5
+    data = pd.read_csv(path)
+    column = parameter if statistic == "mean" else f"{parameter}_{statistic}"
+    return data["depth"], data[column].values
+
+
+@profiled()
+def load_eara2021_1d_ref_model(
+    parameter: str, statistic: str = "mean", path: str = eara2021_1d_ref_path
+) -> xr.DataArray:
+    # the 1D reference interpolated on the depths of the model grid
+    depth, ref = load_eara2021_1d_ref(parameter, statistic, path)
+    f = interpolate.interp1d(np.asarray(depth, dtype=float), ref)
+    ref_abs_data = copy_model.copy()
+    ref_abs_data.data[:] = f(copy_model.depth.values)[None, None, :]
+    return ref_abs_data
+
+
+# * load other models based on the reference model
+
+
+@profiled()
+def load_eara2021(parameter: str, ref_model: xr.DataArray) -> xr.DataArray:
+    eara2021_abs = get_model_registry().model("eara2021", parameter)
+    eara2021_per = copy_model.copy()
+    eara2021_per.data = eara2021_abs.data / ref_model.data - 1
+    return eara2021_per * 100
+
+
+@profiled()
+def load_fwea18(parameter: str, ref_model: xr.DataArray) -> xr.DataArray:
+    def build() -> xr.DataArray:
+        fwea18_abs = xr.open_dataset(fwea18_abs_path)
+        if parameter == "vs":
+            fwea18_abs_iso = np.sqrt(
+                (2 * fwea18_abs["vsv"] ** 2 + fwea18_abs["vsh"] ** 2) / 3
+            )
+        else:
+            fwea18_abs_iso = np.sqrt(
+                (fwea18_abs["vpv"] ** 2 + 4 * fwea18_abs["vph"] ** 2) / 5
+            )
+        return fwea18_abs_iso.interp_like(copy_model)
+
+    # * the regridded model is built once and shared, see utils.model_registry
+    fwea18_abs_iso_interp = get_model_registry().volume(
+        f"fwea18_{parameter}_iso", build, [fwea18_abs_path]
+    )
+    fwea18_per = copy_model.copy()
+    fwea18_per.data = fwea18_abs_iso_interp.data / ref_model.data - 1
+    return fwea18_per * 100
+
+
+@profiled()
+def load_eara2014(parameter: str, ref_model: xr.DataArray) -> xr.DataArray:
+    def build() -> xr.DataArray:
+        eara2014_abs = xr.open_dataset(eara2014_abs_path)
+        if parameter == "vs":
+            eara2014_abs_iso = np.sqrt(
+                (2 * eara2014_abs["vsv"] ** 2 + eara2014_abs["vsh"] ** 2) / 3
+            )
+        else:
+            eara2014_abs_iso = np.sqrt(
+                (eara2014_abs["vpv"] ** 2 + 4 * eara2014_abs["vph"] ** 2) / 5
+            )
+        return eara2014_abs_iso.interp_like(copy_model)
+
+    eara2014_abs_iso_interp = get_model_registry().volume(
+        f"eara2014_{parameter}_iso", build, [eara2014_abs_path]
+    )
+    eara2014_per = copy_model.copy()
+    eara2014_per.data = eara2014_abs_iso_interp.data / ref_model.data - 1
+    return eara2014_per * 100
+
+
+@profiled()
+def load_glad_m25(parameter: str, ref_model: xr.DataArray) -> xr.DataArray:
+    # only have vs model
+    def build() -> xr.DataArray:
+        glad_m25_abs = xr.open_dataset(glad_m25_abs_path)
+        glad_m25_abs_iso = np.sqrt(
+            (2 * glad_m25_abs["vsv"] ** 2 + glad_m25_abs["vsh"] ** 2) / 3
+        )
+        return glad_m25_abs_iso.interp_like(copy_model)
+
+    glad_m25_abs_iso_interp = get_model_registry().volume(
+        "glad_m25_vs_iso", build, [glad_m25_abs_path]
+    )
+    glad_m25_per = copy_model.copy()
+    glad_m25_per.data = np.transpose(glad_m25_abs_iso_interp.data) / ref_model.data - 1
+    return glad_m25_per * 100
+
+
+@profiled()
+def load_gap_p4() -> xr.DataArray:
+    def build() -> xr.DataArray:
+        gapp4_per = xr.open_dataset(gap_p4_per_path)
+        gapp4_ref_vp = gapp4_per["v"].interp_like(copy_model)
+        # reverse direction
+        gapp4_ref_vp_corrected = copy_model.copy()
+        gapp4_ref_vp_corrected.data = np.transpose(gapp4_ref_vp.data)
+        return gapp4_ref_vp_corrected
+
+    # copied, as smooth_model writes to it
+    return get_model_registry().volume("gap_p4_v", build, [gap_p4_per_path]).copy()
+
+
+@profiled()
+def load_mask() -> xr.DataArray:
+    mask = get_model_registry().mask()
+    mask_xarray = copy_model.copy()
+    mask_xarray.data = mask
+    return mask_xarray
+
+
+def smooth_model(model: xr.DataArray) -> xr.DataArray:
+    model[:, :, 41] = (model[:, :, 40] + model[:, :, 42]) / 2
+    model[:, :, 65] = (3 * model[:, :, 64] + 1 * model[:, :, 67]) / 4
+    model[:, :, 66] = (1 * model[:, :, 64] + 3 * model[:, :, 67]) / 4
+    return model
+
+
+def changbaishan_models(parameter: str, ref_key: str) -> List[ModelLayouts]:
+    """the smoothed perturbations of eara2021, fwea18, eara2014, glad_m25 and gap_p4
+    with respect to the reference model, built once and shared by the processes in the
+    profile and slice layouts
+
+    Args:
+        parameter (str): vs or vp
+        ref_key (str): the reference model, such as stw105 or eara2021
+
+    Returns:
+        List[ModelLayouts]: the read-only layouts in the order of the panels
+    """
+    mapper = {
+        "stw105": load_stw105,
+        "eara2021": load_eara2021_ref,
+        "ak135": load_ak135,
+        "eara2021_1d": load_eara2021_1d_ref_model,
+        "eara2021_1d_stats": partial(
+            load_eara2021_1d_ref_model, path=eara2021_1d_stats_path
+        ),
+    }
+    ref_files = {
+        "stw105": [stw105_path],
+        "eara2021": [ref_path],
+        "ak135": [ak135_path],
+        "eara2021_1d": [eara2021_1d_ref_path],
+        "eara2021_1d_stats": [eara2021_1d_stats_path],
+    }
+    if ref_key not in mapper:
+        raise Exception(f"unknown reference model: {ref_key}")
+    registry = get_model_registry()
+    # the reference models are only loaded when a model is not in the registry
+    @cache
+    def reference(parameter: str) -> xr.DataArray:
+        return mapper[ref_key](parameter)
+
+    files = [eara2021_per_path] + ref_files[ref_key]
+    models = [
+        ("eara2021", lambda: load_eara2021(parameter, reference(parameter))),
+        ("fwea18", lambda: load_fwea18(parameter, reference(parameter))),
+        ("eara2014", lambda: load_eara2014(parameter, reference(parameter))),
+        ("glad_m25", lambda: load_glad_m25(parameter, reference("vs"))),
+    ]
+    model_files = {
+        "eara2021": eara2021_abs_path,
+        "fwea18": fwea18_abs_path,
+        "eara2014": eara2014_abs_path,
+        "glad_m25": glad_m25_abs_path,
+    }
+    res = [
+        registry.layouts(
+            f"changbaishan_{name}_{parameter}_per_{ref_key}",
+            lambda load=load: smooth_model(load()),
+            files + [model_files[name]],
+        )
+        for name, load in models
+    ]
+    # gap_p4 is a perturbation already
+    res.append(
+        registry.layouts(
+            "changbaishan_gap_p4",
+            lambda: smooth_model(load_gap_p4()),
+            [eara2021_per_path, gap_p4_per_path],
+        )
+    )
+    return res
+
+
+def changbaishan_plan_inputs(parameter: str, ref_key: str) -> dict:
+    # only the configurations affecting the plan, the others are used in rendering
+    return {"parameter": parameter, "ref_key": ref_key, "sampling": get_sampling_mode()}
+
+
+def changbaishan_plan_files() -> List[str]:
+    # the data files read by plan_changbaishan
+    model_files = [
+        "eara2021.nc",
+        "eara2021_per_ref.nc",
+        "mask.npy",
+        "stw105.txt",
+        "AK135F_AVG.csv",
+        "eara2021_1dref_just_average_not_actual.csv",
+        "eara2021_1dref_layer_stats.csv",
+        "eara2014.nc",
+        "fwea18.nc",
+        "GAP_P4_dvp.nc",
+        "glad-m25-vs-0.0-n4.nc",
+        "ref.nc",
+    ]
+    return [
+        resource(["model_files", name], normal_path=True, check=False)
+        for name in model_files
+    ] + [
+        resource(["isc_ehb", "catalog", "events.npy"], normal_path=True, check=False),
+        resource(["isc_ehb", "isc_ehb.csv"], normal_path=True, check=False),
+    ]
+
+
+def changbaishan_layers(inputs: dict) -> FigurePlan:
+    """the layers not depending on the models, shared by the figures of a family
+
+    Args:
+        inputs (dict): the output of changbaishan_plan_inputs
+
+    Returns:
+        FigurePlan: the track (lons, lats, deps, h), the mask section, the projected ehb
+            catalog and the 1D reference models
+    """
+    layers = FigurePlan()
+    # the lons and lats, sampled by the panel pixels, see utils.sampling
+    sampling = plan_profile_sampling(25, (0, 800), 6.9, 2.16, mode=inputs["sampling"])
+    points = pygmt.project(
+        center=start_point, endpoint=end_point, generate=sampling.track_spacing
+    )
+    lons: np.ndarray = points.r
+    lats: np.ndarray = points.s
+    deps = sampling.depths
+    layers["lons"] = lons
+    layers["lats"] = lats
+    layers["deps"] = deps
+    layers["h"] = np.linspace(0, 25, len(lons))
+    # mask
+    mask_model = get_model_registry().layouts(
+        "mask", load_mask, [eara2021_per_path, mask_path]
+    )
+    layers["mask_cs"] = model_interp(mask_model, lons, lats, deps)
+    ehb_catalog = project_ehb_catalog(
+        start_point, end_point, width=100, degree_limit=LENGTH
+    )
+    layers["ehb_dist"] = ehb_catalog["dist"].to_numpy()
+    layers["ehb_dep"] = ehb_catalog["dep"].to_numpy()
+    # * the 1D models
+    for parameter in ["vs", "vp"]:
+        layers["stw105_depth"], layers[f"stw105_{parameter}"] = load_stw105(
+            parameter, get_only_xy=True
+        )
+        layers["ak135_depth"], layers[f"ak135_{parameter}"] = load_ak135(
+            parameter, get_only_xy=True
+        )
+        layers["eara_depth"], layers[f"eara_{parameter}"] = load_eara2021_1d_ref(
+            parameter
+        )
+    return layers
+
+
+def plan_changbaishan(inputs: dict, layers: Optional[FigurePlan] = None) -> FigurePlan:
+    """the plan of a changbaishan models figure, the layers and the section of each
+    model, the sections are in the panels 0 to 4
+
+    Args:
+        inputs (dict): the output of changbaishan_plan_inputs
+        layers (Optional[FigurePlan], optional): the output of changbaishan_layers,
+            shared by the figures of a family. Defaults to None.
+
+    Returns:
+        FigurePlan: the plan
+    """
+    if layers is None:
+        layers = changbaishan_layers(inputs)
+    plan = FigurePlan(layers.arrays, layers.attrs)
+    models = changbaishan_models(inputs["parameter"], inputs["ref_key"])
+    for index, model in enumerate(models):
+        cross_section = model_interp(
+            model, layers["lons"], layers["lats"], layers["deps"]
+        )
+        # the contours are drawn without the mask
+        plan[f"{index}/contour"] = cross_section
+        plan[f"{index}/image"] = np.where(
+            layers["mask_cs"] < 0.3, np.nan, cross_section
+        )
+    return plan
+
+
+def changbaishan_plan_path(parameter: str, ref_key: str) -> str:
+    inputs = changbaishan_plan_inputs(parameter, ref_key)
+    return plan_path(
+        plan_changbaishan,
+        plan_key(plan_changbaishan, inputs, changbaishan_plan_files()),
+    )
+
+
+def changbaishan_plan(
+    parameter: str, ref_key: str, layers: Optional[FigurePlan] = None
+) -> FigurePlan:
+    """the plan of a changbaishan models figure from the cache, or compute and cache it
+
+    Args:
+        parameter (str): vs or vp
+        ref_key (str): the reference model, such as stw105 or eara2021
+        layers (Optional[FigurePlan], optional): the output of changbaishan_layers, used
+            if the plan is not cached. Defaults to None.
+
+    Returns:
+        FigurePlan: the plan
+    """
+    path = changbaishan_plan_path(parameter, ref_key)
+    if isfile(path):
+        return FigurePlan.load(path)
+    plan = plan_changbaishan(changbaishan_plan_inputs(parameter, ref_key), layers)
+    plan.save(path)
+    return plan
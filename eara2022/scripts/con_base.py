@@ -1,125 +1,79 @@
 import string
-from functools import cache
+from typing import Iterable, Tuple
 
 import numpy as np
 import pygmt
 import xarray as xr
 from eara2022 import resource, save_path
 from eara2022.utils import get_vol_list
-from eara2022.utils.plot import plot_place_holder
-from eara2022.utils.slice import (
-    extend_line,
-    gmt_lat_as_dist,
-    gmt_lon_as_dist,
-    model_interp,
-    topo_interp,
+from eara2022.utils.figure_plan import FigurePlan
+from eara2022.utils.plot import BatchedFigure, plot_place_holder
+from eara2022.utils.profile_plan import (
+    compute_profile_plans,
+    plan_profiles,
+    profile_panels,
+    profile_plan_inputs,
+    render_profile_family,
 )
-from eara2022.utils.project_ehb import project_ehb_catalog
-from scipy import interpolate
+from eara2022.utils.slab2 import plot_slab_contours
+
+# * the resource inputs, the figures are rebuilt when they change, see utils.build
+INPUTS = [
+    ["model_files", "eara2021.nc"],
+    ["model_files", "eara2021_per_ref.nc"],
+    ["model_files", "mask.npy"],
+    ["model_files", "stw105.txt"],
+    ["model_files", "AK135F_AVG.csv"],
+    ["cpt", "dvs_6p_nan.cpt"],
+    ["cpt", "land_sea.cpt"],
+    ["Plate_Boundaries", "nuvel1_boundaries"],
+    ["China_blocks", "block2d_mod.txt"],
+    ["China_blocks", "China_Basins"],
+    ["Volcanoes", "volcanoes.tsv"],
+    ["slab2"],
+    ["isc_ehb", "isc_ehb.csv"],
+    ["isc_ehb", "catalog", "events.npy"],
+]
+
+
+# * lines
+CON_LINES = [
+    (95, 28, 110, 26, "lon"),
+    (95, 25, 110, 32, "lon"),
+    (95, 31, 110, 29, "lon"),
+    (105, 39, 120, 38, "lon"),
+    (105, 37, 120, 36, "lon"),
+    # (107, 32, 112, 47, "lat"),
+    # (115, 42, 130, 46, "lon"),
+    # (115, 49, 130, 44, "lon"),
+]
+
+
+def con_plan_inputs(conf: dict) -> dict:
+    # only the configurations affecting the plan, the others are used in rendering
+    return profile_plan_inputs(
+        conf, CON_LINES, abs_height=0.7, relief_registration="gridline"
+    )
 
 
-def con_plot_base(conf: dict) -> None:
-    # * load the model
-    eara2021_per_path = resource(
-        ["model_files", "eara2021_per_ref.nc"], normal_path=True
-    )
-    eara2021_abs_path = resource(["model_files", "eara2021.nc"], normal_path=True)
-    mask_path = resource(["model_files", "mask.npy"], normal_path=True)
-    copy_model: xr.DataArray = xr.open_dataset(eara2021_per_path)[conf["parameter"]]
-    stw105_path = resource(["model_files", "stw105.txt"], normal_path=True)
-    ak135_path = resource(["model_files", "AK135F_AVG.csv"], normal_path=True)
-    copy_model: xr.DataArray = xr.open_dataset(eara2021_per_path)["vs"]
-
-    # * lines
-    all_lines = [
-        (95, 28, 110, 26, "lon"),
-        (95, 25, 110, 32, "lon"),
-        (95, 31, 110, 29, "lon"),
-        (105, 39, 120, 38, "lon"),
-        (105, 37, 120, 36, "lon"),
-        # (107, 32, 112, 47, "lat"),
-        # (115, 42, 130, 46, "lon"),
-        # (115, 49, 130, 44, "lon"),
-    ]
-
-    def load_stw105(parameter: str) -> xr.DataArray:
-        stw105 = np.loadtxt(stw105_path)
-        r = stw105[:, 0]
-        if parameter == "vs":
-            v_v = stw105[:, 3]
-            v_h = stw105[:, 7]
-            v = np.sqrt((2 * v_v**2 + v_h**2) / 3)
-        elif parameter == "vp":
-            v_v = stw105[:, 2]
-            v_h = stw105[:, 6]
-            v = np.sqrt((v_v**2 + 4 * v_h**2) / 5)
-        f = interpolate.interp1d((6371000 - r) / 1000, v)
-        stw105_depth = f(np.arange(0, 2005, 10)) / 1000
-        stw105_abs_data = copy_model.copy()
-        for index in range(201):
-            stw105_abs_data.data[:, :, index] = stw105_depth[index]
-        return stw105_abs_data
-
-    def load_ak135(parameter: str) -> xr.DataArray:
-        ak135 = np.loadtxt(ak135_path, delimiter=",")
-        h = ak135[:, 0]
-        if parameter == "vp":
-            v = ak135[:, 2]
-        else:
-            v = ak135[:, 3]
-        f = interpolate.interp1d(h, v)
-        ak135_depth = f(np.arange(0, 2005, 10))
-        ak135_abs_data = copy_model.copy()
-        for index in range(201):
-            ak135_abs_data.data[:, :, index] = ak135_depth[index]
-        return ak135_abs_data
-
-    def smooth_model(model: xr.DataArray) -> xr.DataArray:
-        model[:, :, 41] = (model[:, :, 40] + model[:, :, 42]) / 2
-        model[:, :, 65] = (3 * model[:, :, 64] + 1 * model[:, :, 67]) / 4
-        model[:, :, 66] = (1 * model[:, :, 64] + 3 * model[:, :, 67]) / 4
-        return model
-
-    def load_eara2021_per(parameter: str) -> xr.DataArray:
-        eara2021_ref = xr.open_dataset(eara2021_per_path)[parameter]
-        return eara2021_ref * 100
-
-    def load_eara2021_abs(parameter: str) -> xr.DataArray:
-        eara2021_abs = xr.open_dataset(eara2021_abs_path)[parameter]
-        return eara2021_abs
-
-    def load_mask() -> xr.DataArray:
-        mask = np.load(mask_path)
-        mask_xarray = copy_model.copy()
-        mask_xarray.data = mask
-        return mask_xarray
-
-    @cache
-    def prepare_plot(idx: int, length: float) -> dict:
-        # * prepare plotting for each idx
-        startlon, startlat, endlon, endlat, thetype = all_lines[idx]
-        start = (startlon, startlat)
-        end = (endlon, endlat)
-        endlon, endlat = extend_line(start, end, length)
-        if (thetype == "lat" and startlat > endlat) or (
-            thetype == "lon" and startlon > endlon
-        ):
-            startlon, startlat, endlon, endlat = endlon, endlat, startlon, startlat
-        start = (startlon, startlat)
-        end = (endlon, endlat)
-        # * generate the plotting lons, lats for interp
-        # we should project along specific direction
-        points = pygmt.project(center=list(start), endpoint=list(end), generate=0.02)
-        res = {
-            "start": start,
-            "end": end,
-            "type": thetype,
-            "lons": points.r,
-            "lats": points.s,
-            "deps": np.linspace(0, 1000, 1001),
-            "deps_abs": np.linspace(0, 100, 101),
-        }
-        return res
+def plan_con(inputs: dict) -> FigurePlan:
+    # the plan of the con figure, see utils.profile_plan
+    return plan_profiles(inputs)
+
+
+def con_panels(conf: dict, prepare=None) -> Iterable[Tuple[FigurePlan, str]]:
+    # the panels of the con figure, rendered from the cached plan if it exists
+    return profile_panels(plan_con, con_plan_inputs(conf), prepare)
+
+
+def render_con(conf: dict, panels: Iterable[Tuple[FigurePlan, str]]) -> None:
+    """draw the con figure from its panels, only the GMT calls are issued
+
+    Args:
+        conf (dict): the configuration of the figure
+        panels (Iterable[Tuple[FigurePlan, str]]): the output of con_panels, the
+            plan and the axis annotation of each line in order
+    """
 
     def generate_offset() -> dict[str, np.ndarray]:
         # generate the offset array
@@ -160,13 +114,13 @@ def con_plot_base(conf: dict) -> None:
         offset: dict[str, np.ndarray],
         row: int,
         col: int,
-        info: dict,
+        panel: FigurePlan,
         annote: str,
-        eara: xr.DataArray,
     ) -> None:
         fig.shift_origin(xshift=offset["x"][row][col], yshift=offset["y"][row][col])
 
-        xlabel = "Longitude (degree)" if info["type"] == "lon" else "Latitude (degree)"
+        thetype = panel.attrs["type"]
+        xlabel = "Longitude (degree)" if thetype == "lon" else "Latitude (degree)"
         with pygmt.config(MAP_FRAME_TYPE="plain", MAP_TICK_LENGTH="0p"):
             if col == 0:
                 fig.basemap(
@@ -181,14 +135,10 @@ def con_plot_base(conf: dict) -> None:
                     frame=["wSen", f'pxc{annote}+l"{xlabel}"', "yaf"],
                 )
 
-        cross_section = model_interp(eara, info["lons"], info["lats"], info["deps"])
         cross_section_xarray = xr.DataArray(
-            cross_section,
+            panel["per"],
             dims=("h", "v"),
-            coords={
-                "h": np.linspace(0, conf["length"], len(info["lons"])),
-                "v": info["deps"],
-            },
+            coords={"h": panel["model_h"], "v": panel["deps"]},
         )
         fig.grdimage(cross_section_xarray.T)
         for interval in ["+-2"]:
@@ -208,28 +158,25 @@ def con_plot_base(conf: dict) -> None:
                 annotation=interval + "+f8p+u%",
             )
         # 410 and 660
-        y_410 = np.zeros_like(info["lons"])
+        y_410 = np.zeros_like(panel["h"])
         y_410[:] = 410
-        y_650 = np.zeros_like(info["lons"])
+        y_650 = np.zeros_like(panel["h"])
         y_650[:] = 650
         fig.plot(
-            x=np.linspace(0, conf["length"], len(info["lons"])),
+            x=panel["h"],
             y=y_410,
             pen="0.5p,black,dashed",
         )
         fig.plot(
-            x=np.linspace(0, conf["length"], len(info["lons"])),
+            x=panel["h"],
             y=y_650,
             pen="0.5p,black,dashed",
         )
 
         # ehb catalog
-        ehb_catalog = project_ehb_catalog(
-            info["start"], info["end"], width=100, degree_limit=conf["length"]
-        )
         fig.plot(
-            x=ehb_catalog["dist"],
-            y=ehb_catalog["dep"],
+            x=panel["ehb_dist"],
+            y=panel["ehb_dep"],
             style="c0.1c",
             pen="0.01c,magenta",
         )
@@ -246,9 +193,8 @@ def con_plot_base(conf: dict) -> None:
         offset: dict[str, np.ndarray],
         row: int,
         col: int,
-        info: dict,
+        panel: FigurePlan,
         annote: str,
-        eara_abs: xr.DataArray,
     ) -> None:
         fig.shift_origin(xshift=offset["x"][row][col], yshift=offset["yabs"][row][col])
         with pygmt.config(MAP_FRAME_TYPE="plain", MAP_TICK_LENGTH="0p"):
@@ -264,16 +210,10 @@ def con_plot_base(conf: dict) -> None:
                     region=f"0/{conf['length']}/0/100",
                     frame=["wsen", f"pxc{annote}", "ya100f50"],
                 )
-        cross_section = model_interp(
-            eara_abs, info["lons"], info["lats"], info["deps_abs"]
-        )
         cross_section_xarray = xr.DataArray(
-            cross_section,
+            panel["abs"],
             dims=("h", "v"),
-            coords={
-                "h": np.linspace(0, conf["length"], len(info["lons"])),
-                "v": info["deps_abs"],
-            },
+            coords={"h": panel["model_h"], "v": panel["deps_abs"]},
         )
         fig.grdimage(cross_section_xarray.T)
 
@@ -289,9 +229,8 @@ def con_plot_base(conf: dict) -> None:
         offset: dict[str, np.ndarray],
         row: int,
         col: int,
-        info: dict,
+        panel: FigurePlan,
         annote: str,
-        grd_topo: xr.DataArray,
     ) -> None:
         fig.shift_origin(xshift=offset["x"][row][col], yshift=offset["ytopo"][row][col])
         with pygmt.config(MAP_FRAME_TYPE="plain", MAP_TICK_LENGTH="0p"):
@@ -301,22 +240,16 @@ def con_plot_base(conf: dict) -> None:
                 frame=["lsrn", "ya2500f", f"pxc{annote}"],
             )
 
-        grd_interp_result = topo_interp(grd_topo, info["lons"], info["lats"])
-        grd_interp_result_above = grd_interp_result.copy()
-        grd_interp_result_above[grd_interp_result_above < 0] = 0
-        grd_interp_result_below = grd_interp_result.copy()
-        grd_interp_result_below[grd_interp_result_below > 0] = 0
-
         fig.plot(
-            x=np.linspace(0, conf["length"], len(info["lons"])),
-            y=grd_interp_result_above,
+            x=panel["h"],
+            y=panel["topo_above"],
             pen="black",
             close="+y0",
             color="gray",
         )
         fig.plot(
-            x=np.linspace(0, conf["length"], len(info["lons"])),
-            y=grd_interp_result_below,
+            x=panel["h"],
+            y=panel["topo_below"],
             pen="black",
             close="+y0",
             color="lightblue",
@@ -330,27 +263,29 @@ def con_plot_base(conf: dict) -> None:
         )
 
     def plot_text(fig: pygmt.Figure, idx: int) -> None:
+        # * the labels share the font, so they are drawn in one call
+        batch = BatchedFigure(fig)
         if idx == 0:
-            fig.text(x=5.5, y=4000, text=f"Chuandian Block", font="16p,Helvetica,red")
-            fig.text(
+            batch.text(x=5.5, y=4000, text=f"Chuandian Block", font="16p,Helvetica,red")
+            batch.text(
                 x=11.5, y=2000, text=f"South China Block", font="16p,Helvetica,red"
             )
         if idx == 1:
-            fig.text(x=1.5, y=2000, text=f"Burma", font="16p,Helvetica,red")
-            fig.text(x=6, y=4500, text=f"Chuandian Block", font="16p,Helvetica,red")
-            fig.text(x=12, y=2000, text=f"Sichuan Basin", font="16p,Helvetica,red")
+            batch.text(x=1.5, y=2000, text=f"Burma", font="16p,Helvetica,red")
+            batch.text(x=6, y=4500, text=f"Chuandian Block", font="16p,Helvetica,red")
+            batch.text(x=12, y=2000, text=f"Sichuan Basin", font="16p,Helvetica,red")
         if idx == 2:
-            fig.text(x=3, y=2500, text=f"Qiangtang Block", font="16p,Helvetica,red")
-            fig.text(x=5, y=4000, text=f"Chuandian Block", font="16p,Helvetica,red")
-            fig.text(x=8.5, y=2000, text=f"Sichuan Basin", font="16p,Helvetica,red")
+            batch.text(x=3, y=2500, text=f"Qiangtang Block", font="16p,Helvetica,red")
+            batch.text(x=5, y=4000, text=f"Chuandian Block", font="16p,Helvetica,red")
+            batch.text(x=8.5, y=2000, text=f"Sichuan Basin", font="16p,Helvetica,red")
         if idx == 3:
-            fig.text(x=3, y=2500, text=f"Ordos Block", font="16p,Helvetica,red")
-            fig.text(x=6, y=4000, text=f"Taihang Mountains", font="16p,Helvetica,red")
-            fig.text(x=9.5, y=2000, text=f"Huabei Plain", font="16p,Helvetica,red")
+            batch.text(x=3, y=2500, text=f"Ordos Block", font="16p,Helvetica,red")
+            batch.text(x=6, y=4000, text=f"Taihang Mountains", font="16p,Helvetica,red")
+            batch.text(x=9.5, y=2000, text=f"Huabei Plain", font="16p,Helvetica,red")
         if idx == 4:
-            fig.text(x=3, y=2500, text=f"Ordos Block", font="16p,Helvetica,red")
-            fig.text(x=6, y=4000, text=f"Taihang Mountains", font="16p,Helvetica,red")
-            fig.text(x=9.5, y=2000, text=f"Huabei Plain", font="16p,Helvetica,red")
+            batch.text(x=3, y=2500, text=f"Ordos Block", font="16p,Helvetica,red")
+            batch.text(x=6, y=4000, text=f"Taihang Mountains", font="16p,Helvetica,red")
+            batch.text(x=9.5, y=2000, text=f"Huabei Plain", font="16p,Helvetica,red")
         # if idx == 5:
         #     fig.text(x=2, y=4000, text=f"Qinlin", font="16p,Helvetica,red")
         #     fig.text(x=5.5, y=3000, text=f"Ordos Block", font="16p,Helvetica,red")
@@ -366,6 +301,7 @@ def con_plot_base(conf: dict) -> None:
         #     fig.text(
         #         x=10.5, y=3000, text=f"Changbai Mountains", font="16p,Helvetica,red"
         #     )
+        batch.flush()
 
     def plot_base_map(fig: pygmt.Figure) -> None:
         fig.coast(water="167/194/223")
@@ -376,12 +312,7 @@ def con_plot_base(conf: dict) -> None:
         fig.plot(data=resource(["Plate_Boundaries", "nuvel1_boundaries"]), pen="2p,red")
         fig.plot(data=resource(["China_blocks", "block2d_mod.txt"]), pen="0.5p")
         fig.plot(data=resource(["China_blocks", "China_Basins"]), pen="0.5p")
-        for slab in ["izu", "kur", "phi", "ryu", "man"]:
-            fig.grdcontour(
-                resource(["slab2", f"{slab}_slab2_depth.grd"]),
-                interval=100,
-                pen="1.5p,magenta",
-            )
+        plot_slab_contours(fig, level=100, pen="1.5p,magenta")
         vols = get_vol_list()
         fig.plot(x=vols[:, 1], y=vols[:, 0], style="kvolcano/0.4", pen="red")
 
@@ -396,42 +327,11 @@ def con_plot_base(conf: dict) -> None:
     # plot_place_holder(fig)
     offset = generate_offset()
 
-    # prepare plotting
-    mask = load_mask()
-    eara_abs = load_eara2021_abs(conf["parameter"])
-
-    # * different reference models
-    if conf["ref"] == "eara2022":
-        eara = load_eara2021_per(conf["parameter"])
-    else:
-        if conf["ref"] == "stw105":
-            ref_model = load_stw105(conf["parameter"])
-        elif conf["ref"] == "ak135":
-            ref_model = load_ak135(conf["parameter"])
-        else:
-            raise Exception(f"unknown reference model: {conf['ref']}")
-        eara = eara_abs.copy()
-        eara.data = (eara.data / ref_model.data - 1) * 100
-        smooth_model(eara)
-
-    eara.data[mask.data < 0.3] = np.nan
-    eara_abs.data[mask.data < 0.3] = np.nan
-    grd_topo = pygmt.datasets.load_earth_relief(
-        resolution="02m", region=[83, 160, 10, 60], registration="gridline"
-    )
-
-    # * plot figures
-    for idx in range(len(all_lines)):
+    # * plot figures, the later panels are still prepared while drawing
+    drawn = []
+    for idx, (panel, annote) in enumerate(panels):
         row, col = divmod(idx, 3)
-        info = prepare_plot(idx, length=conf["length"])
-        if info["type"] == "lat":
-            annote = gmt_lat_as_dist(
-                info["start"], info["end"], a_interval=5, g_interval=1
-            )
-        elif info["type"] == "lon":
-            annote = gmt_lon_as_dist(
-                info["start"], info["end"], a_interval=5, g_interval=1
-            )
+        drawn.append(panel)
 
         # * perturbation
         pygmt.makecpt(
@@ -440,14 +340,14 @@ def con_plot_base(conf: dict) -> None:
             continuous=True,
             background="o",
         )
-        plot_per(fig, offset, row, col, info, annote, eara)
+        plot_per(fig, offset, row, col, panel, annote)
         # * abs
         pygmt.makecpt(
             cmap="jet", series=conf["abs_cpt"], continuous=True, background="o"
         )
-        plot_abs(fig, offset, row, col, info, annote, eara_abs)
+        plot_abs(fig, offset, row, col, panel, annote)
         # * topo
-        plot_topo(fig, offset, row, col, info, annote, grd_topo)
+        plot_topo(fig, offset, row, col, panel, annote)
         # * texts
         plot_text(fig, idx)
 
@@ -461,33 +361,32 @@ def con_plot_base(conf: dict) -> None:
     plot_base_map(fig)
     # plot arrows
     style = "=0.2i+s+e+a30+gblue+h0.5+p0.3i,blue"
-    for idx in range(len(all_lines)):
-        info = prepare_plot(idx, length=conf["length"])
+    for idx, panel in enumerate(drawn):
         fig.plot(
-            data=[list(info["end"]) + list(info["start"])],
+            data=[panel.attrs["end"] + panel.attrs["start"]],
             style=style,
             pen="0.05i,blue",
         )
         if idx in [3, 4]:
             fig.text(
-                x=info["lons"][len(info["lons"]) // 2],
-                y=info["lats"][len(info["lats"]) // 2],
+                x=panel["lons"][len(panel["lons"]) // 2],
+                y=panel["lats"][len(panel["lats"]) // 2],
                 text=f"({string.ascii_lowercase[idx]})",
                 fill="white",
                 font="10p,Helvetica-Bold,black",
             )
         elif idx in [0, 1, 2, 5]:
             fig.text(
-                x=info["lons"][len(info["lons"]) // 4 * 3],
-                y=info["lats"][len(info["lats"]) // 4 * 3],
+                x=panel["lons"][len(panel["lons"]) // 4 * 3],
+                y=panel["lats"][len(panel["lats"]) // 4 * 3],
                 text=f"({string.ascii_lowercase[idx]})",
                 fill="white",
                 font="10p,Helvetica-Bold,black",
             )
         else:
             fig.text(
-                x=info["lons"][len(info["lons"]) // 4],
-                y=info["lats"][len(info["lats"]) // 4],
+                x=panel["lons"][len(panel["lons"]) // 4],
+                y=panel["lats"][len(panel["lats"]) // 4],
                 text=f"({string.ascii_lowercase[idx]})",
                 fill="white",
                 font="10p,Helvetica-Bold,black",
@@ -524,3 +423,27 @@ def con_plot_base(conf: dict) -> None:
     )
 
     save_path(fig, conf["save_name"])
+
+
+def con_plot_base(conf: dict) -> None:
+    # * the panels are prepared in the threads while the earlier ones are drawn
+    render_con(conf, con_panels(conf))
+
+
+def render_con_family(confs: list[dict]) -> None:
+    """render several con figures, such as the reference models and parameters, in
+    one pass, the layers not depending on the model are prepared once, see
+    utils.profile_plan.render_profile_family
+
+    Args:
+        confs (list[dict]): the configurations of the figures
+    """
+    inputs_list = [con_plan_inputs(conf) for conf in confs]
+    render_profile_family(plan_con, confs, inputs_list, render_con)
+
+
+def compute_con_plans(confs: list[dict], max_workers: int = None) -> list[FigurePlan]:
+    # * the missing plans of several con figures are computed in worker processes
+    return compute_profile_plans(
+        plan_con, [con_plan_inputs(conf) for conf in confs], max_workers=max_workers
+    )
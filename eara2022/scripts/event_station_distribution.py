@@ -5,6 +5,16 @@ import pygmt
 from eara2022 import resource, save_path
 from eara2022.utils import generate_tmp_file
 from eara2022.utils.gcmt import collect_gcmt_information, gcmt_to_psmeca
+from eara2022.utils.slab2 import plot_slab_contours
+from eara2022.utils.stations import get_station_index
+
+# * the resource inputs, the figures are rebuilt when they change, see utils.build
+INPUTS = [
+    ["cmt"],
+    ["Plate_Boundaries", "nuvel1_boundaries"],
+    ["slab2"],
+    ["stations", "STATIONS_filtered"],
+]
 
 # * events cpt
 # events_cpt_content = """
@@ -107,9 +117,7 @@ def plot_base_map(fig: pygmt.Figure) -> None:
               borders=["1/0.1p,black"], lakes=["GRAY81"])
     fig.plot(data=resource(
         ['Plate_Boundaries', 'nuvel1_boundaries']), pen="2p,black")
-    for slab in ['izu', 'kur', 'phi', 'ryu', 'man']:
-        fig.grdcontour(
-            resource(['slab2', f'{slab}_slab2_depth.grd']), interval=100, pen="1p,magenta")
+    plot_slab_contours(fig, level=100, pen="1p,magenta")
     fig.plot(x=[91.3320117152011, 144.284491292185, 174.409435753150, 74.6060844556399, 91.3320117152011], y=[
              9.37366242174489, 2.08633373396527, 48.6744705245903, 61.1396992149365, 9.37366242174489], pen="2p,navyblue")
 
@@ -147,7 +155,8 @@ def main():
         # station map
         fig.basemap(region=[70, 160, 0, 62], projection="M?", panel=1)
         plot_base_map(fig)
-        fig.plot(data=resource(['stations', 'STATIONS_filtered']),
+        stations = get_station_index()
+        fig.plot(x=stations.lons, y=stations.lats, color=stations.codes,
                  style="t0.2c", cmap=cpt_file_stations)  # remove unused stations
 
     # * legend
@@ -6,9 +6,18 @@ compare the misfit distribution between m00 and m20
 from os.path import join
 from typing import List
 
-import numpy as np
 import pygmt
 from eara2022 import resource, save_path
+from eara2022.instrument import profiled
+from eara2022.utils.cache import file_fingerprint, load_cache, save_cache
+from eara2022.utils.histogram import HistogramStats, histogram_stats
+from eara2022.utils.misfit_tables import load_misfit_runs, select_phase
+
+# * the resource inputs, the figures are rebuilt when they change, see utils.build
+INPUTS = [
+    ["misfit", "iter1_high_misfit"],
+    ["misfit", "s20_high_misfit"],
+]
 
 phases = ["z", "r", "t", "surface_z", "surface_r", "surface_t"]
 categories = {
@@ -18,19 +27,6 @@ categories = {
 }
 
 
-def load_data(dirname: str) -> dict[str, dict[str, np.ndarray]]:
-    # * given dirname, load misfit information
-    # cols: 2,0,1 dt,nzcc,cc
-    res = {}
-    for phase in phases:
-        ds = np.loadtxt(join(dirname, f"{phase}.txt"))
-        res[phase] = {}
-        res[phase]['dt'] = ds[:, 2]
-        res[phase]['nzcc'] = ds[:, 0]
-        res[phase]['cc'] = ds[:, 1]
-    return res
-
-
 # * plotting configurations
 ylabels = ["Ver. Body Wave", "Rad. Body Wave", "Tan. Body Wave",
            "Ver. Surface Wave", "Rad. Surface Wave", "Tan. Surface Wave"]
@@ -71,14 +67,41 @@ conf: dict[str, dict[str, List[float]]] = {
 }
 
 
+@profiled()
+def load_histograms(dirname: str) -> dict[str, dict[str, HistogramStats]]:
+    # * given dirname, bin the misfit information with the bar width of each panel
+    # the bins are cached by the fingerprint of the table, so the table is only loaded when it changes
+    res = {}
+    # the misfit tables of the run, only loaded for a missing cache
+    run = None
+    for iphase, phase in enumerate(phases):
+        path = join(dirname, f"{phase}.txt")
+        fingerprint = file_fingerprint(path)
+        res[phase] = {}
+        for category in categories:
+            bar_width = conf[category]['bar_width'][iphase]
+            cache_name = f"hist_{fingerprint}_{category}_{bar_width}"
+            loaded = load_cache(cache_name)
+            if loaded is not None:
+                res[phase][category] = HistogramStats.from_array(loaded)
+                continue
+            if run is None:
+                run = load_misfit_runs([dirname], phases)[0]
+            res[phase][category] = histogram_stats(
+                select_phase(run, phase)[category], bar_width)
+            save_cache(file_name=cache_name,
+                       content=res[phase][category].to_array())
+    return res
+
+
 def main() -> None:
     fig = pygmt.Figure()
     pygmt.config(FONT_LABEL="15p", MAP_LABEL_OFFSET="10p",
                  FONT_ANNOT_PRIMARY="13p")
 
-    old_data = load_data(
+    old_data = load_histograms(
         resource(['misfit', 'iter1_high_misfit'], normal_path=True))
-    new_data = load_data(
+    new_data = load_histograms(
         resource(['misfit', 's20_high_misfit'], normal_path=True))
 
     with fig.subplot(nrows=6, ncols=3, figsize=("14.4i", "17.8i"), sharex='b', margins=['0.2i', '0.06i'], frame=["WSen"], autolabel="(a)"):
@@ -95,16 +118,17 @@ def main() -> None:
                     frame[1] += f'+l"{ylabels[iphase]}"'
                     fig.basemap(projection="X?", frame=frame,
                                 region=region, panel=[iphase, icategory])
-                # plot histogram
-                fig.histogram(data=old_data[phase][category], series=conf[category]
-                              ['bar_width'][iphase], pen="2p,black", stairs=True, projection="X?/?")
-                fig.histogram(data=new_data[phase][category], series=conf[category]
-                              ['bar_width'][iphase], pen="2p,red1", stairs=True, projection="X?/?")
+                # plot histogram, as the stairs of the precomputed bins
+                old_stats, new_stats = old_data[phase][category], new_data[phase][category]
+                x, y = old_stats.stairs()
+                fig.plot(x=x, y=y, pen="2p,black")
+                x, y = new_stats.stairs()
+                fig.plot(x=x, y=y, pen="2p,red1")
                 # dt distribution statistics
                 if icategory == 0:
-                    fig.text(position="TR", text=f"@~D@~T = {np.nanmean(new_data[phase][category]):.2f} \\261 {np.nanstd(new_data[phase][category]):.2f}",
+                    fig.text(position="TR", text=f"@~D@~T = {new_stats.mean:.2f} \\261 {new_stats.std:.2f}",
                              font="12p,Helvetica-Bold,red1", offset="j0.05i/0.15i")
-                    fig.text(position="TR", text=f"@~D@~T = {np.nanmean(old_data[phase][category]):.2f} \\261 {np.nanstd(old_data[phase][category]):.2f}",
+                    fig.text(position="TR", text=f"@~D@~T = {old_stats.mean:.2f} \\261 {old_stats.std:.2f}",
                              font="12p,Helvetica-Bold,black", offset="j0.05i/0.30i")
 
     save_path(fig, "hist")
@@ -9,113 +9,132 @@ from typing import List
 import numpy as np
 import pygmt
 from eara2022 import resource, save_path
+from eara2022.utils.misfit_history import (MisfitHistory,
+                                           convert_legacy_misfit,
+                                           get_misfit_history,
+                                           is_legacy_converted)
+from eara2022.utils.plot import BatchedFigure
 from numpy.typing import NDArray
 
-# * load misfit dataset
-misfit_high: dict[str, NDArray] = np.load(
-    resource(['misfit', 'misfit_high_tosave.npy'], normal_path=True), allow_pickle=True).all()
-misfit_low: dict[str, NDArray] = np.load(
-    resource(['misfit', 'misfit_low_tosave.npy'], normal_path=True), allow_pickle=True).all()
+# * the resource inputs, the figures are rebuilt when they change, see utils.build
+INPUTS = [
+    ["misfit", "misfit_low_tosave.npy"],
+    ["misfit", "misfit_high_tosave.npy"],
+]
+
+
+def load_misfit_history() -> MisfitHistory:
+    # * the misfit history, converted again from the legacy npy dicts whenever they change
+    history_path = resource(
+        ['misfit', 'misfit_history.bin'], normal_path=True, check=False)
+    stages = {
+        1: (resource(['misfit', 'misfit_low_tosave.npy'], normal_path=True), 0, 10),
+        2: (resource(['misfit', 'misfit_high_tosave.npy'], normal_path=True), 10, 20),
+    }
+    if not is_legacy_converted(stages, history_path):
+        convert_legacy_misfit(stages, history_path)
+        # the shared history may still map the replaced file
+        get_misfit_history.cache_clear()
+    return get_misfit_history(history_path)
 
 
 def plot_left_table(fig: pygmt.Figure, projection: str) -> None:
     # * plot the inside lines and texts for the left table
-    fig.plot(x=[0, 1], y=[0.25, 0.25], pen="0.5p,black", projection=projection)
-    fig.plot(x=[0, 1], y=[0.5, 0.5], pen="0.5p,black", projection=projection)
-    fig.plot(x=[0, 1], y=[0.75, 0.75], pen="0.5p,black", projection=projection)
-    fig.plot(x=[0.3, 0.3], y=[0.25, 1],
-             pen="0.5p,black", projection=projection)
-    fig.plot(x=[0.65, 0.65], y=[0.25, 1],
-             pen="0.5p,black", projection=projection)
-    fig.text(x=0.15, y=0.875, text="Measurements No.",
-             font="8p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.475, y=0.875, text="Body Waves",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.825, y=0.875, text="Surface Waves",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.475, y=0.625, text="623120",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.825, y=0.625, text="130639",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.475, y=0.375, text="639173",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.825, y=0.375, text="148334",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.1, y=0.625, text="Stage 1",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.plot(x=0.22, y=0.625, style="a0.2i",
-             color="red", projection=projection)
-    fig.text(x=0.1, y=0.375, text="Stage 2",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.plot(x=0.22, y=0.375, style="d0.2i",
-             color="blue", projection=projection)
-    fig.text(x=0.5, y=0.125, text="Measured at the last iteration of each stage",
-             font="12p,Helvetica-Bold,black", projection=projection)
+    # the lines and texts with the same pen or font are drawn in one call
+    batch = BatchedFigure(fig)
+    batch.plot(x=[0, 1], y=[0.25, 0.25], pen="0.5p,black", projection=projection)
+    batch.plot(x=[0, 1], y=[0.5, 0.5], pen="0.5p,black", projection=projection)
+    batch.plot(x=[0, 1], y=[0.75, 0.75], pen="0.5p,black", projection=projection)
+    batch.plot(x=[0.3, 0.3], y=[0.25, 1],
+               pen="0.5p,black", projection=projection)
+    batch.plot(x=[0.65, 0.65], y=[0.25, 1],
+               pen="0.5p,black", projection=projection)
+    batch.text(x=0.15, y=0.875, text="Measurements No.",
+               font="8p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.475, y=0.875, text="Body Waves",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.825, y=0.875, text="Surface Waves",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.475, y=0.625, text="623120",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.825, y=0.625, text="130639",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.475, y=0.375, text="639173",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.825, y=0.375, text="148334",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.1, y=0.625, text="Stage 1",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.plot(x=0.22, y=0.625, style="a0.2i",
+               color="red", projection=projection)
+    batch.text(x=0.1, y=0.375, text="Stage 2",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.plot(x=0.22, y=0.375, style="d0.2i",
+               color="blue", projection=projection)
+    batch.text(x=0.5, y=0.125, text="Measured at the last iteration of each stage",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.flush()
 
 
 def plot_right_table(fig: pygmt.Figure, projection: str) -> None:
-    fig.plot(x=[0, 1], y=[0.25, 0.25], pen="0.5p,black", projection=projection)
-    fig.plot(x=[0, 1], y=[0.5, 0.5], pen="0.5p,black", projection=projection)
-    fig.plot(x=[0, 1], y=[0.75, 0.75], pen="0.5p,black", projection=projection)
-    fig.plot(x=[0.3, 0.3], y=[0.25, 1],
-             pen="0.5p,black", projection=projection)
-    fig.plot(x=[0.65, 0.65], y=[0.25, 1],
-             pen="0.5p,black", projection=projection)
-    fig.text(x=0.15, y=0.875, text="Period Range",
-             font="10p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.475, y=0.875, text="Body Waves",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.825, y=0.875, text="Surface Waves",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.475, y=0.625, text="10 - 40 s",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.825, y=0.625, text="40 - 120 s",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.475, y=0.375, text="8 - 40 s",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.825, y=0.375, text="30 - 120 s",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.text(x=0.1, y=0.625, text="Stage 1",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.plot(x=0.22, y=0.625, style="a0.2i",
-             color="red", projection=projection)
-    fig.text(x=0.1, y=0.375, text="Stage 2",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.plot(x=0.22, y=0.375, style="d0.2i",
-             color="blue", projection=projection)
-    fig.text(x=0.4, y=0.125, text="Starting Misfit at Each Stage:",
-             font="12p,Helvetica-Bold,black", projection=projection)
-    fig.plot(x=0.80, y=0.125, style="a0.2i", projection=projection)
-    fig.plot(x=0.87, y=0.125, style="d0.2i", projection=projection)
-
-
-def handle_misfit_npy(category: str) -> dict[str, dict[str, NDArray]]:
-    # * handle the misfit npy and convert to x and y array
-    # ! in the future, try to use better way to handle it
-    res = {
-        'source1': {
-            'x': np.array([0]),
-            'y': np.array(misfit_low[category][0:1])
-        },
-        'stage1': {
-            'x': np.arange(0, 11),
-            'y': np.hstack([misfit_low[category+"s"][0], misfit_low[category][1:11]])
-        },
-        'source2': {
-            'x': np.array([10]),
-            'y': np.array(misfit_high[category][10:11])
-        },
-        'stage2': {
-            'x': np.arange(10, 21),
-            'y': np.hstack([misfit_high[category+"s"][1], misfit_high[category][11:21]])
+    # the lines and texts with the same pen or font are drawn in one call
+    batch = BatchedFigure(fig)
+    batch.plot(x=[0, 1], y=[0.25, 0.25], pen="0.5p,black", projection=projection)
+    batch.plot(x=[0, 1], y=[0.5, 0.5], pen="0.5p,black", projection=projection)
+    batch.plot(x=[0, 1], y=[0.75, 0.75], pen="0.5p,black", projection=projection)
+    batch.plot(x=[0.3, 0.3], y=[0.25, 1],
+               pen="0.5p,black", projection=projection)
+    batch.plot(x=[0.65, 0.65], y=[0.25, 1],
+               pen="0.5p,black", projection=projection)
+    batch.text(x=0.15, y=0.875, text="Period Range",
+               font="10p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.475, y=0.875, text="Body Waves",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.825, y=0.875, text="Surface Waves",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.475, y=0.625, text="10 - 40 s",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.825, y=0.625, text="40 - 120 s",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.475, y=0.375, text="8 - 40 s",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.825, y=0.375, text="30 - 120 s",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.text(x=0.1, y=0.625, text="Stage 1",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.plot(x=0.22, y=0.625, style="a0.2i",
+               color="red", projection=projection)
+    batch.text(x=0.1, y=0.375, text="Stage 2",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.plot(x=0.22, y=0.375, style="d0.2i",
+               color="blue", projection=projection)
+    batch.text(x=0.4, y=0.125, text="Starting Misfit at Each Stage:",
+               font="12p,Helvetica-Bold,black", projection=projection)
+    batch.plot(x=0.80, y=0.125, style="a0.2i", projection=projection)
+    batch.plot(x=0.87, y=0.125, style="d0.2i", projection=projection)
+    batch.flush()
+
+
+def handle_misfit_history(history: MisfitHistory, category: str) -> dict[str, dict[str, NDArray]]:
+    # * query the misfit of each stage and convert to x and y array
+    # the first point of a stage is the misfit before the source inversion
+    res = {}
+    for stage in history.stages():
+        iterations, misfits = history.series(category, stage)
+        res[f'source{stage}'] = {
+            'x': iterations[:1],
+            'y': misfits[:1]
+        }
+        res[f'stage{stage}'] = {
+            'x': iterations,
+            'y': np.hstack([history.start(category, stage), misfits[1:]])
         }
-    }
     return res
 
 
-def plot_misfit(fig: pygmt.Figure, panel: int, category: str, yrange: List[float], ylabel: str, phase: str) -> None:
+def plot_misfit(fig: pygmt.Figure, history: MisfitHistory, panel: int, category: str, yrange: List[float], ylabel: str, phase: str) -> None:
     # * plot each panel
-    data = handle_misfit_npy(category=category)
+    data = handle_misfit_history(history, category=category)
     fig.basemap(region=[-1, 21]+list(yrange),
                 frame=["xaf", "yaf"], projection="X?", panel=panel)
 
@@ -164,6 +183,7 @@ def plot_misfit(fig: pygmt.Figure, panel: int, category: str, yrange: List[float
 
 def main():
     # * init
+    history = load_misfit_history()
     fig = pygmt.Figure()
     pygmt.config(FONT_LABEL="20p", MAP_LABEL_OFFSET="10p",
                  FONT_ANNOT_PRIMARY="20p")
@@ -190,7 +210,8 @@ def main():
                   "s, S, sS, SS, ScS", "Rayleigh Wave", "Rayleigh Wave", "Love Wave"]
         panels = [1, 3, 4, 5, 6, 7, 8]
         for category, yrange, panel, ylabel, phase in zip(categories, yranges, panels, ylabels, phases):
-            plot_misfit(fig, panel, category, yrange, ylabel, phase)
+            plot_misfit(fig, history, panel, category,
+                        yrange, ylabel, phase)
         # y labels
         for panel in [3, 6]:
             fig.basemap(region=[-1, 21]+list(yranges[panel-2]),
@@ -2,6 +2,11 @@ import pygmt
 
 from eara2022 import resource, save_path
 
+# * the resource inputs, the figures are rebuilt when they change, see utils.build
+INPUTS = [
+    ["paraview", "model.png"],
+]
+
 eps_path = resource(
     ['paraview', 'model.png'], normal_path=True)
 
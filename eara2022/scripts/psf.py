@@ -9,6 +9,17 @@ import xarray as xr
 from eara2022 import resource, save_path
 from eara2022.utils.psf import get_perturbation_array
 
+# * the resource inputs, the figures are rebuilt when they change, see utils.build
+INPUTS = [
+    ["psf", "psf_list.txt"],
+    ["model_files", "psf_vsv_bulk_iter19.nc"],
+    ["model_files", "mask.npy"],
+    ["cpt", "dvs_6p_nan.cpt"],
+    ["Plate_Boundaries", "nuvel1_boundaries"],
+    ["China_blocks", "block2d_mod.txt"],
+    ["China_blocks", "China_Basins"],
+]
+
 depths = [100, 300, 500, 700, 900]
 categories = ["per", "betav", "betah", "bulkc"]
 
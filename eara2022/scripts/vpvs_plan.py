@@ -0,0 +1,205 @@
+"""
+vpvs_plan.py
+
+the plan stage of the vp, vs, vp/vs and radial anisotropy depth slices. the render code is in vpvs_base, so
+re-styling does not compute the plans again, see utils.figure_plan.
+"""
+from functools import partial
+from os.path import isfile
+from typing import Iterator, List
+
+import numpy as np
+import xarray as xr
+from eara2022 import resource
+from eara2022.instrument import phase, profiled
+from eara2022.utils.figure_plan import FigurePlan, map_panels, plan_key, plan_path
+from eara2022.utils.model_layout import ModelLayouts
+from eara2022.utils.model_registry import get_model_registry
+from scipy import interpolate
+from scipy.ndimage import gaussian_filter
+
+# * settings
+np.seterr(divide='ignore')
+np.seterr(invalid='ignore')
+
+# * several paths for the models, some may unused
+eara2021_abs_path = resource(['model_files', 'eara2021.nc'], normal_path=True)
+eara2021_per_path = resource(
+    ['model_files', 'eara2021_per_ref.nc'], normal_path=True)
+stw105_path = resource(['model_files', 'stw105.txt'], normal_path=True)
+ak135_path = resource(['model_files', 'AK135F_AVG.csv'], normal_path=True)
+mask_path = resource(['model_files', 'mask.npy'], normal_path=True)
+
+# * load models with the respect to certain reference model
+# the read-only grid shared by the processes, copy it before writing to it
+copy_model: xr.DataArray = get_model_registry().model("eara2021_per_ref", "vs")
+
+MODEL_SHAPE = [421, 281, 201]
+
+
+@profiled()
+def load_stw105(parameter: str) -> xr.DataArray:
+    stw105 = np.loadtxt(stw105_path)
+    r = stw105[:, 0]
+    if parameter == "vs":
+        v_v = stw105[:, 3]
+        v_h = stw105[:, 7]
+        v = np.sqrt((2 * v_v ** 2 + v_h ** 2) / 3)
+    elif parameter == "vp":
+        v_v = stw105[:, 2]
+        v_h = stw105[:, 6]
+        v = np.sqrt((v_v ** 2 + 4*v_h ** 2) / 5)
+    f = interpolate.interp1d((6371000-r)/1000, v)
+    stw105_depth = f(np.arange(0, 2005, 10))/1000
+    stw105_abs_data = copy_model.copy()
+    for index in range(201):
+        stw105_abs_data.data[:, :, index] = stw105_depth[index]
+    return stw105_abs_data
+
+
+@profiled()
+def load_ak135(parameter: str) -> xr.DataArray:
+    ak135 = np.loadtxt(ak135_path, delimiter=',')
+    h = ak135[:, 0]
+    if parameter == "vp":
+        v = ak135[:, 2]
+    else:
+        v = ak135[:, 3]
+    f = interpolate.interp1d(h, v)
+    ak135_depth = f(np.arange(0, 2005, 10))
+    ak135_abs_data = copy_model.copy()
+    for index in range(201):
+        ak135_abs_data.data[:, :, index] = ak135_depth[index]
+    return ak135_abs_data
+
+
+def prepare_model(data: xr.Dataset, nzcc_mask: np.ndarray, model_type: str) -> xr.DataArray:
+    if model_type in ["vp", "vs"]:
+        to_interp_data = data[model_type]
+    elif model_type == "vp_vs":
+        to_interp_data = data["vp"]-data["vs"]
+    elif model_type == "radial":
+        to_interp_data = (data["vsh"]-data["vsv"])/data["vs"]
+    else:
+        raise Exception(
+            f"{model_type} is not a supported model_type. Try to use vp, vs, vp_vs, or radial.")
+
+    to_interp_data.data[nzcc_mask < 0.3] = np.nan
+    return to_interp_data
+
+
+def prepare_cross_section(model: ModelLayouts, depth: int, model_type: str) -> xr.DataArray:
+    hlat = np.linspace(10, 58, 201)
+    hlon = np.linspace(83, 155, 301)
+
+    # * a single depth of the grid points, read from the slice layout
+    values = model.interp(np.repeat(hlon, len(hlat)), np.tile(
+        hlat, len(hlon)), [depth], bounds_error=False)
+    plot_data = xr.DataArray(values.reshape(len(hlon), len(hlat)), dims=(
+        'hlon', 'hlat'), coords={'hlon': hlon, 'hlat': hlat})
+    plot_data = plot_data.T
+    if model_type == "radial":
+        plot_data.data = gaussian_filter(plot_data.data, sigma=2)
+    return plot_data
+
+
+def vpvs_plan_inputs(model_type: str, depths: List[int], ref: str) -> dict:
+    # only the configurations affecting the plan, the others are used in rendering
+    return {"model_type": model_type, "depths": [int(depth) for depth in depths], "ref": ref}
+
+
+def vpvs_plan_files() -> List[str]:
+    # the data files read by plan_vpvs
+    return [eara2021_abs_path, eara2021_per_path, mask_path, stw105_path, ak135_path]
+
+
+def vpvs_model(model_type: str, ref: str) -> ModelLayouts:
+    """the masked model of the depth slices, converted once to the profile and slice layouts, see
+    utils.model_layout
+
+    Args:
+        model_type (str): vp, vs, vp_vs or radial
+        ref (str): the reference model, eara2022, stw105 or ak135
+
+    Returns:
+        ModelLayouts: the read-only layouts
+    """
+    def build() -> xr.DataArray:
+        if model_type == "radial":
+            data: xr.Dataset = xr.open_dataset(
+                eara2021_abs_path)
+        else:
+            if ref == 'eara2022':
+                data: xr.Dataset = xr.open_dataset(
+                    eara2021_per_path)
+            else:
+                # other models are only for vs, vp, and vp_vs
+                data: xr.Dataset = xr.open_dataset(
+                    eara2021_abs_path)
+                if ref == 'stw105':
+                    ref_model_vp = load_stw105('vp')
+                    ref_model_vs = load_stw105('vs')
+                elif ref == 'ak135':
+                    ref_model_vp = load_ak135('vp')
+                    ref_model_vs = load_ak135('vs')
+                else:
+                    raise Exception('ref is not supported.')
+                with phase("reference division"):
+                    data['vp'].data = data['vp'].data/ref_model_vp.data-1
+                    data['vs'].data = data['vs'].data/ref_model_vs.data-1
+
+        # load mask
+        nzcc_mask = np.load(mask_path)
+        return prepare_model(data, nzcc_mask, model_type)
+
+    return get_model_registry().layouts(f"vpvs_{model_type}_{ref}", build, vpvs_plan_files())
+
+
+def vpvs_slice(model: ModelLayouts, model_type: str, depth: int) -> FigurePlan:
+    # the panel of a depth slice, the values are in the shape of (hlat, hlon)
+    plot_data = prepare_cross_section(model, depth, model_type)
+    panel = FigurePlan()
+    panel["values"] = plot_data.values
+    panel["hlon"] = plot_data.hlon.values
+    panel["hlat"] = plot_data.hlat.values
+    return panel
+
+
+def plan_vpvs(inputs: dict) -> FigurePlan:
+    """the plan of the depth slices, the slice of the depth idx is in the panel idx
+
+    Args:
+        inputs (dict): the output of vpvs_plan_inputs
+
+    Returns:
+        FigurePlan: the plan
+    """
+    model = vpvs_model(inputs["model_type"], inputs["ref"])
+    plan = FigurePlan()
+    for idx, depth in enumerate(inputs["depths"]):
+        plan.set_panel(idx, vpvs_slice(model, inputs["model_type"], depth))
+    return plan
+
+
+def vpvs_panels(inputs: dict) -> Iterator[FigurePlan]:
+    """the depth slices, prepared in the threads while the earlier ones are drawn, or read from the cached plan
+
+    Args:
+        inputs (dict): the output of vpvs_plan_inputs
+
+    Yields:
+        Iterator[FigurePlan]: the panel of each depth
+    """
+    path = plan_path(plan_vpvs, plan_key(plan_vpvs, inputs, vpvs_plan_files()))
+    if isfile(path):
+        plan = FigurePlan.load(path)
+        for idx in range(len(inputs["depths"])):
+            yield plan.panel(idx)
+        return
+    model = vpvs_model(inputs["model_type"], inputs["ref"])
+    plan = FigurePlan()
+    slices = map_panels(partial(vpvs_slice, model, inputs["model_type"]), inputs["depths"])
+    for idx, panel in enumerate(slices):
+        plan.set_panel(idx, panel)
+        yield panel
+    plan.save(path)
@@ -3,17 +3,41 @@ waveform.py
 
 compare waveform between the old and the new model
 """
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import lru_cache
 from os.path import join
 from string import ascii_lowercase
-from typing import Dict, List, TypedDict
+from typing import Dict, List, Optional, Tuple, TypedDict
 
 import numpy as np
 import obspy
 import pygmt
 from eara2022 import resource, save_path
 from eara2022.utils import generate_tmp_file
+from eara2022.utils.asdf import ASDFHandlePool, MissingWaveformError, read_window
 from eara2022.utils.load_files import load_pickle
-from pyasdf import ASDFDataSet
+from eara2022.utils.plot import multi_segment_file
+from eara2022.utils.slab2 import plot_slab_contours
+from eara2022.utils.stations import get_station_index
+from eara2022.utils.tables import (
+    convert_traveltimes,
+    convert_windows,
+    get_traveltime_table,
+    get_window_table,
+)
+
+# * the resource inputs, the figures are rebuilt when they change, see utils.build
+INPUTS = [
+    ["waveform", "m00"],
+    ["waveform", "m20"],
+    ["waveform", "data"],
+    ["waveform", "windows"],
+    ["waveform", "data_info"],
+    ["Plate_Boundaries", "nuvel1_boundaries"],
+    ["stations", "STATIONS_filtered"],
+]
 
 # * configurations
 freq_list = ["8/40", "20/120", "40/120"]
@@ -47,6 +71,14 @@ arrivals_legend = generate_tmp_file(arrivals_legend_content, suffix='.cpt')
 # * meca
 meca_file_content = "141.8656 36.1291 21.33 14.621 -1.621 -12.999 6.488 17.601 -4.863 17 0 0"
 meca = generate_tmp_file(meca_file_content)
+# the events with the focal mechanism and the title information
+event_meca = {
+    "200805071602A": (meca, "Mw 6.2, 21km"),
+}
+
+
+# * the pickles are shared by the stations of the same event in the batch mode
+load_pickle_cached = lru_cache(maxsize=16)(load_pickle)
 
 
 class PreparedInfo(TypedDict):
@@ -56,67 +88,78 @@ class PreparedInfo(TypedDict):
     windows: Dict[str, List[List[float]]]
 
 
-def prepare_info(old_asdf_dir: str, new_asdf_dir: str, data_dir: str, window_dir: str, data_info_dir: str) -> PreparedInfo:
+def prepare_info(old_asdf_dir: str, new_asdf_dir: str, data_dir: str, window_dir: str, data_info_dir: str, pool: Optional[ASDFHandlePool] = None, gcmt: str = conf["gcmt"], sta_name: str = conf["sta_name"]) -> PreparedInfo:
     # * collect arrivals
     arrivals = {}
-    for each_phase in phases:
-        arrivals[each_phase] = load_pickle(
-            join(data_info_dir, f"traveltime.{each_phase}.pkl"))[conf["gcmt"]][conf["sta_name"]]
+    traveltime_paths = [join(data_info_dir, f"traveltime.{each_phase}.pkl")
+                        for each_phase in phases]
+    traveltime_table = get_traveltime_table(
+        join(data_info_dir, "traveltime.npy"))
+    # the table is only used if it is converted from the current pickles
+    if traveltime_table.is_current(traveltime_paths):
+        for each_phase in phases:
+            arrivals[each_phase] = traveltime_table.traveltime(
+                gcmt, sta_name, each_phase)
+    else:
+        for each_phase, traveltime_path in zip(phases, traveltime_paths):
+            arrivals[each_phase] = load_pickle_cached(
+                traveltime_path)[gcmt][sta_name]
     # * collect waveforms
-    res = {}
-    for each_freq in freq_list:
-        res[each_freq] = {}
-        # load
-        mint, maxt = map(int, each_freq.split("/"))
-        data_path = join(
-            data_dir, f"{conf['gcmt']}.preprocessed_{mint}s_to_{maxt}s.h5")
-        old_path = join(
-            old_asdf_dir, f"{conf['gcmt']}.preprocessed_{mint}s_to_{maxt}s.h5")
-        new_path = join(
-            new_asdf_dir, f"{conf['gcmt']}.preprocessed_{mint}s_to_{maxt}s.h5")
-        data = ASDFDataSet(data_path, mode="r")
-        old = ASDFDataSet(old_path, mode="r")
-        new = ASDFDataSet(new_path, mode="r")
-        # process
-        event_time: obspy.UTCDateTime = data.events[0].origins[0].time
-        for component in components:
-            data_slice: obspy.Trace = data.waveforms[conf['sta_name']][f"preprocessed_{mint}s_to_{maxt}s"].select(
-                component=component)[0].slice(event_time+conf['start'], event_time+conf['end'])
-            old_slice: obspy.Trace = old.waveforms[conf['sta_name']][f"preprocessed_{mint}s_to_{maxt}s"].select(
-                component=component)[0].slice(event_time+conf['start'], event_time+conf['end'])
-            new_slice: obspy.Trace = new.waveforms[conf['sta_name']][f"preprocessed_{mint}s_to_{maxt}s"].select(
-                component=component)[0].slice(event_time+conf['start'], event_time+conf['end'])
-            # normalize
-            data_slice.normalize()
-            old_slice.normalize()
-            new_slice.normalize()
-            # update the result
-            res[each_freq][component] = {}
-            res[each_freq][component]['x'] = np.linspace(
-                conf['start'], conf['end'], data_slice.stats.npts)
-            res[each_freq][component]['data'] = data_slice.data*conf['amp']
-            res[each_freq][component]['new'] = new_slice.data*conf['amp']
-            res[each_freq][component]['old'] = old_slice.data*conf['amp']
+    # the files are kept open in the pool, and only the [start, end] window is read
+    # a pool passed by the caller is kept open, an own pool is closed even on errors
+    with (ASDFHandlePool() if pool is None else nullcontext(pool)) as pool:
+        res = {}
+        for each_freq in freq_list:
+            res[each_freq] = {}
+            # load
+            mint, maxt = map(int, each_freq.split("/"))
+            tag = f"preprocessed_{mint}s_to_{maxt}s"
+            data_path = join(data_dir, f"{gcmt}.{tag}.h5")
+            old_path = join(old_asdf_dir, f"{gcmt}.{tag}.h5")
+            new_path = join(new_asdf_dir, f"{gcmt}.{tag}.h5")
+            # process
+            event_time = pool.event_time(data_path)
+            for component in components:
+                data_slice, old_slice, new_slice = [read_window(
+                    pool, path, sta_name, tag, component, conf['start'], conf['end'], event_time=event_time) for path in [data_path, old_path, new_path]]
+                # update the result
+                res[each_freq][component] = {}
+                res[each_freq][component]['x'] = np.linspace(
+                    conf['start'], conf['end'], len(data_slice))
+                res[each_freq][component]['data'] = data_slice*conf['amp']
+                res[each_freq][component]['new'] = new_slice*conf['amp']
+                res[each_freq][component]['old'] = old_slice*conf['amp']
 
     # * collect windows
     wins = {}
-    window_path = join(window_dir, f"{conf['gcmt']}.pkl")
-    windows: dict = load_pickle(window_path)
-    for component in components:
-        wins[component] = []
-        all_wins1 = windows[conf["sta_name"]
-                            ][components[component][0]].windows
-        all_wins2 = windows[conf["sta_name"]
-                            ][components[component][1]].windows
-
-        for each_win in all_wins1:
-            if each_win.cc >= 0.5:
-                wins[component].append(
-                    [each_win.left-event_time, each_win.right-event_time])
-        for each_win in all_wins2:
-            if each_win.cc >= 0.5:
-                wins[component].append(
-                    [each_win.left-event_time, each_win.right-event_time])
+    window_path = join(window_dir, f"{gcmt}.pkl")
+    window_table = get_window_table(join(window_dir, "windows.npy"))
+    # a new or changed window pickle of the event is read directly until the table is converted again
+    if window_table.is_current([window_path]):
+        event_timestamp = event_time/1e9
+        for component in components:
+            wins[component] = []
+            for category in components[component]:
+                for each_win in window_table.windows(gcmt, sta_name, category):
+                    if each_win["cc"] >= 0.5:
+                        wins[component].append(
+                            [float(each_win["left"]-event_timestamp), float(each_win["right"]-event_timestamp)])
+    else:
+        event_time = obspy.UTCDateTime(ns=event_time)
+        windows: dict = load_pickle_cached(window_path)
+        for component in components:
+            wins[component] = []
+            all_wins1 = windows[sta_name][components[component][0]].windows
+            all_wins2 = windows[sta_name][components[component][1]].windows
+
+            for each_win in all_wins1:
+                if each_win.cc >= 0.5:
+                    wins[component].append(
+                        [each_win.left-event_time, each_win.right-event_time])
+            for each_win in all_wins2:
+                if each_win.cc >= 0.5:
+                    wins[component].append(
+                        [each_win.left-event_time, each_win.right-event_time])
     return {
         "arrivals": arrivals,
         "waveforms": res,
@@ -129,43 +172,50 @@ def plot_base_map(fig: pygmt.Figure) -> None:
               borders=["1/0.8p,white"], lakes=["GRAY81"])
     fig.plot(data=resource(
         ['Plate_Boundaries', 'nuvel1_boundaries']), pen="2p,black")
-    for slab in ['izu', 'kur', 'phi', 'ryu', 'man']:
-        fig.grdcontour(
-            resource(['slab2', f'{slab}_slab2_depth.grd']), interval=100, pen="1p,magenta")
+    plot_slab_contours(fig, level=100, pen="1p,magenta")
 
 
 def plot_waveform(fig: pygmt.Figure, prepared_info: PreparedInfo, freq: str):
+    # * the same kind of lines in all the components are gathered and plotted in one call
     waveform = prepared_info["waveforms"][freq]
     arrivals = prepared_info["arrivals"]
+    lines = {"data": [], "old": [], "new": []}
+    win_segments = []
+    arrival_x = {each_phase: [] for each_phase in phases}
+    arrival_y = {each_phase: [] for each_phase in phases}
     offset = 5
     for comp in components:
         # * waveform
-        x, yd, yn, yo = [waveform[comp][key]
-                         for key in ['x', 'data', 'new', 'old']]
-        # original plot colors are red, green, black
-        # try to find new combinations which are more distinguishable (keep black anyway)
-        # so the colors are changed to turquoise, red, black
-        fig.plot(x=x, y=yd+offset, pen="0.3p,black")
-        fig.plot(x=x, y=yo+offset, pen="0.3p,turquoise")
-        fig.plot(x=x, y=yn+offset, pen="0.3p,red")
+        x = waveform[comp]['x']
+        for key in lines:
+            lines[key].append(np.column_stack((x, waveform[comp][key]+offset)))
         # * windows
         wins = prepared_info["windows"][comp]
         for ii, val in enumerate(wins):
             win_left, win_right = val
-            fig.plot(x=[win_left, win_right, win_right, win_left, win_left], y=np.array([-conf['win_height']-ii*0.1, -conf['win_height']-ii *
-                     0.1, conf['win_height']+ii*0.1, conf['win_height']+ii*0.1, -conf['win_height']-ii*0.1])+offset, pen="0.5p,black")
+            win_segments.append(np.column_stack(([win_left, win_right, win_right, win_left, win_left], np.array([-conf['win_height']-ii*0.1, -conf['win_height']-ii *
+                                0.1, conf['win_height']+ii*0.1, conf['win_height']+ii*0.1, -conf['win_height']-ii*0.1])+offset)))
         # * arrivals
         for ii, each_phase in enumerate(phases):
-            fig.plot(x=arrivals[each_phase], y=offset-0.9-0.03*ii, style="t0.04i",
-                     pen=f"0.03i,{colors_mapper[each_phase]}", no_clip=True)
+            arrival_x[each_phase].append(arrivals[each_phase])
+            arrival_y[each_phase].append(offset-0.9-0.03*ii)
 
         offset -= 2
 
+    # original plot colors are red, green, black
+    # try to find new combinations which are more distinguishable (keep black anyway)
+    # so the colors are changed to turquoise, red, black
+    for key, pen in [("data", "0.3p,black"), ("old", "0.3p,turquoise"), ("new", "0.3p,red")]:
+        fig.plot(data=multi_segment_file(lines[key]), pen=pen)
+    if len(win_segments) != 0:
+        fig.plot(data=multi_segment_file(win_segments), pen="0.5p,black")
+    # the hollow markers of a phase in all the components share the pen
+    for each_phase in phases:
+        fig.plot(x=arrival_x[each_phase], y=arrival_y[each_phase], style="t0.04i",
+                 pen=f"0.03i,{colors_mapper[each_phase]}", no_clip=True)
 
-def main() -> None:
-    # * load info
-    prepared_info = prepare_info(
-        *[resource(['waveform', file], normal_path=True) for file in ['m00', 'm20', 'data', 'windows', 'data_info']])
+
+def render(prepared_info: PreparedInfo, gcmt: str, sta_name: str, save_name: str) -> None:
     # * plot the figures
     fig = pygmt.Figure()
     pygmt.config(FONT_LABEL="12p", MAP_LABEL_OFFSET="6p",
@@ -187,13 +237,20 @@ def main() -> None:
     fig.basemap(region=[95, 165, 10, 56], projection="M3i", frame=[
         "WSen", "xaf", "yaf"])
     plot_base_map(fig)
-    fig.plot(data=resource(['stations', 'STATIONS_filtered']),
+    stations = get_station_index(require_names=True)
+    fig.plot(x=stations.lons, y=stations.lats,
              style="t0.03i", pen="0.004i,black")  # remove unused stations
-    fig.plot(x=116.01, y=29.6474, style="t0.09i",
+    sta_lon, sta_lat = stations.position(sta_name)
+    fig.plot(x=sta_lon, y=sta_lat, style="t0.09i",
              pen="0.03i,red")  # station position
-    fig.text(position="TL", text=f"200805071602A (Mw 6.2, 21km) [Station:{conf['sta_name']}]",
-             font="10p,Helvetica-Bold,black", offset="j0.1i/-0.3i", no_clip=True)
-    fig.meca(spec=meca, convention="mt", scale="0.8i")
+    if gcmt in event_meca:
+        event_meca_file, event_title = event_meca[gcmt]
+        fig.text(position="TL", text=f"{gcmt} ({event_title}) [Station:{sta_name}]",
+                 font="10p,Helvetica-Bold,black", offset="j0.1i/-0.3i", no_clip=True)
+        fig.meca(spec=event_meca_file, convention="mt", scale="0.8i")
+    else:
+        fig.text(position="TL", text=f"{gcmt} [Station:{sta_name}]",
+                 font="10p,Helvetica-Bold,black", offset="j0.1i/-0.3i", no_clip=True)
     fig.text(position="TL", text="(a)",
              font="15p,Helvetica-Bold,black", offset="j-0.3i/-0.3i", no_clip=True)
 
@@ -204,7 +261,95 @@ def main() -> None:
                     projection="X0.8i/1.6i", frame=["lbrt"])
         fig.legend(spec=arrivals_legend, position="jTL+w1.5c+o1.0c/0.2c")
 
-    save_path(fig, "waveform")
+    save_path(fig, save_name)
+
+
+def waveform_dirs() -> List[str]:
+    return [resource(['waveform', file], normal_path=True) for file in ['m00', 'm20', 'data', 'windows', 'data_info']]
+
+
+def prepare_event(gcmt: str, sta_names: List[str]) -> List[Tuple[str, str, Optional[PreparedInfo]]]:
+    # * run in a worker process, all the ASDF files of the event are only opened by this worker
+    res = []
+    with ASDFHandlePool() as pool:
+        for sta_name in sta_names:
+            try:
+                prepared_info = prepare_info(
+                    *waveform_dirs(), pool=pool, gcmt=gcmt, sta_name=sta_name)
+            except (MissingWaveformError, KeyError, OSError) as e:
+                # no waveform, origin, traveltime or window for the pair, or a missing file
+                print(f"skip {gcmt} {sta_name}: {e!r}")
+                prepared_info = None
+            res.append((gcmt, sta_name, prepared_info))
+    return res
+
+
+def load_pairs(pairs_path: str) -> List[Tuple[str, str]]:
+    # each line is: gcmt NET.STA
+    pairs = []
+    with open(pairs_path, "r") as f:
+        for each_line in f:
+            if each_line.strip() == "" or each_line.startswith("#"):
+                continue
+            gcmt, sta_name = each_line.split()[:2]
+            pairs.append((gcmt, sta_name))
+    return pairs
+
+
+def batch_main(pairs: Optional[List[Tuple[str, str]]] = None, max_workers: Optional[int] = None) -> None:
+    """Render one comparison figure per (event, station) pair
+
+    The extraction is spread over a process pool with one event (and so its ASDF files) per task, and the
+    figures are rendered in this process as soon as each event is ready, so GMT overlaps with the I/O.
+
+    Args:
+        pairs (Optional[List[Tuple[str, str]]], optional): the (gcmt, NET.STA) pairs. Defaults to the list in waveform/pairs.txt.
+        max_workers (Optional[int], optional): the number of worker processes. Defaults to None, as the cpu count.
+    """
+    if pairs is None:
+        pairs = load_pairs(resource(['waveform', 'pairs.txt'], normal_path=True))
+    # a station list without the names can not place any station, so fail before the extraction
+    get_station_index(require_names=True)
+    stations_per_event: Dict[str, List[str]] = {}
+    for gcmt, sta_name in pairs:
+        stations_per_event.setdefault(gcmt, []).append(sta_name)
+
+    start_time = time.perf_counter()
+    nfigures, nskipped, nfailed = 0, 0, 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(prepare_event, gcmt, sta_names)
+                   for gcmt, sta_names in stations_per_event.items()]
+        for future in as_completed(futures):
+            for gcmt, sta_name, prepared_info in future.result():
+                if prepared_info is None:
+                    nskipped += 1
+                    continue
+                try:
+                    render(prepared_info, gcmt, sta_name,
+                           f"waveform_{gcmt}_{sta_name}")
+                except Exception as e:
+                    # an unknown station or a GMT error only fails this pair, the sweep goes on
+                    print(f"fail {gcmt} {sta_name}: {e!r}")
+                    nfailed += 1
+                    continue
+                nfigures += 1
+    elapsed = time.perf_counter()-start_time
+    print(f"Rendered {nfigures} of {len(pairs)} waveform figures ({nskipped} skipped, {nfailed} failed) "
+          f"in {elapsed:.1f}s, {nfigures/elapsed*60:.1f} figures per minute")
+
+
+def convert_tables() -> None:
+    # * flatten the traveltime and window pickles, prepare_info will use the tables once they exist
+    _, _, _, window_dir, data_info_dir = waveform_dirs()
+    convert_traveltimes(data_info_dir, phases,
+                        join(data_info_dir, "traveltime.npy"))
+    convert_windows(window_dir, join(window_dir, "windows.npy"))
+
+
+def main() -> None:
+    # * load info
+    prepared_info = prepare_info(*waveform_dirs())
+    render(prepared_info, conf["gcmt"], conf["sta_name"], "waveform")
 
 
 if __name__ == "__main__":
@@ -1,8 +1,10 @@
-import re
 import tempfile
+from typing import Optional
 
 import numpy as np
-from eara2022 import resource
+from eara2022.instrument import profiled
+
+from .volcano import get_volcano_store
 
 
 def generate_tmp_file(content: str = "", suffix: str = "") -> str:
@@ -22,19 +24,17 @@ def generate_tmp_file(content: str = "", suffix: str = "") -> str:
     return tmp.name
 
 
-def get_vol_list() -> np.ndarray:
-    with open(resource(["Volcanoes", "volcanoes.tsv"], normal_path=True), "r") as f:
-        data = f.readlines()
-    # handle data
-    pattern = re.compile(
-        r""""([^"]*)"\s+"([^"]*)"\s+"[^"]*"\s+(\d+\.?\d*)\s+(\d+\.?\d*)\s+-?\d+\.?\d*""")
-    vol_list = []
-    for each_line in data:
-        thefind = re.findall(pattern, each_line)
-        if(len(thefind) != 0):
-            result = thefind[0]
-            if(len(result) != 0):
-                if result[1] not in ["Japan", "Philippines", "Indonesia", "Taiwan"] and float(result[3]) <= 140:
-                    vol_list.append(result)
-    vol_list = np.array(vol_list)
-    return vol_list[:, 2:].astype(float)
+@profiled()
+def get_vol_list(volcano_path: Optional[str] = None) -> np.ndarray:
+    """the volcanoes on the mainland, west of 140E
+
+    Args:
+        volcano_path (Optional[str], optional): the volcano tsv. Defaults to Volcanoes/volcanoes.tsv.
+
+    Returns:
+        np.ndarray: (N,2) array of lat and lon
+    """
+    # the volcano store is parsed only once
+    store = get_volcano_store(volcano_path).exclude_countries(
+        ["Japan", "Philippines", "Indonesia", "Taiwan"]).bbox(lon_min=0, lon_max=140, lat_min=0)
+    return np.column_stack((store.lats, store.lons))
@@ -0,0 +1,175 @@
+"""
+asdf.py
+
+read waveform windows directly from the ASDF (HDF5) files, without building the obspy objects.
+the files are kept open in a handle pool, and only the samples in the requested window are read.
+"""
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import h5py
+import numpy as np
+from eara2022.instrument import profiled
+
+
+class MissingWaveformError(KeyError):
+    """the origin time or the waveform is not in the ASDF file"""
+
+
+class TraceIndex(NamedTuple):
+    """the location of a trace in the ASDF file"""
+    dataset: str
+    # the start time in ns since the epoch, as stored by pyasdf
+    starttime: int
+    sampling_rate: float
+    npts: int
+
+
+class ASDFHandlePool:
+    """Keep the ASDF files open across the requests, the least recently used file is closed when full
+    """
+
+    def __init__(self, max_open: int = 32) -> None:
+        """
+        Args:
+            max_open (int, optional): the max number of open files. Defaults to 32.
+        """
+        self.max_open = max_open
+        self.handles: "OrderedDict[str, h5py.File]" = OrderedDict()
+        # per file: the origin time, and the (station, tag, component) -> TraceIndex index
+        self.event_times: Dict[str, int] = {}
+        self.indexes: Dict[str, Dict[Tuple[str, str, str], TraceIndex]] = {}
+
+    def get(self, path: str) -> h5py.File:
+        """get the opened file
+
+        Args:
+            path (str): the ASDF file path
+
+        Returns:
+            h5py.File: the read only handle
+        """
+        if path in self.handles:
+            self.handles.move_to_end(path)
+            return self.handles[path]
+        handle = h5py.File(path, mode="r")
+        self.handles[path] = handle
+        if len(self.handles) > self.max_open:
+            _, oldest = self.handles.popitem(last=False)
+            oldest.close()
+        return handle
+
+    def close(self) -> None:
+        """close all the files
+        """
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
+
+    def __enter__(self) -> "ASDFHandlePool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def event_time(self, path: str) -> int:
+        """the origin time of the first event in the file, the same as data.events[0].origins[0].time in pyasdf
+
+        Args:
+            path (str): the ASDF file path
+
+        Returns:
+            int: the origin time in ns since the epoch
+        """
+        if path not in self.event_times:
+            quakeml = self.get(path)["QuakeML"][()].tobytes()
+            root = ET.fromstring(quakeml)
+            # the namespace differs between the QuakeML versions, so match by the local name
+            value = None
+            for element in root.iter():
+                if element.tag.split("}")[-1] == "origin":
+                    for child in element:
+                        if child.tag.split("}")[-1] == "time":
+                            value = child.find("./*").text
+                            break
+                    break
+            if value is None:
+                raise MissingWaveformError(f"no origin time in {path}")
+            self.event_times[path] = int(np.datetime64(
+                value.strip().rstrip("Z"), "ns").astype(np.int64))
+        return self.event_times[path]
+
+    def trace_index(self, path: str, station: str, tag: str, component: str) -> TraceIndex:
+        """find the first trace of the component with the tag, the same as select(component=component)[0]
+
+        Args:
+            path (str): the ASDF file path
+            station (str): the station name as NET.STA
+            tag (str): the waveform tag
+            component (str): the last character of the channel
+
+        Returns:
+            TraceIndex: the trace location
+
+        Raises:
+            MissingWaveformError: the station has no such waveform in the file
+        """
+        index = self.indexes.setdefault(path, {})
+        key = (station, tag, component)
+        if key not in index:
+            try:
+                group = self.get(path)["Waveforms"][station]
+            except KeyError:
+                raise MissingWaveformError(
+                    f"no waveforms of {station} in {path}") from None
+            # the dataset name is NET.STA.LOC.CHA__start__end__tag
+            for name in sorted(group.keys()):
+                parts = name.split("__")
+                if len(parts) != 4 or parts[3] != tag:
+                    continue
+                this_key = (station, tag, parts[0][-1])
+                if this_key not in index:
+                    dataset = group[name]
+                    index[this_key] = TraceIndex(
+                        f"Waveforms/{station}/{name}", int(dataset.attrs["starttime"]), float(dataset.attrs["sampling_rate"]), dataset.shape[0])
+            if key not in index:
+                raise MissingWaveformError(
+                    f"no {station} {tag} {component} waveform in {path}")
+        return index[key]
+
+
+@profiled()
+def read_window(pool: ASDFHandlePool, path: str, station: str, tag: str, component: str, start: float, end: float, event_time: Optional[int] = None, normalize: bool = True) -> np.ndarray:
+    """Read the samples between event_time+start and event_time+end, the same as Trace.slice and Trace.normalize
+
+    Args:
+        pool (ASDFHandlePool): the handle pool
+        path (str): the ASDF file path
+        station (str): the station name as NET.STA
+        tag (str): the waveform tag
+        component (str): the last character of the channel
+        start (float): the window start relative to the event time in seconds
+        end (float): the window end relative to the event time in seconds
+        event_time (Optional[int], optional): the reference time in ns, use the file's event time if None. Defaults to None.
+        normalize (bool, optional): if normalize by the max absolute amplitude. Defaults to True.
+
+    Returns:
+        np.ndarray: the windowed samples
+    """
+    if event_time is None:
+        event_time = pool.event_time(path)
+    trace = pool.trace_index(path, station, tag, component)
+    # the nearest samples, as Trace.slice(nearest_sample=True)
+    offset = (event_time-trace.starttime)/1e9
+    first = max(int(round((offset+start)*trace.sampling_rate)), 0)
+    last = min(int(round((offset+end)*trace.sampling_rate)), trace.npts-1)
+    if last < first:
+        return np.zeros(0)
+    # only the hyperslab of the window is read from the file
+    data = pool.get(path)[trace.dataset][first:last+1].astype(np.float64)
+    if normalize:
+        norm = np.abs(data).max()
+        if norm != 0:
+            data /= norm
+    return data
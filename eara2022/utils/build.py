@@ -0,0 +1,208 @@
+"""
+build.py
+
+the incremental rebuild of the figures. each script module declares its resource inputs as INPUTS, and the
+fingerprint of a figure covers these inputs, its configuration, and the source of its module and of the
+eara2022 modules imported by it. the fingerprints of the built figures are recorded in a manifest next to fig/,
+so only the figures whose fingerprint changed are rendered again.
+"""
+import ast
+import hashlib
+import json
+import sys
+from functools import partial
+from os import walk
+from os.path import dirname, isdir, isfile, join, relpath
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from eara2022 import resource, root_path
+
+from .cache import file_fingerprint
+
+BUILD_MANIFEST = join(dirname(root_path), "fig_manifest.json")
+
+
+def path_fingerprint(path: str, memo: Optional[Dict[str, str]] = None) -> str:
+    """the fingerprint of a file, or of all the files in a directory
+
+    Args:
+        path (str): the file or directory path
+        memo (Optional[Dict[str, str]], optional): the fingerprints computed in this build. Defaults to None.
+
+    Returns:
+        str: the hex fingerprint, "missing" if the path does not exist
+    """
+    if memo is not None and path in memo:
+        return memo[path]
+    if isfile(path):
+        res = file_fingerprint(path)
+    elif isdir(path):
+        entries = []
+        for base, dirs, files in walk(path):
+            # the caches written by the scripts are not inputs
+            dirs[:] = sorted(each for each in dirs if each != "cache")
+            for each in sorted(files):
+                entries.append(
+                    f"{relpath(join(base, each), path)}|{file_fingerprint(join(base, each))}")
+        res = hashlib.sha1("\n".join(entries).encode()).hexdigest()[:16]
+    else:
+        res = "missing"
+    if memo is not None:
+        memo[path] = res
+    return res
+
+
+def module_path(module_name: str) -> Optional[str]:
+    """the source file of an eara2022 module, found without importing it
+
+    Returns:
+        Optional[str]: the .py path, None if it is not an eara2022 module
+    """
+    parts = module_name.split(".")
+    if parts[0] != "eara2022":
+        return None
+    path = join(root_path, *parts[1:])
+    if isfile(join(path, "__init__.py")):
+        return join(path, "__init__.py")
+    if isfile(path+".py"):
+        return path+".py"
+    return None
+
+
+def module_sources(module_name: str, found: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """the source files of the module and of the eara2022 modules imported by it, recursively
+
+    Args:
+        module_name (str): the module name, such as eara2022.scripts.slab_base
+        found (Optional[Dict[str, str]], optional): the modules found so far. Defaults to None.
+
+    Returns:
+        Dict[str, str]: module name -> source path
+    """
+    if found is None:
+        found = {}
+    path = module_path(module_name)
+    if path is None or module_name in found:
+        return found
+    found[module_name] = path
+    package = module_name if path.endswith("__init__.py") else module_name.rsplit(".", 1)[0]
+    with open(path, "r") as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [each.name for each in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level > 0:
+                base = package.rsplit(".", node.level-1)[0] if node.level > 1 else package
+                base = f"{base}.{node.module}" if node.module else base
+            else:
+                base = node.module
+            # the imported names might be the submodules
+            names = [base]+[f"{base}.{each.name}" for each in node.names]
+        else:
+            continue
+        for name in names:
+            module_sources(name, found)
+    return found
+
+
+def script_module(script: Callable) -> str:
+    return script.func.__module__ if isinstance(script, partial) else script.__module__
+
+
+def script_inputs(script: Callable) -> Optional[List[str]]:
+    """the resource paths declared as INPUTS in the module of the script
+
+    Returns:
+        Optional[List[str]]: the paths, None if the module does not declare its inputs
+    """
+    module = sys.modules[script_module(script)]
+    if not hasattr(module, "INPUTS"):
+        return None
+    return [resource(name, normal_path=True, check=False) for name in module.INPUTS]
+
+
+def script_outputs(script: Callable, fig_dir: str, name: Optional[str] = None) -> List[str]:
+    """the pdf files written by the script, from the save_name in its configuration, or from the script name
+
+    Args:
+        script (Callable): the main function of the figure
+        fig_dir (str): the figure directory
+        name (Optional[str], optional): the script name, such as the keys of scripts_mapper in run.py, which is
+            also the save name of the scripts without the save_name. Defaults to None.
+
+    Returns:
+        List[str]: the pdf paths
+    """
+    save_name = None
+    if isinstance(script, partial):
+        keywords = script.keywords
+        save_name = keywords.get("save_name", keywords.get(
+            "conf", {}).get("save_name"))
+    if save_name is None:
+        save_name = name
+    return [join(fig_dir, f"{save_name}.pdf")] if save_name is not None else []
+
+
+def figure_fingerprint(script: Callable, options: Optional[dict] = None, memo: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """the fingerprint of a figure from its declared inputs, configuration and source
+
+    Args:
+        script (Callable): the main function of the figure, usually a partial with the configuration
+        options (Optional[dict], optional): the global options affecting the output, such as the sampling mode.
+            Defaults to None.
+        memo (Optional[Dict[str, str]], optional): the fingerprints computed in this build. Defaults to None.
+
+    Returns:
+        Optional[str]: the hex fingerprint, None if the script does not declare its inputs
+    """
+    inputs = script_inputs(script)
+    if inputs is None:
+        return None
+    if memo is None:
+        memo = {}
+    sources = module_sources(script_module(script))
+    content = {
+        "inputs": {path: path_fingerprint(path, memo) for path in inputs},
+        "sources": {name: path_fingerprint(path, memo) for name, path in sorted(sources.items())},
+        "args": list(script.args) if isinstance(script, partial) else [],
+        "keywords": script.keywords if isinstance(script, partial) else {},
+        "options": options or {},
+    }
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=_json_default).encode()).hexdigest()[:16]
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class BuildManifest:
+    """The fingerprints of the built figures, stored as json
+
+    Args:
+        path (str, optional): the manifest path. Defaults to BUILD_MANIFEST.
+    """
+
+    def __init__(self, path: str = BUILD_MANIFEST) -> None:
+        self.path = path
+        self.fingerprints: Dict[str, str] = {}
+        if isfile(path):
+            with open(path, "r") as f:
+                self.fingerprints = json.load(f)
+
+    def is_current(self, name: str, fingerprint: Optional[str], outputs: List[str]) -> bool:
+        # the figures without the declared inputs are always built
+        return fingerprint is not None and self.fingerprints.get(name) == fingerprint and all(isfile(each) for each in outputs)
+
+    def record(self, name: str, fingerprint: Optional[str]) -> None:
+        if fingerprint is None:
+            return
+        self.fingerprints[name] = fingerprint
+        # written after each figure, so an interrupted build keeps the finished figures
+        with open(self.path, "w") as f:
+            json.dump(self.fingerprints, f, indent=2, sort_keys=True)
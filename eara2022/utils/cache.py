@@ -3,19 +3,25 @@ cache.py
 
 disk caching for the result of expensive numpy functions
 """
+import hashlib
 from eara2022 import resource
+from eara2022.instrument import profiled
 import numpy as np
-from os.path import isfile
+from os import makedirs, stat
+from os.path import dirname, isfile
 from typing import Optional
 
 
+@profiled()
 def save_cache(file_name: str, content: np.ndarray) -> None:
     # name should have .npy
     cache_path = resource(['cache', file_name+".npy"],
                           normal_path=True, check=False)
+    makedirs(dirname(cache_path), exist_ok=True)
     np.save(arr=content, file=cache_path)
 
 
+@profiled()
 def load_cache(file_name: str) -> Optional[np.ndarray]:
     cache_path = resource(['cache', file_name+".npy"],
                           normal_path=True, check=False)
@@ -24,3 +30,16 @@ def load_cache(file_name: str) -> Optional[np.ndarray]:
         return res
     else:
         return None
+
+
+def file_fingerprint(path: str) -> str:
+    """the fingerprint of a file from its path, size and modification time, used in the cache names
+
+    Args:
+        path (str): the file path
+
+    Returns:
+        str: the hex fingerprint
+    """
+    info = stat(path)
+    return hashlib.sha1(f"{path}|{info.st_size}|{info.st_mtime_ns}".encode()).hexdigest()[:16]
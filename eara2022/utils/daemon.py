@@ -0,0 +1,153 @@
+"""
+daemon.py
+
+a long lived render daemon on a unix socket. the daemon imports pygmt, compiles the numba kernels and keeps the
+shared indexes (slab2, stations, volcanoes, ehb catalog, tables) warm between the requests, so re-rendering a
+figure only pays for the figure itself. each request is a json line with the script name and
+the configuration overrides, and the response is a json line with the output paths. each figure is rendered in a
+fresh GMT session, so the defaults set by pygmt.config in a figure do not leak into the next one.
+"""
+import json
+import socketserver
+import tempfile
+import threading
+import time
+import traceback
+from functools import partial
+from os import getuid, remove
+from os.path import dirname, exists, join
+from typing import Callable, Dict, Optional
+
+from eara2022 import root_path
+from pygmt.session_management import begin as gmt_begin
+from pygmt.session_management import end as gmt_end
+
+from .build import script_outputs
+from .ehb_catalog import get_ehb_catalog
+from .misfit_history import get_misfit_history
+from .sampling import get_sampling_mode, set_sampling_mode
+from .slab2 import get_slab2_index, slab_contour_file
+from .stations import get_station_index
+from .tables import get_traveltime_table, get_window_table
+from .volcano import get_volcano_store
+
+# the same path is used by the client render.py, which does not import eara2022
+DEFAULT_SOCKET = join(tempfile.gettempdir(), f"eara2022-render-{getuid()}.sock")
+FIG_DIR = join(dirname(root_path), "fig")
+
+
+def clear_caches() -> None:
+    # the shared indexes are loaded again in the next request, such as after ehb_ingest
+    for cached in [get_ehb_catalog, get_misfit_history, get_slab2_index, slab_contour_file, get_station_index,
+                   get_traveltime_table, get_window_table, get_volcano_store]:
+        cached.cache_clear()
+
+
+def restart_gmt_session() -> None:
+    # most scripts call pygmt.config outside a with block, the new session starts from the GMT defaults again
+    gmt_end()
+    gmt_begin()
+
+
+def with_overrides(script: Callable, overrides: dict) -> Callable:
+    """the script with the configuration overrides
+
+    The overrides update conf for the scripts as partial(base, conf=conf), and the keywords for the other partials.
+
+    Args:
+        script (Callable): the main function of the figure
+        overrides (dict): the configuration overrides
+
+    Raises:
+        Exception: the script has no configuration to override
+
+    Returns:
+        Callable: the script to call
+    """
+    if len(overrides) == 0:
+        return script
+    if not isinstance(script, partial):
+        raise Exception(
+            f"{script.__module__} has no configuration to override")
+    keywords = dict(script.keywords)
+    if "conf" in keywords:
+        keywords["conf"] = {**keywords["conf"], **overrides}
+    else:
+        keywords.update(overrides)
+    return partial(script.func, *script.args, **keywords)
+
+
+class RenderDaemon(socketserver.UnixStreamServer):
+    """The render daemon, the requests are handled one by one as GMT and the profiler are not thread safe
+
+    Args:
+        scripts (Dict[str, Callable]): the script name -> the main function, such as the mappers in run.py
+        socket_path (str, optional): the unix socket. Defaults to DEFAULT_SOCKET.
+    """
+
+    def __init__(self, scripts: Dict[str, Callable], socket_path: str = DEFAULT_SOCKET) -> None:
+        self.scripts = scripts
+        self.socket_path = socket_path
+        if exists(socket_path):
+            remove(socket_path)
+        super().__init__(socket_path, RenderHandler)
+
+    def render(self, request: dict) -> dict:
+        """handle a request
+
+        The request has "command" as render (default), clear or stop. A render request has "script", and the
+        optional "conf" overrides and "sampling" mode.
+
+        Args:
+            request (dict): the request
+
+        Returns:
+            dict: "ok", and "outputs" and "seconds" for render, or "error" with the traceback
+        """
+        command = request.get("command", "render")
+        if command == "stop":
+            return {"ok": True, "stop": True}
+        if command == "clear":
+            clear_caches()
+            return {"ok": True}
+        name = request["script"]
+        if name not in self.scripts:
+            return {"ok": False, "error": f"scripts {name} is not supported!"}
+        script = with_overrides(self.scripts[name], request.get("conf", {}))
+        sampling = get_sampling_mode()
+        start = time.perf_counter()
+        restart_gmt_session()
+        try:
+            if "sampling" in request:
+                set_sampling_mode(request["sampling"])
+            script()
+        finally:
+            set_sampling_mode(sampling)
+        return {"ok": True, "outputs": script_outputs(script, FIG_DIR, name), "seconds": time.perf_counter()-start}
+
+    def serve(self) -> None:
+        print(f"Render daemon is listening on {self.socket_path}")
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            if exists(self.socket_path):
+                remove(self.socket_path)
+
+
+class RenderHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        try:
+            response = self.server.render(json.loads(line))
+        except Exception:
+            # the errors of a figure are sent back, the daemon keeps serving
+            response = {"ok": False, "error": traceback.format_exc()}
+        self.wfile.write((json.dumps(response)+"\n").encode())
+        if response.get("stop", False):
+            # shutdown waits for serve_forever, so it is called from another thread
+            threading.Thread(target=self.server.shutdown).start()
+
+
+def serve_daemon(scripts: Dict[str, Callable], socket_path: Optional[str] = None) -> None:
+    RenderDaemon(scripts, socket_path or DEFAULT_SOCKET).serve()
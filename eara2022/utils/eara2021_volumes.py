@@ -0,0 +1,164 @@
+"""
+eara2021_volumes.py
+
+the masked perturbation and absolute volumes of eara2021 drawn in the vertical cross-sections of the slab, con
+and vol figures. the perturbation is with respect to a reference model, and the volumes are built once and shared by
+the processes through the model registry, also in the profile and slice layouts read by the cross-sections.
+"""
+from typing import List, Tuple
+
+import numpy as np
+import xarray as xr
+from eara2022 import resource
+from eara2022.instrument import phase, profiled
+from scipy import interpolate
+
+from .model_layout import ModelLayouts
+from .model_registry import get_model_registry
+
+
+def eara2021_volume_files() -> List[str]:
+    # the data files read to build the volumes
+    return [resource(["model_files", name], normal_path=True, check=False)
+            for name in ["eara2021_per_ref.nc", "eara2021.nc", "mask.npy", "stw105.txt", "AK135F_AVG.csv"]]
+
+
+@profiled()
+def load_stw105(parameter: str, copy_model: xr.DataArray) -> xr.DataArray:
+    stw105 = np.loadtxt(resource(["model_files", "stw105.txt"], normal_path=True))
+    r = stw105[:, 0]
+    if parameter == "vs":
+        v_v = stw105[:, 3]
+        v_h = stw105[:, 7]
+        v = np.sqrt((2*v_v**2+v_h**2)/3)
+    elif parameter == "vp":
+        v_v = stw105[:, 2]
+        v_h = stw105[:, 6]
+        v = np.sqrt((v_v**2+4*v_h**2)/5)
+    f = interpolate.interp1d((6371000-r)/1000, v)
+    stw105_depth = f(np.arange(0, 2005, 10))/1000
+    stw105_abs_data = copy_model.copy()
+    for index in range(201):
+        stw105_abs_data.data[:, :, index] = stw105_depth[index]
+    return stw105_abs_data
+
+
+@profiled()
+def load_ak135(parameter: str, copy_model: xr.DataArray) -> xr.DataArray:
+    ak135 = np.loadtxt(resource(["model_files", "AK135F_AVG.csv"], normal_path=True), delimiter=",")
+    h = ak135[:, 0]
+    if parameter == "vp":
+        v = ak135[:, 2]
+    else:
+        v = ak135[:, 3]
+    f = interpolate.interp1d(h, v)
+    ak135_depth = f(np.arange(0, 2005, 10))
+    ak135_abs_data = copy_model.copy()
+    for index in range(201):
+        ak135_abs_data.data[:, :, index] = ak135_depth[index]
+    return ak135_abs_data
+
+
+def smooth_model(model: xr.DataArray) -> xr.DataArray:
+    model[:, :, 41] = (model[:, :, 40]+model[:, :, 42])/2
+    model[:, :, 65] = (3*model[:, :, 64]+1*model[:, :, 67])/4
+    model[:, :, 66] = (1*model[:, :, 64]+3*model[:, :, 67])/4
+    return model
+
+
+def eara2021_abs_volume(parameter: str) -> xr.DataArray:
+    """the masked absolute volume of eara2021, NaN where the mask is below 0.3
+
+    Args:
+        parameter (str): vs or vp
+
+    Returns:
+        xr.DataArray: the read-only absolute volume
+    """
+    registry = get_model_registry()
+    eara2021_abs_path = resource(["model_files", "eara2021.nc"], normal_path=True)
+    mask_path = resource(["model_files", "mask.npy"], normal_path=True)
+
+    def build_abs() -> xr.DataArray:
+        eara_abs = registry.model("eara2021", parameter).copy()
+        eara_abs.data[registry.mask() < 0.3] = np.nan
+        return eara_abs
+
+    return registry.volume(
+        f"eara2021_{parameter}_masked", build_abs, [eara2021_abs_path, mask_path])
+
+
+def eara2021_per_volume(parameter: str, ref: str) -> xr.DataArray:
+    """the masked perturbation volume of eara2021, NaN where the mask is below 0.3
+
+    Args:
+        parameter (str): vs or vp
+        ref (str): the reference model of the perturbation, eara2022, stw105 or ak135
+
+    Raises:
+        Exception: the reference model is not supported
+
+    Returns:
+        xr.DataArray: the read-only perturbation (%) volume
+    """
+    registry = get_model_registry()
+
+    def build_per() -> xr.DataArray:
+        # * different reference models
+        if ref == "eara2022":
+            eara = registry.model("eara2021_per_ref", parameter)*100
+        else:
+            copy_model = registry.model("eara2021_per_ref", "vs")
+            if ref == "stw105":
+                ref_model = load_stw105(parameter, copy_model)
+            elif ref == "ak135":
+                ref_model = load_ak135(parameter, copy_model)
+            else:
+                raise Exception(f"unknown reference model: {ref}")
+            with phase("reference division"):
+                eara = registry.model("eara2021", parameter).copy()
+                eara.data = (eara.data/ref_model.data-1)*100
+                smooth_model(eara)
+        eara.data[registry.mask() < 0.3] = np.nan
+        return eara
+
+    return registry.volume(
+        f"eara2021_{parameter}_per_{ref}_masked", build_per, eara2021_volume_files())
+
+
+def eara2021_volumes(parameter: str, ref: str) -> Tuple[xr.DataArray, xr.DataArray]:
+    """the masked perturbation and absolute volumes of eara2021, NaN where the mask is below 0.3
+
+    Args:
+        parameter (str): vs or vp
+        ref (str): the reference model of the perturbation, eara2022, stw105 or ak135
+
+    Raises:
+        Exception: the reference model is not supported
+
+    Returns:
+        Tuple[xr.DataArray, xr.DataArray]: the read-only perturbation (%) and absolute volumes
+    """
+    return eara2021_per_volume(parameter, ref), eara2021_abs_volume(parameter)
+
+
+def eara2021_layouts(parameter: str, ref: str) -> Tuple[ModelLayouts, ModelLayouts]:
+    """the volumes of eara2021_volumes in the profile and slice layouts, so a cross-section only reads the columns
+    along its track
+
+    Args:
+        parameter (str): vs or vp
+        ref (str): the reference model of the perturbation, eara2022, stw105 or ak135
+
+    Returns:
+        Tuple[ModelLayouts, ModelLayouts]: the read-only perturbation (%) and absolute layouts
+    """
+    registry = get_model_registry()
+    abs_files = [resource(["model_files", name], normal_path=True)
+                 for name in ["eara2021.nc", "mask.npy"]]
+    # each volume is only built or attached when its layouts are not converted yet
+    eara = registry.layouts(f"eara2021_{parameter}_per_{ref}_masked",
+                            lambda: eara2021_per_volume(parameter, ref), eara2021_volume_files())
+    eara_abs = registry.layouts(f"eara2021_{parameter}_masked",
+                                lambda: eara2021_abs_volume(parameter), abs_files)
+    return eara, eara_abs
@@ -0,0 +1,240 @@
+"""
+ehb_catalog.py
+
+ingest the yearly ISC-EHB fixed width files (isc_ehb/*.hdf) into a compact binary catalog.
+the files are parsed in parallel, each into its own part, so only the new or changed files are parsed again.
+the merged catalog is sorted by 1x1 degree cells, and the cell offsets are the spatial index used to select
+the events near a projection line.
+"""
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from glob import glob
+from os import makedirs, remove
+from os.path import basename, isfile, join
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from eara2022 import resource
+from eara2022.instrument import profiled
+
+from .cache import file_fingerprint
+
+# lat, lon, dep and id in the fixed width records, the same as the widths 29,7,8,6,101,6
+EHB_COLSPECS = [(29, 36), (36, 44), (44, 50), (151, 157)]
+EHB_DTYPE = np.dtype([("lat", "<f4"), ("lon", "<f4"),
+                     ("dep", "<f4"), ("id", "<i4")])
+EHB_CHUNK_SIZE = 100000
+# the spatial index, 1x1 degree cells with lon from -180 and lat from -90
+CELL_NLON, CELL_NLAT = 360, 180
+EARTH_RADIUS_KM = 6371.
+
+
+def cell_ids(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """the cell of each event in the spatial index
+
+    Returns:
+        np.ndarray: the cell ids
+    """
+    ilat = np.clip(np.floor(lats+90).astype(int), 0, CELL_NLAT-1)
+    ilon = np.floor(np.mod(lons+180, 360)).astype(int) % CELL_NLON
+    return ilat*CELL_NLON+ilon
+
+
+def parse_ehb_file(hdf_path: str, part_path: str) -> int:
+    """parse a yearly ehb file chunk by chunk, and save the events to part_path
+
+    Args:
+        hdf_path (str): the fixed width file
+        part_path (str): the output .npy path
+
+    Returns:
+        int: the number of events
+    """
+    parts = []
+    for chunk in pd.read_fwf(hdf_path, colspecs=EHB_COLSPECS, names=["lat", "lon", "dep", "id"], header=None,
+                             chunksize=EHB_CHUNK_SIZE):
+        chunk = chunk.dropna(subset=["lat", "lon", "dep"])
+        part = np.zeros(len(chunk), dtype=EHB_DTYPE)
+        part["lat"] = chunk["lat"].to_numpy()
+        part["lon"] = chunk["lon"].to_numpy()
+        part["dep"] = chunk["dep"].to_numpy()
+        part["id"] = chunk["id"].fillna(-1).to_numpy()
+        parts.append(part)
+    events = np.concatenate(parts) if len(parts) != 0 else np.zeros(
+        0, dtype=EHB_DTYPE)
+    np.save(part_path, events)
+    return len(events)
+
+
+def write_catalog(events: np.ndarray, catalog_dir: str) -> None:
+    """sort the events by the cells, and write them with the cell offsets
+
+    Args:
+        events (np.ndarray): the events in EHB_DTYPE
+        catalog_dir (str): the catalog directory
+    """
+    cells = cell_ids(events["lat"], events["lon"])
+    order = np.argsort(cells, kind="stable")
+    offsets = np.searchsorted(cells[order], np.arange(CELL_NLON*CELL_NLAT+1))
+    np.save(join(catalog_dir, "events.npy"), events[order])
+    np.save(join(catalog_dir, "cells.npy"), offsets)
+
+
+@profiled()
+def ingest_ehb_catalog(hdf_dir: Optional[str] = None, catalog_dir: Optional[str] = None, max_workers: Optional[int] = None) -> str:
+    """Ingest the yearly ehb files to the binary catalog, only the new or changed files are parsed
+
+    The catalog directory contains manifest.json, one part for each yearly file, the merged events sorted by
+    the cells as events.npy, and the offsets of each cell in events.npy as cells.npy.
+
+    Args:
+        hdf_dir (Optional[str], optional): the directory of *.hdf. Defaults to isc_ehb.
+        catalog_dir (Optional[str], optional): the catalog directory. Defaults to isc_ehb/catalog.
+        max_workers (Optional[int], optional): the number of processes. Defaults to None.
+
+    Returns:
+        str: the catalog directory
+    """
+    if hdf_dir is None:
+        hdf_dir = resource(["isc_ehb"], normal_path=True)
+    if catalog_dir is None:
+        catalog_dir = resource(["isc_ehb", "catalog"],
+                               normal_path=True, check=False)
+    makedirs(catalog_dir, exist_ok=True)
+    manifest_path = join(catalog_dir, "manifest.json")
+    manifest = {}
+    if isfile(manifest_path):
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+
+    # * find the new or changed files
+    hdf_paths = {basename(each): each for each in sorted(
+        glob(join(hdf_dir, "*.hdf")))}
+    fingerprints = {name: file_fingerprint(path)
+                    for name, path in hdf_paths.items()}
+    to_parse = [name for name in hdf_paths if name not in manifest or manifest[name]
+                ["fingerprint"] != fingerprints[name] or not isfile(join(catalog_dir, manifest[name]["part"]))]
+    removed = [name for name in manifest if name not in hdf_paths]
+    if len(to_parse) == 0 and len(removed) == 0 and isfile(join(catalog_dir, "events.npy")):
+        return catalog_dir
+
+    # * parse in parallel, each process writes its own part
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(parse_ehb_file, hdf_paths[name], join(
+            catalog_dir, f"{name}.npy")) for name in to_parse}
+        for name, future in futures.items():
+            manifest[name] = {"fingerprint": fingerprints[name],
+                              "part": f"{name}.npy", "rows": future.result()}
+    for name in removed:
+        part_path = join(catalog_dir, manifest.pop(name)["part"])
+        if isfile(part_path):
+            remove(part_path)
+
+    # * merge the parts and build the spatial index
+    write_catalog(np.concatenate([np.load(join(catalog_dir, manifest[name]["part"]), mmap_mode="r")
+                                  for name in sorted(manifest)] or [np.zeros(0, dtype=EHB_DTYPE)]), catalog_dir)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return catalog_dir
+
+
+def swath_bbox(start: Tuple[float, float], end: Tuple[float, float], width: float, degree_limit: float) -> Tuple[float, float, float, float]:
+    """the bounding box of the swath, width km on each side of the great circle from start toward end
+
+    Args:
+        start (Tuple[float, float]): the (lon, lat) of the start
+        end (Tuple[float, float]): the (lon, lat) giving the direction
+        width (float): the half width in km
+        degree_limit (float): the length of the line in degree
+
+    Returns:
+        Tuple[float, float, float, float]: lon_min, lon_max, lat_min, lat_max, the lons might be beyond 180
+    """
+    def to_xyz(lon, lat):
+        lon, lat = np.deg2rad(lon), np.deg2rad(lat)
+        return np.array([np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)])
+    a, b = to_xyz(*start), to_xyz(*end)
+    # the unit tangent at start toward end
+    tangent = b-np.dot(a, b)*a
+    tangent /= np.linalg.norm(tangent)
+    t = np.linspace(0, np.deg2rad(degree_limit), 501)
+    points = np.cos(t)[:, None]*a[None, :]+np.sin(t)[:, None]*tangent[None, :]
+    lats = np.rad2deg(np.arcsin(np.clip(points[:, 2], -1, 1)))
+    lons = np.rad2deg(np.arctan2(points[:, 1], points[:, 0]))
+    # keep the track continuous across the dateline
+    lons = np.rad2deg(np.unwrap(np.deg2rad(lons)))
+    # one more degree for the bulge between the samples and the rounding of the cells
+    margin = np.rad2deg(width/EARTH_RADIUS_KM)+1
+    lat_min, lat_max = max(lats.min()-margin, -90), min(lats.max()+margin, 90)
+    if lat_min <= -89 or lat_max >= 89:
+        return -180, 180, lat_min, lat_max
+    lon_margin = margin / \
+        np.cos(np.deg2rad(max(abs(lat_min), abs(lat_max))))
+    return lons.min()-lon_margin, lons.max()+lon_margin, lat_min, lat_max
+
+
+class EHBCatalog:
+    """The binary ehb catalog written by ingest_ehb_catalog, memory mapped on the first query
+    """
+
+    def __init__(self, catalog_dir: str) -> None:
+        self.catalog_dir = catalog_dir
+        self._events: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+
+    @property
+    def events(self) -> np.ndarray:
+        if self._events is None:
+            self._events = np.load(
+                join(self.catalog_dir, "events.npy"), mmap_mode="r")
+            self._offsets = np.load(join(self.catalog_dir, "cells.npy"))
+        return self._events
+
+    def bbox(self, lon_min: float, lon_max: float, lat_min: float, lat_max: float) -> np.ndarray:
+        """the events in the cells overlapping the bounding box, a superset of the events inside it
+
+        Returns:
+            np.ndarray: the events in EHB_DTYPE
+        """
+        events = self.events
+        ilats = np.arange(max(int(np.floor(lat_min+90)), 0),
+                          min(int(np.floor(lat_max+90)), CELL_NLAT-1)+1)
+        if lon_max-lon_min >= 360:
+            ilons = np.arange(CELL_NLON)
+        else:
+            ilons = np.unique(np.mod(np.arange(int(np.floor(lon_min)), int(
+                np.floor(lon_max))+1)+180, 360))
+        if len(ilats) == 0 or len(ilons) == 0:
+            return events[:0]
+        # the cells with continuous lons in a row are continuous in the sorted events
+        runs = np.split(ilons, np.flatnonzero(np.diff(ilons) != 1)+1)
+        return np.concatenate([events[self._offsets[ilat*CELL_NLON+run[0]]:self._offsets[ilat*CELL_NLON+run[-1]+1]]
+                               for ilat in ilats for run in runs])
+
+    def swath(self, start: Tuple[float, float], end: Tuple[float, float], width: float, degree_limit: float) -> np.ndarray:
+        """the candidate events for the projection to the line, see swath_bbox
+
+        Returns:
+            np.ndarray: the events in EHB_DTYPE
+        """
+        return self.bbox(*swath_bbox(start, end, width, degree_limit))
+
+
+@cache
+def get_ehb_catalog(catalog_dir: Optional[str] = None) -> Optional[EHBCatalog]:
+    """get the shared binary catalog
+
+    Args:
+        catalog_dir (Optional[str], optional): the catalog directory. Defaults to isc_ehb/catalog.
+
+    Returns:
+        Optional[EHBCatalog]: the catalog, None if it has not been ingested
+    """
+    if catalog_dir is None:
+        catalog_dir = resource(["isc_ehb", "catalog"],
+                               normal_path=True, check=False)
+    if not isfile(join(catalog_dir, "events.npy")):
+        return None
+    return EHBCatalog(catalog_dir)
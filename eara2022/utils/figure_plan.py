@@ -0,0 +1,220 @@
+"""
+figure_plan.py
+
+the plans of the figures, all the arrays and annotations needed to draw a figure. a plan is computed by a pure
+plan stage, which does the interpolation, masking and catalog projection, and drawn by a render stage that only
+issues the GMT calls. the plans are saved as npz bundles in the cache directory, so re-styling a figure only
+re-runs the render stage, and the missing plans can be computed in worker processes.
+"""
+import hashlib
+import inspect
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from os import makedirs, replace
+from functools import cache
+from os.path import dirname, isfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, TypeVar
+
+import numpy as np
+from eara2022 import resource
+from eara2022.instrument import PROFILER, profiled
+
+from .cache import file_fingerprint
+
+# bump it when the content of the plans changes, so the old plans are not used
+PLAN_VERSION = 1
+ATTRS_KEY = "__attrs__"
+T = TypeVar("T")
+
+
+class FigurePlan:
+    """The arrays and the json serialisable annotations of a figure
+
+    The keys of the panels are as "panel/name", such as "0/per", and plan.panel(0) gives the arrays and the
+    annotations of a panel with the prefix removed.
+    """
+
+    def __init__(self, arrays: Optional[Dict[str, np.ndarray]] = None, attrs: Optional[Dict[str, Any]] = None) -> None:
+        self.arrays: Dict[str, np.ndarray] = dict(arrays or {})
+        self.attrs: Dict[str, Any] = dict(attrs or {})
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.arrays[key]
+
+    def __setitem__(self, key: str, value: np.ndarray) -> None:
+        self.arrays[key] = np.asarray(value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.arrays
+
+    def panel(self, name: Any) -> "FigurePlan":
+        """the arrays and annotations of a panel
+
+        Args:
+            name (Any): the panel name, such as the panel index
+
+        Returns:
+            FigurePlan: the plan of the panel
+        """
+        prefix = f"{name}/"
+        return FigurePlan({key[len(prefix):]: value for key, value in self.arrays.items() if key.startswith(prefix)},
+                          {key[len(prefix):]: value for key, value in self.attrs.items() if key.startswith(prefix)})
+
+    def set_panel(self, name: Any, panel: "FigurePlan") -> None:
+        """add the arrays and annotations of a panel, the inverse of panel(name)
+
+        Args:
+            name (Any): the panel name
+            panel (FigurePlan): the plan of the panel
+        """
+        for key, value in panel.arrays.items():
+            self[f"{name}/{key}"] = value
+        for key, value in panel.attrs.items():
+            self.attrs[f"{name}/{key}"] = value
+
+    def save(self, path: str) -> None:
+        """save the plan as a npz bundle, the annotations are stored as json
+
+        Args:
+            path (str): the .npz path
+        """
+        makedirs(dirname(path), exist_ok=True)
+        # write to a temporary file first, so a plan is never read half written
+        tmp_path = path+".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **self.arrays,
+                     **{ATTRS_KEY: np.array(json.dumps(self.attrs))})
+        replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FigurePlan":
+        with np.load(path) as bundle:
+            arrays = {key: bundle[key]
+                      for key in bundle.files if key != ATTRS_KEY}
+            attrs = json.loads(str(bundle[ATTRS_KEY]))
+        return cls(arrays, attrs)
+
+
+@cache
+def module_source_hash(module_name: str) -> str:
+    # the hash of the source of an imported module, the plans are computed again when the plan code changes
+    return hashlib.sha1(inspect.getsource(sys.modules[module_name]).encode()).hexdigest()[:16]
+
+
+def plan_key(plan_func: Callable[[dict], FigurePlan], inputs: dict, files: Sequence[str] = (),
+             modules: Optional[Sequence[str]] = None) -> str:
+    """the key of a plan from the plan function, its inputs, the fingerprints of the data files and the source of
+    the plan code
+
+    Args:
+        plan_func (Callable[[dict], FigurePlan]): the plan function
+        inputs (dict): the json serialisable inputs of plan_func
+        files (Sequence[str], optional): the data files read by plan_func, the missing files are allowed. Defaults to ().
+        modules (Optional[Sequence[str]], optional): the modules of the plan code, keep the render code out of them
+            so re-styling does not compute the plans again. Defaults to the module of plan_func.
+
+    Returns:
+        str: the hex key
+    """
+    if modules is None:
+        modules = [plan_func.__module__]
+    content = {
+        "version": PLAN_VERSION,
+        "func": f"{plan_func.__module__}.{plan_func.__qualname__}",
+        "inputs": inputs,
+        "files": {path: file_fingerprint(path) if isfile(path) else None for path in files},
+        "sources": {name: module_source_hash(name) for name in modules},
+    }
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def plan_path(plan_func: Callable[[dict], FigurePlan], key: str) -> str:
+    return resource(["cache", "plans", f"{plan_func.__name__}_{key}.npz"], normal_path=True, check=False)
+
+
+@profiled()
+def get_plan(plan_func: Callable[[dict], FigurePlan], inputs: dict, files: Sequence[str] = (),
+             modules: Optional[Sequence[str]] = None) -> FigurePlan:
+    """get the plan of plan_func(inputs) from the cache, or compute and cache it
+
+    Args:
+        plan_func (Callable[[dict], FigurePlan]): the plan function
+        inputs (dict): the json serialisable inputs of plan_func, only the inputs affecting the plan
+        files (Sequence[str], optional): the data files read by plan_func. Defaults to ().
+        modules (Optional[Sequence[str]], optional): the modules of the plan code. Defaults to the module of plan_func.
+
+    Returns:
+        FigurePlan: the plan
+    """
+    path = plan_path(plan_func, plan_key(plan_func, inputs, files, modules))
+    if isfile(path):
+        return FigurePlan.load(path)
+    plan = plan_func(inputs)
+    plan.save(path)
+    return plan
+
+
+@profiled()
+def compute_plans(plan_func: Callable[[dict], FigurePlan], inputs_list: Sequence[dict], files: Sequence[str] = (),
+                  max_workers: Optional[int] = None, prepare: Optional[Callable[[dict], None]] = None,
+                  modules: Optional[Sequence[str]] = None) -> List[FigurePlan]:
+    """get the plans of several inputs, the missing plans are computed in worker processes
+
+    Args:
+        plan_func (Callable[[dict], FigurePlan]): the plan function, defined at the module level so it can be pickled
+        inputs_list (Sequence[dict]): the inputs of each plan
+        files (Sequence[str], optional): the data files read by plan_func. Defaults to ().
+        max_workers (Optional[int], optional): the number of processes. Defaults to None.
+        prepare (Optional[Callable[[dict], None]], optional): called in this process with the inputs of each
+            missing plan before the workers start, such as to build the shared model volumes once. Defaults to None.
+        modules (Optional[Sequence[str]], optional): the modules of the plan code. Defaults to the module of plan_func.
+
+    Returns:
+        List[FigurePlan]: the plans in the order of inputs_list
+    """
+    paths = [plan_path(plan_func, plan_key(plan_func, inputs, files, modules))
+             for inputs in inputs_list]
+    missing = {}
+    for inputs, path in zip(inputs_list, paths):
+        if not isfile(path):
+            missing.setdefault(path, inputs)
+    if len(missing) != 0:
+        if prepare is not None:
+            for inputs in missing.values():
+                prepare(inputs)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {path: executor.submit(plan_func, inputs)
+                       for path, inputs in missing.items()}
+            for path, future in futures.items():
+                future.result().save(path)
+    return [FigurePlan.load(path) for path in paths]
+
+
+def map_panels(prepare: Callable[[Any], T], names: Sequence[Any], max_workers: Optional[int] = None) -> Iterator[T]:
+    """prepare the panels in a thread pool, all submitted up front, and yield them in order as they complete
+
+    The drawing loop consuming the panels overlaps with the preparation of the later panels. prepare should only do
+    the NumPy/SciPy work, which mostly releases the GIL, as GMT is not thread safe. The panels are prepared one by
+    one when the profiler is enabled, as it is not thread safe either.
+
+    Args:
+        prepare (Callable[[Any], T]): prepare the data of a panel from its name
+        names (Sequence[Any]): the panel names, such as the panel indexes
+        max_workers (Optional[int], optional): the number of threads. Defaults to None.
+
+    Yields:
+        Iterator[T]: the prepared panels in the order of names
+    """
+    if PROFILER.enabled or max_workers == 1:
+        for name in names:
+            yield prepare(name)
+        return
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [executor.submit(prepare, name) for name in names]
+        for future in futures:
+            yield future.result()
+    finally:
+        # the panels not drawn yet are dropped if the drawing fails
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -9,11 +9,13 @@ from typing import List
 import numpy as np
 import obspy
 from eara2022 import gmt_path
+from eara2022.instrument import profiled
 from numpy.typing import NDArray
 
 from . import generate_tmp_file
 
 
+@profiled()
 def gcmt_to_psmeca(gcmt_dir: str, has_text: bool = False) -> str:
     """Generate gcmt temp file for psmeca plotting
 
@@ -71,6 +73,7 @@ def gcmt_to_psmeca(gcmt_dir: str, has_text: bool = False) -> str:
     return gmt_path(tmp_file)
 
 
+@profiled()
 def collect_gcmt_information(gcmt_dir: str) -> dict[str, NDArray]:
     """Collect source information
 
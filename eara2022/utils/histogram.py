@@ -0,0 +1,62 @@
+"""
+histogram.py
+
+bin the misfit measurements once with numpy, and cache the bins and the statistics by the fingerprint of
+the input file, so the histograms are plotted as stair lines instead of re-binning the raw samples in gmt.
+"""
+from typing import NamedTuple, Tuple
+
+import numpy as np
+from eara2022.instrument import profiled
+
+
+class HistogramStats(NamedTuple):
+    """the histogram and the NaN-aware statistics of a sample"""
+    # the bin edges, len(counts)+1
+    edges: np.ndarray
+    counts: np.ndarray
+    mean: float
+    std: float
+
+    def to_array(self) -> np.ndarray:
+        """pack as a (nbins+2, 2) array for the npy cache, the first row is (mean, std), then (edge, count),
+        and the last row is the right edge with a zero count
+        """
+        return np.vstack([[self.mean, self.std], np.column_stack((self.edges, np.append(self.counts, 0)))])
+
+    @classmethod
+    def from_array(cls, packed: np.ndarray) -> "HistogramStats":
+        return cls(packed[1:, 0], packed[1:-1, 1], float(packed[0, 0]), float(packed[0, 1]))
+
+    def stairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """the outline of the bars, the same as gmt histogram -S
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: x and y of the stair line
+        """
+        x = np.repeat(self.edges, 2)
+        y = np.concatenate([[0], np.repeat(self.counts, 2), [0]])
+        return x, y
+
+
+@profiled()
+def histogram_stats(data: np.ndarray, bar_width: float) -> HistogramStats:
+    """bin the data the same as gmt histogram -T{bar_width}, and get the mean and std ignoring NaN
+
+    The bins are left closed and aligned to the multiples of bar_width, and the last bin contains the max value.
+
+    Args:
+        data (np.ndarray): the samples, might contain NaN
+        bar_width (float): the bin width
+
+    Returns:
+        HistogramStats: the histogram and the statistics
+    """
+    valid = data[~np.isnan(data)]
+    if len(valid) == 0:
+        return HistogramStats(np.zeros(1), np.zeros(0), np.nan, np.nan)
+    first = np.floor(valid.min()/bar_width)
+    last = np.floor(valid.max()/bar_width)+1
+    edges = np.arange(first, last+1)*bar_width
+    counts, _ = np.histogram(valid, bins=edges)
+    return HistogramStats(edges, counts.astype(float), float(valid.mean()), float(valid.std()))
@@ -0,0 +1,152 @@
+"""
+layer_stats.py
+
+the statistics of each depth layer of a model volume, read depth chunk by depth chunk so the memory is bounded,
+such as the 1D reference of eara2021 from model_abs/(1+model_per).
+"""
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from eara2022 import resource
+from eara2022.instrument import profiled
+
+LAYER_CHUNK_SIZE = 10
+LAYER_PERCENTILES = (5, 25, 75, 95)
+
+
+def weighted_quantiles(values: np.ndarray, weights: np.ndarray, quantiles: Sequence[float]) -> np.ndarray:
+    """the weighted quantiles, each value is at the middle of its cumulative weight
+
+    Args:
+        values (np.ndarray): the values, no NaN
+        weights (np.ndarray): the positive weights
+        quantiles (Sequence[float]): the quantiles in [0, 1]
+
+    Returns:
+        np.ndarray: the quantiles, NaN if there is no value
+    """
+    if len(values) == 0:
+        return np.full(len(quantiles), np.nan)
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    sorted_weights = weights[order]
+    cumulative = np.cumsum(sorted_weights)-0.5*sorted_weights
+    return np.interp(quantiles, cumulative/sorted_weights.sum(), sorted_values)
+
+
+def layer_summary(layer: np.ndarray, weights: np.ndarray, percentiles: Sequence[float]) -> Dict[str, float]:
+    """the weighted mean, median and percentiles of a (nlon, nlat) layer, the NaN values are skipped
+
+    Args:
+        layer (np.ndarray): the layer
+        weights (np.ndarray): the weights in the same shape
+        percentiles (Sequence[float]): the percentiles in [0, 100]
+
+    Returns:
+        Dict[str, float]: mean, median and p{percentile}
+    """
+    valid = ~np.isnan(layer)
+    values = layer[valid]
+    layer_weights = weights[valid]
+    res = {"mean": np.sum(values*layer_weights)/np.sum(layer_weights) if len(values) != 0 else np.nan}
+    quantiles = weighted_quantiles(
+        values, layer_weights, [0.5]+[each/100 for each in percentiles])
+    res["median"] = quantiles[0]
+    for percentile, value in zip(percentiles, quantiles[1:]):
+        res[f"p{percentile:g}"] = value
+    return res
+
+
+@profiled()
+def layer_stats(read_chunk: Callable[[int, int], np.ndarray], depths: np.ndarray, latitudes: np.ndarray,
+                mask: Optional[np.ndarray] = None, mask_threshold: float = 0.3, weighted: bool = True,
+                percentiles: Sequence[float] = LAYER_PERCENTILES, chunk_size: int = LAYER_CHUNK_SIZE) -> pd.DataFrame:
+    """Compute the statistics of each depth layer of a (nlon, nlat, ndep) volume, one depth chunk at a time
+
+    Args:
+        read_chunk (Callable[[int, int], np.ndarray]): read the volume[:, :, start:end] by (start, end)
+        depths (np.ndarray): the depths of the volume
+        latitudes (np.ndarray): the latitudes of the volume, for the cos(lat) area weights
+        mask (Optional[np.ndarray], optional): the volume of the mask, such as np.load(mask.npy, mmap_mode="r").
+            Defaults to None.
+        mask_threshold (float, optional): the values with mask < mask_threshold are skipped. Defaults to 0.3.
+        weighted (bool, optional): if weight by cos(lat), otherwise the same as np.nanmean. Defaults to True.
+        percentiles (Sequence[float], optional): the percentiles to compute. Defaults to LAYER_PERCENTILES.
+        chunk_size (int, optional): the number of depths in each chunk. Defaults to LAYER_CHUNK_SIZE.
+
+    Returns:
+        pd.DataFrame: depth, mean, median and p{percentile} for each depth
+    """
+    rows = []
+    for start in range(0, len(depths), chunk_size):
+        end = min(start+chunk_size, len(depths))
+        chunk = np.asarray(read_chunk(start, end), dtype=np.float64)
+        if mask is not None:
+            chunk[np.asarray(mask[:, :, start:end]) < mask_threshold] = np.nan
+        if weighted:
+            weights = np.broadcast_to(
+                np.cos(np.deg2rad(latitudes))[None, :], chunk.shape[:2])
+        else:
+            weights = np.ones(chunk.shape[:2])
+        for index in range(end-start):
+            rows.append({"depth": depths[start+index],
+                        **layer_summary(chunk[:, :, index], weights, percentiles)})
+    return pd.DataFrame(rows)
+
+
+@profiled()
+def reference_layer_stats(abs_path: str, per_path: str, parameters: Sequence[str] = ("vs", "vp"), mask_path: Optional[str] = None,
+                          **kwargs) -> pd.DataFrame:
+    """the layer statistics of the reference model abs/(1+per), in the format of the 1D reference csv
+
+    The mean of each parameter is in the column of its name, such as vs, and the others are vs_median, vs_p5...
+
+    Args:
+        abs_path (str): the absolute model
+        per_path (str): the perturbation model relative to the reference model
+        parameters (Sequence[str], optional): the parameters. Defaults to ("vs", "vp").
+        mask_path (Optional[str], optional): the mask.npy. Defaults to None for no mask.
+        kwargs: passed to layer_stats
+
+    Returns:
+        pd.DataFrame: the 1D reference with the depth column
+    """
+    mask = np.load(mask_path, mmap_mode="r") if mask_path is not None else None
+    res = None
+    with xr.open_dataset(abs_path) as model_abs, xr.open_dataset(per_path) as model_per:
+        for parameter in parameters:
+            def read_chunk(start: int, end: int) -> np.ndarray:
+                # only the chunk is read from the files
+                chunk_abs = model_abs[parameter].isel(
+                    depth=slice(start, end)).values.astype(np.float64)
+                chunk_per = model_per[parameter].isel(
+                    depth=slice(start, end)).values.astype(np.float64)
+                return chunk_abs/(1+chunk_per)
+            stats = layer_stats(read_chunk, model_abs["depth"].values, model_abs["latitude"].values,
+                                mask=mask, **kwargs)
+            stats = stats.rename(columns={"mean": parameter, **{
+                column: f"{parameter}_{column}" for column in stats.columns if column not in ["depth", "mean"]}})
+            res = stats if res is None else res.merge(stats, on="depth")
+    return res
+
+
+def build_eara2021_1d_ref(output_path: Optional[str] = None) -> str:
+    """write the cos(lat) weighted 1D reference of eara2021 in the valid region of the mask,
+    in the same format as eara2021_1dref_just_average_not_actual.csv
+
+    Args:
+        output_path (Optional[str], optional): the csv path. Defaults to model_files/eara2021_1dref_layer_stats.csv.
+
+    Returns:
+        str: the csv path
+    """
+    if output_path is None:
+        output_path = resource(
+            ["model_files", "eara2021_1dref_layer_stats.csv"], normal_path=True, check=False)
+    stats = reference_layer_stats(resource(["model_files", "eara2021.nc"], normal_path=True),
+                                  resource(["model_files", "eara2021_per_ref.nc"], normal_path=True),
+                                  mask_path=resource(["model_files", "mask.npy"], normal_path=True))
+    stats.to_csv(output_path, index=False)
+    return output_path
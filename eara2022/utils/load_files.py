@@ -1,6 +1,9 @@
 import pickle
 
+from eara2022.instrument import profiled
 
+
+@profiled()
 def load_pickle(pickle_path: str):
     # might load windows, so we import seisflow here to ensure the installiation
     with open(pickle_path, "rb") as f:
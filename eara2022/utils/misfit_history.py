@@ -0,0 +1,178 @@
+"""
+misfit_history.py
+
+an append-only binary store of the misfit in each inversion iteration, with fixed size records of
+iteration, stage, category, if it is the starting misfit of the stage, and the misfit.
+the file is memory mapped when read, so appending a new iteration does not rewrite the history.
+the legacy npy dicts converted into the history are recorded with their fingerprints in a json next to it.
+"""
+import json
+from functools import cache
+from os import remove, replace
+from os.path import getsize, isfile, splitext
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from eara2022.instrument import profiled
+
+from .cache import file_fingerprint
+
+MISFIT_HISTORY_DTYPE = np.dtype([("iteration", "<i4"), ("stage", "<i4"), ("category", "S16"),
+                                 ("start", "?"), ("misfit", "<f8")])
+
+
+class MisfitHistory:
+    """The misfit history of the inversion, stored as MISFIT_HISTORY_DTYPE records
+
+    The starting misfit of a stage is the misfit after the source inversion at its first iteration. When an
+    iteration is appended more than once, the last record is used.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._records: Optional[np.ndarray] = None
+        self._size = 0
+
+    @property
+    def records(self) -> np.ndarray:
+        size = getsize(self.path) if isfile(self.path) else 0
+        # map again if the file is appended by another process
+        if self._records is None or size != self._size:
+            self._size = size
+            if size == 0:
+                self._records = np.zeros(0, dtype=MISFIT_HISTORY_DTYPE)
+            else:
+                self._records = np.memmap(
+                    self.path, dtype=MISFIT_HISTORY_DTYPE, mode="r")
+        return self._records
+
+    def append(self, records: np.ndarray) -> None:
+        """append the records to the end of the file
+
+        Args:
+            records (np.ndarray): the records in MISFIT_HISTORY_DTYPE
+        """
+        with open(self.path, "ab") as f:
+            f.write(np.asarray(records, dtype=MISFIT_HISTORY_DTYPE).tobytes())
+        self._records = None
+
+    def append_iteration(self, iteration: int, stage: int, misfits: Dict[str, float], start: bool = False) -> None:
+        """append the misfits of all the categories in an iteration
+
+        Args:
+            iteration (int): the iteration number
+            stage (int): the stage number
+            misfits (Dict[str, float]): category -> misfit
+            start (bool, optional): if they are the starting misfits of the stage. Defaults to False.
+        """
+        records = np.zeros(len(misfits), dtype=MISFIT_HISTORY_DTYPE)
+        records["iteration"] = iteration
+        records["stage"] = stage
+        records["category"] = [category.encode() for category in misfits]
+        records["start"] = start
+        records["misfit"] = list(misfits.values())
+        self.append(records)
+
+    def stages(self) -> List[int]:
+        return sorted(int(each) for each in np.unique(self.records["stage"]))
+
+    def _select(self, category: str, stage: int, start: bool) -> np.ndarray:
+        records = self.records
+        return records[(records["category"] == category.encode()) & (records["stage"] == stage) & (records["start"] == start)]
+
+    def series(self, category: str, stage: int) -> Tuple[np.ndarray, np.ndarray]:
+        """the misfit in each iteration of the stage
+
+        Args:
+            category (str): the misfit category
+            stage (int): the stage number
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: the sorted iterations and their misfits
+        """
+        rows = self._select(category, stage, False)
+        # keep the last appended record of each iteration
+        iterations, index = np.unique(
+            rows["iteration"][::-1], return_index=True)
+        return iterations, np.asarray(rows["misfit"][::-1][index])
+
+    def start(self, category: str, stage: int) -> float:
+        """the starting misfit of the stage
+
+        Args:
+            category (str): the misfit category
+            stage (int): the stage number
+
+        Raises:
+            Exception: no starting misfit
+
+        Returns:
+            float: the starting misfit
+        """
+        rows = self._select(category, stage, True)
+        if len(rows) == 0:
+            raise Exception(f"no starting misfit of {category} in stage {stage}")
+        return float(rows["misfit"][-1])
+
+
+def legacy_sources_path(output_path: str) -> str:
+    return f"{splitext(output_path)[0]}.sources.json"
+
+
+def legacy_sources(stages: Dict[int, Tuple[str, int, int]]) -> dict:
+    # stage -> [npy path, first iteration, last iteration, fingerprint], as read back from the json
+    return {str(stage): [path, first, last, file_fingerprint(path)] for stage, (path, first, last) in stages.items()}
+
+
+def is_legacy_converted(stages: Dict[int, Tuple[str, int, int]], output_path: str) -> bool:
+    """if the history is converted from the current version of the legacy npy dicts
+
+    Args:
+        stages (Dict[int, Tuple[str, int, int]]): stage -> (npy path, first iteration, last iteration)
+        output_path (str): the history path
+
+    Returns:
+        bool: False if the history or its sources json is missing, or the stages or the npy files changed
+    """
+    sources_path = legacy_sources_path(output_path)
+    if not isfile(output_path) or not isfile(sources_path):
+        return False
+    with open(sources_path, "r") as f:
+        return json.load(f) == legacy_sources(stages)
+
+
+@profiled()
+def convert_legacy_misfit(stages: Dict[int, Tuple[str, int, int]], output_path: str) -> None:
+    """Convert the pickled misfit_*_tosave.npy dicts to the history store
+
+    Each dict maps a category to its misfit indexed by iteration, and category+"s" to the starting misfits
+    indexed by stage-1. The history is written to a temporary file and moved into place, and the sources
+    json is only written after it, so an interrupted conversion is converted again in the next run.
+
+    Args:
+        stages (Dict[int, Tuple[str, int, int]]): stage -> (npy path, first iteration, last iteration)
+        output_path (str): the history path, overwritten
+    """
+    sources_path = legacy_sources_path(output_path)
+    if isfile(sources_path):
+        remove(sources_path)
+    tmp_path = f"{output_path}.tmp"
+    history = MisfitHistory(tmp_path)
+    open(tmp_path, "wb").close()
+    for stage, (path, first, last) in stages.items():
+        misfit: dict = np.load(path, allow_pickle=True).item()
+        categories = [key for key in misfit if key+"s" in misfit]
+        history.append_iteration(first, stage, {category: misfit[category+"s"][stage-1]
+                                                for category in categories}, start=True)
+        for iteration in range(first, last+1):
+            history.append_iteration(iteration, stage, {category: misfit[category][iteration]
+                                                        for category in categories})
+    replace(tmp_path, output_path)
+    with open(f"{sources_path}.tmp", "w") as f:
+        json.dump(legacy_sources(stages), f, indent=2)
+    replace(f"{sources_path}.tmp", sources_path)
+
+
+@cache
+def get_misfit_history(path: str) -> MisfitHistory:
+    return MisfitHistory(path)
@@ -0,0 +1,129 @@
+"""
+misfit_tables.py
+
+load the per phase misfit tables ({phase}.txt with nzcc, cc and dt columns) of the inversion runs.
+all the tables are parsed concurrently by the pandas C reader, and each run is cached as one structured array,
+so when a new iteration is added, only the new run is parsed.
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join, normpath
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from eara2022.instrument import profiled
+
+from .cache import file_fingerprint, load_cache, save_cache
+
+MISFIT_PHASES = ("z", "r", "t", "surface_z", "surface_r", "surface_t")
+# cols in the tables: 0,1,2 nzcc,cc,dt
+MISFIT_DTYPE = np.dtype([("phase", "S9"), ("nzcc", "f8"),
+                        ("cc", "f8"), ("dt", "f8")])
+
+
+def read_misfit_table(path: str) -> np.ndarray:
+    """parse one whitespace separated misfit table, not profiled as it runs in the worker threads
+
+    Args:
+        path (str): the {phase}.txt path
+
+    Returns:
+        np.ndarray: (N,3) array of nzcc, cc and dt
+    """
+    return pd.read_csv(path, sep=r"\s+", header=None, usecols=[0, 1, 2], comment="#",
+                       dtype=np.float64, engine="c").to_numpy()
+
+
+def run_fingerprint(dirname: str, phases: Sequence[str] = MISFIT_PHASES) -> str:
+    """the fingerprint of a run from the fingerprints of its tables
+
+    Args:
+        dirname (str): the run directory
+        phases (Sequence[str], optional): the phases. Defaults to MISFIT_PHASES.
+
+    Returns:
+        str: the hex fingerprint
+    """
+    content = "|".join(file_fingerprint(
+        join(dirname, f"{phase}.txt")) for phase in phases)
+    return hashlib.sha1(content.encode()).hexdigest()[:16]
+
+
+def to_structured(tables: Dict[str, np.ndarray], phases: Sequence[str]) -> np.ndarray:
+    """concatenate the tables of a run, the rows are ordered by phase
+
+    Args:
+        tables (Dict[str, np.ndarray]): phase -> (N,3) table
+        phases (Sequence[str]): the phases
+
+    Returns:
+        np.ndarray: the structured array in MISFIT_DTYPE
+    """
+    res = np.zeros(sum(len(tables[phase])
+                   for phase in phases), dtype=MISFIT_DTYPE)
+    start = 0
+    for phase in phases:
+        table = tables[phase]
+        end = start+len(table)
+        res["phase"][start:end] = phase.encode()
+        res["nzcc"][start:end] = table[:, 0]
+        res["cc"][start:end] = table[:, 1]
+        res["dt"][start:end] = table[:, 2]
+        start = end
+    return res
+
+
+@profiled()
+def load_misfit_runs(dirnames: Sequence[str], phases: Sequence[str] = MISFIT_PHASES, max_workers: Optional[int] = None) -> List[np.ndarray]:
+    """Load the misfit tables of several runs, such as the iterations of the inversion
+
+    The runs with an up to date cache are loaded from the npy cache, and the tables of the other runs are
+    parsed concurrently, so appending a new iteration only parses the new tables.
+
+    Args:
+        dirnames (Sequence[str]): the run directories, each with {phase}.txt
+        phases (Sequence[str], optional): the phases to load. Defaults to MISFIT_PHASES.
+        max_workers (Optional[int], optional): the number of parsing threads. Defaults to None.
+
+    Returns:
+        List[np.ndarray]: one structured array in MISFIT_DTYPE for each run
+    """
+    res: List[Optional[np.ndarray]] = [None]*len(dirnames)
+    cache_names = [f"misfit_run_{run_fingerprint(normpath(dirname), phases)}"
+                   for dirname in dirnames]
+    to_parse = []
+    for irun, cache_name in enumerate(cache_names):
+        loaded = load_cache(cache_name)
+        if loaded is not None:
+            res[irun] = loaded
+        else:
+            to_parse.append(irun)
+    if len(to_parse) == 0:
+        return res
+
+    # * parse all the missing tables at once, the C reader releases the GIL
+    paths = {(irun, phase): join(dirnames[irun], f"{phase}.txt")
+             for irun in to_parse for phase in phases}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {key: executor.submit(read_misfit_table, path)
+                   for key, path in paths.items()}
+        tables = {key: future.result() for key, future in futures.items()}
+    for irun in to_parse:
+        res[irun] = to_structured(
+            {phase: tables[(irun, phase)] for phase in phases}, phases)
+        save_cache(file_name=cache_names[irun], content=res[irun])
+    return res
+
+
+def select_phase(run: np.ndarray, phase: str) -> np.ndarray:
+    """the rows of one phase in a run
+
+    Args:
+        run (np.ndarray): the structured array of the run
+        phase (str): the phase
+
+    Returns:
+        np.ndarray: the rows of the phase
+    """
+    return run[run["phase"] == phase.encode()]
@@ -0,0 +1,186 @@
+"""
+model_layout.py
+
+a model volume stored in two layouts. the profile layout keeps the whole depth columns of a tile of
+(longitude, latitude) cells together, so a vertical cross-section reads only the columns along its track. the
+slice layout keeps each depth plane together, so a depth slice reads only the two planes around its depth.
+ModelLayouts.interp samples the volume as slice.model_interp, and picks the layout touching fewer values.
+"""
+import json
+from os import getpid, replace
+from os.path import isfile
+from typing import Optional, Tuple
+
+import numpy as np
+import xarray as xr
+
+# bump it when the layout of the files changes
+LAYOUT_VERSION = 1
+LAYOUTS = ("profile", "slice")
+# the (longitude, latitude) cells of a tile in the profile layout
+TILE_SIZE = 16
+MODEL_DIMS = ("longitude", "latitude", "depth")
+
+
+def layout_paths(prefix: str) -> Tuple[str, str, str]:
+    return f"{prefix}.profile.npy", f"{prefix}.slice.npy", f"{prefix}.json"
+
+
+def is_converted(prefix: str) -> bool:
+    return all(isfile(each) for each in layout_paths(prefix))
+
+
+def write_layouts(volume: xr.DataArray, prefix: str, tile_size: int = TILE_SIZE) -> None:
+    """convert a model volume to the profile and slice layouts
+
+    Args:
+        volume (xr.DataArray): the volume with the dims longitude, latitude and depth
+        prefix (str): the path prefix of the files, as {prefix}.profile.npy, {prefix}.slice.npy and {prefix}.json
+        tile_size (int, optional): the (longitude, latitude) cells of a tile. Defaults to TILE_SIZE.
+    """
+    volume = volume.transpose(*MODEL_DIMS)
+    values = np.asarray(volume.values)
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(float)
+    nlon, nlat, ndep = values.shape
+    # * the tiles are padded with NaN to the multiples of tile_size
+    ntile_lon, ntile_lat = -(-nlon//tile_size), -(-nlat//tile_size)
+    padded = np.full((ntile_lon*tile_size, ntile_lat *
+                     tile_size, ndep), np.nan, dtype=values.dtype)
+    padded[:nlon, :nlat] = values
+    # (tile lon, tile lat, cell lon, cell lat, depth)
+    tiles = padded.reshape(ntile_lon, tile_size, ntile_lat,
+                           tile_size, ndep).transpose(0, 2, 1, 3, 4)
+    profile_path, slice_path, meta_path = layout_paths(prefix)
+    meta = {"version": LAYOUT_VERSION, "tile_size": tile_size, "name": volume.name,
+            "coords": {dim: volume[dim].values.tolist() for dim in MODEL_DIMS}}
+    # write to the temporary files first, so the other processes never read a half written layout
+    tmp_suffix = f".{getpid()}.tmp"
+    with open(profile_path+tmp_suffix, "wb") as f:
+        np.save(f, np.ascontiguousarray(tiles))
+    with open(slice_path+tmp_suffix, "wb") as f:
+        np.save(f, np.ascontiguousarray(values.transpose(2, 0, 1)))
+    with open(meta_path+tmp_suffix, "w") as f:
+        json.dump(meta, f)
+    for path in (profile_path, slice_path, meta_path):
+        replace(path+tmp_suffix, path)
+
+
+def bracket(axis: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """the lower grid index and the weight of the upper grid point of each value, as the linear interpolation
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: the index, the weight, and if the value is outside the axis
+    """
+    values = np.asarray(values, dtype=float)
+    outside = (values < axis[0]) | (values > axis[-1]) | np.isnan(values)
+    index = np.clip(np.searchsorted(axis, values, side="right") -
+                    1, 0, len(axis)-2)
+    weight = np.clip((values-axis[index])/(axis[index+1]-axis[index]), 0, 1)
+    return index, weight, outside
+
+
+class ModelLayouts:
+    """The read-only model volume in the profile and slice layouts written by write_layouts
+
+    Args:
+        prefix (str): the path prefix of the files
+    """
+
+    def __init__(self, prefix: str) -> None:
+        profile_path, slice_path, meta_path = layout_paths(prefix)
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta["version"] != LAYOUT_VERSION:
+            raise Exception(
+                f"the layouts of {prefix} are version {meta['version']}, convert them again")
+        self.name = meta["name"]
+        self.tile_size = meta["tile_size"]
+        self.longitude, self.latitude, self.depth = [
+            np.asarray(meta["coords"][dim], dtype=float) for dim in MODEL_DIMS]
+        # (tile lon, tile lat, cell lon, cell lat, depth) and (depth, longitude, latitude)
+        self.profile_data: np.ndarray = np.load(profile_path, mmap_mode="r")
+        self.slice_data: np.ndarray = np.load(slice_path, mmap_mode="r")
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return len(self.longitude), len(self.latitude), len(self.depth)
+
+    def choose_layout(self, npts: int, depth_index: np.ndarray) -> str:
+        """the layout touching fewer values for npts points at the depths bracketed by depth_index
+
+        Returns:
+            str: profile or slice
+        """
+        if len(depth_index) == 0:
+            return "slice"
+        nlon, nlat, _ = self.shape
+        # four columns for each point, over the depth range, or two planes for each depth
+        profile_cost = 4*npts*(depth_index.max()-depth_index.min()+2)
+        slice_cost = len(np.union1d(depth_index, depth_index+1))*nlon*nlat
+        return "profile" if profile_cost <= slice_cost else "slice"
+
+    def interp(self, lons: np.ndarray, lats: np.ndarray, deps: np.ndarray, layout: Optional[str] = None,
+               bounds_error: bool = True) -> np.ndarray:
+        """linearly interp the volume at each depth of the (lons,lats) points, as slice.model_interp
+
+        Args:
+            lons (np.ndarray): the longitude array
+            lats (np.ndarray): the latitude array, the same length as lons
+            deps (np.ndarray): the depth array
+            layout (Optional[str], optional): profile or slice, chosen by choose_layout if None. Defaults to None.
+            bounds_error (bool, optional): if raise for points outside the model, otherwise return NaN.
+                Defaults to True.
+
+        Raises:
+            Exception: the layout is not supported, or a point is outside the model with bounds_error
+
+        Returns:
+            np.ndarray: the interp result in the shape of (len(lons),len(deps))
+        """
+        i, wi, outside_lon = bracket(self.longitude, lons)
+        j, wj, outside_lat = bracket(self.latitude, lats)
+        k, wk, outside_dep = bracket(self.depth, np.atleast_1d(deps))
+        if bounds_error and (outside_lon.any() or outside_lat.any() or outside_dep.any()):
+            raise Exception("the points are outside the model")
+        if layout is None:
+            layout = self.choose_layout(len(i), k)
+        if layout == "profile":
+            res = self._interp_profile(i, wi, j, wj, k, wk)
+        elif layout == "slice":
+            res = self._interp_slice(i, wi, j, wj, k, wk)
+        else:
+            raise Exception(
+                f"layout {layout} is not supported, should be one of {LAYOUTS}")
+        res[outside_lon | outside_lat, :] = np.nan
+        res[:, outside_dep] = np.nan
+        return res
+
+    def _interp_profile(self, i, wi, j, wj, k, wk) -> np.ndarray:
+        # * read the four neighbouring columns of each point, only in the depth range
+        k_start, k_end = k.min(), k.max()+2
+        columns = 0
+        for di, wx in ((0, 1-wi), (1, wi)):
+            for dj, wy in ((0, 1-wj), (1, wj)):
+                ii, jj = i+di, j+dj
+                column = self.profile_data[ii//self.tile_size, jj//self.tile_size,
+                                           ii % self.tile_size, jj % self.tile_size, k_start:k_end]
+                columns = columns+(wx*wy)[:, None]*column
+        kk = k-k_start
+        return columns[:, kk]*(1-wk)+columns[:, kk+1]*wk
+
+    def _interp_slice(self, i, wi, j, wj, k, wk) -> np.ndarray:
+        # * read the two neighbouring planes of each depth, each plane once
+        planes = {}
+        res = np.empty((len(i), len(k)))
+        for index, (k0, w) in enumerate(zip(k, wk)):
+            values = 0
+            for kk, wz in ((k0, 1-w), (k0+1, w)):
+                if kk not in planes:
+                    planes[kk] = np.asarray(self.slice_data[kk])
+                plane = planes[kk]
+                values = values+wz*((1-wi)*(1-wj)*plane[i, j]+(1-wi)*wj*plane[i, j+1] +
+                                    wi*(1-wj)*plane[i+1, j]+wi*wj*plane[i+1, j+1])
+            res[:, index] = values
+        return res
+
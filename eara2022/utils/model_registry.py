@@ -0,0 +1,209 @@
+"""
+model_registry.py
+
+the model volumes shared by the processes. each volume is written once as a .npy file in the cache directory,
+and every process attaches it as a read-only memory map, so the workers rendering in parallel share the pages of
+the volume instead of loading their own copies. the derived volumes, such as a foreign model regridded to the
+eara2021 grid or a masked perturbation, are registered by a key and built by the first process asking for them.
+"""
+import hashlib
+import json
+import re
+from functools import cache
+from os import getpid, listdir, makedirs, remove, replace
+from os.path import isdir, isfile, join
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+import xarray as xr
+from eara2022 import resource
+from eara2022.instrument import profiled
+
+from .cache import file_fingerprint
+from .model_layout import ModelLayouts, is_converted, write_layouts
+
+# bump it when the layout of the registry files changes
+REGISTRY_VERSION = 1
+MODEL_FILES = {
+    "eara2021": ["model_files", "eara2021.nc"],
+    "eara2021_per_ref": ["model_files", "eara2021_per_ref.nc"],
+    "ref": ["model_files", "ref.nc"],
+    "fwea18": ["model_files", "fwea18.nc"],
+    "eara2014": ["model_files", "eara2014.nc"],
+    "glad_m25": ["model_files", "glad-m25-vs-0.0-n4.nc"],
+    "gap_p4": ["model_files", "GAP_P4_dvp.nc"],
+}
+
+
+def model_path(name: str) -> str:
+    if name not in MODEL_FILES:
+        raise Exception(
+            f"model {name} is not supported, should be one of {list(MODEL_FILES)}")
+    return resource(MODEL_FILES[name], normal_path=True)
+
+
+class ModelRegistry:
+    """The read-only model volumes as memory maps of the .npy files in registry_dir
+
+    Args:
+        registry_dir (Optional[str], optional): the directory of the volumes. Defaults to cache/models.
+    """
+
+    def __init__(self, registry_dir: Optional[str] = None) -> None:
+        if registry_dir is None:
+            registry_dir = resource(
+                ["cache", "models"], normal_path=True, check=False)
+        self.registry_dir = registry_dir
+        # the volumes attached by this process, by the file name
+        self._attached: Dict[str, xr.DataArray] = {}
+        self._layouts: Dict[str, ModelLayouts] = {}
+
+    def volume_name(self, key: str, files: Sequence[str]) -> str:
+        content = {"version": REGISTRY_VERSION, "key": key,
+                   "files": {path: file_fingerprint(path) for path in files}}
+        return f"{key}_{hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()[:16]}"
+
+    @profiled("model_registry.ModelRegistry.volume")
+    def volume(self, key: str, build: Callable[[], xr.DataArray], files: Sequence[str]) -> xr.DataArray:
+        """get the volume of key, build and write it if it is not in the registry
+
+        Args:
+            key (str): the key of the volume, such as fwea18_vs_iso
+            build (Callable[[], xr.DataArray]): build the volume, only called when it is not in the registry
+            files (Sequence[str]): the data files read by build, the volume is built again when they change
+
+        Returns:
+            xr.DataArray: the volume backed by a read-only memory map, copy it before writing to it
+        """
+        name = self.volume_name(key, files)
+        if name in self._attached:
+            return self._attached[name]
+        data_path = join(self.registry_dir, f"{name}.npy")
+        meta_path = join(self.registry_dir, f"{name}.json")
+        if not (isfile(data_path) and isfile(meta_path)):
+            self.write(build(), data_path, meta_path)
+            self.prune(key, name)
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        res = xr.DataArray(np.load(data_path, mmap_mode="r"), dims=meta["dims"],
+                           coords={dim: np.asarray(values) for dim, values in meta["coords"].items()}, name=meta["name"])
+        self._attached[name] = res
+        return res
+
+    def write(self, volume: xr.DataArray, data_path: str, meta_path: str) -> None:
+        makedirs(self.registry_dir, exist_ok=True)
+        # write to the temporary files first, so the other processes never attach a half written volume
+        tmp_suffix = f".{getpid()}.tmp"
+        with open(data_path+tmp_suffix, "wb") as f:
+            np.save(f, np.ascontiguousarray(volume.values))
+        meta = {"dims": list(volume.dims), "name": volume.name,
+                "coords": {dim: volume[dim].values.tolist() for dim in volume.dims if dim in volume.coords}}
+        with open(meta_path+tmp_suffix, "w") as f:
+            json.dump(meta, f)
+        replace(data_path+tmp_suffix, data_path)
+        replace(meta_path+tmp_suffix, meta_path)
+
+    def prune(self, key: str, keep: str) -> None:
+        """remove the files of key written from the older data files, the volumes are hundreds of MB each
+
+        Args:
+            key (str): the key of the volume or the layouts
+            keep (str): the name of the current files, as volume_name(key, files)
+        """
+        if not isdir(self.registry_dir):
+            return
+        # the name is the key and the 16 hex fingerprint, the files are .npy and .json, or the layouts
+        pattern = re.compile(
+            rf"^{re.escape(key)}_[0-9a-f]{{16}}\.(npy|json|profile\.npy|slice\.npy)$")
+        for each in listdir(self.registry_dir):
+            if pattern.match(each) and not each.startswith(f"{keep}."):
+                # the processes still attaching the old files keep their pages until they exit
+                try:
+                    remove(join(self.registry_dir, each))
+                except FileNotFoundError:
+                    # pruned by another process at the same time
+                    pass
+
+    @profiled("model_registry.ModelRegistry.layouts")
+    def layouts(self, key: str, build: Callable[[], xr.DataArray], files: Sequence[str]) -> ModelLayouts:
+        """get the volume of key in the profile and slice layouts, see utils.model_layout
+
+        Args:
+            key (str): the key of the volume, such as vpvs_vs_eara2022
+            build (Callable[[], xr.DataArray]): build the volume, only called when it is not in the registry
+            files (Sequence[str]): the data files read by build, the layouts are converted again when they change
+
+        Returns:
+            ModelLayouts: the read-only layouts, ModelLayouts.interp picks the layout for each access
+        """
+        name = self.volume_name(f"{key}_layouts", files)
+        if name in self._layouts:
+            return self._layouts[name]
+        prefix = join(self.registry_dir, name)
+        if not is_converted(prefix):
+            makedirs(self.registry_dir, exist_ok=True)
+            write_layouts(build(), prefix)
+            self.prune(f"{key}_layouts", name)
+        res = ModelLayouts(prefix)
+        self._layouts[name] = res
+        return res
+
+    def model_layouts(self, name: str, parameter: str) -> ModelLayouts:
+        """the parameter of a model file in MODEL_FILES in the two layouts
+
+        Returns:
+            ModelLayouts: the read-only layouts
+        """
+        path = model_path(name)
+
+        def build() -> xr.DataArray:
+            with xr.open_dataset(path) as dataset:
+                return dataset[parameter].load()
+        return self.layouts(f"{name}_{parameter}", build, [path])
+
+    def model(self, name: str, parameter: str) -> xr.DataArray:
+        """the parameter of a model file in MODEL_FILES, such as model("eara2021", "vs")
+
+        Returns:
+            xr.DataArray: the read-only volume
+        """
+        path = model_path(name)
+
+        def build() -> xr.DataArray:
+            with xr.open_dataset(path) as dataset:
+                return dataset[parameter].load()
+        return self.volume(f"{name}_{parameter}", build, [path])
+
+    def mask(self) -> np.ndarray:
+        """the mask of the eara2021 grid
+
+        Returns:
+            np.ndarray: the read-only mask
+        """
+        return np.load(resource(["model_files", "mask.npy"], normal_path=True), mmap_mode="r")
+
+
+@cache
+def get_model_registry() -> ModelRegistry:
+    """get the registry of this process, the volumes stay attached while the process lives
+
+    Returns:
+        ModelRegistry: the registry
+    """
+    return ModelRegistry()
+
+
+def convert_model_files() -> None:
+    # convert the 3D parameters of the models in MODEL_FILES to the two layouts ahead of the figures
+    registry = get_model_registry()
+    for name in MODEL_FILES:
+        path = resource(MODEL_FILES[name], normal_path=True, check=False)
+        if not isfile(path):
+            print(f"Skip {name}, {path} does not exist")
+            continue
+        with xr.open_dataset(path) as dataset:
+            parameters = [key for key, value in dataset.data_vars.items()
+                          if set(value.dims) == {"longitude", "latitude", "depth"}]
+        for parameter in parameters:
+            registry.model_layouts(name, parameter)
+            print(f"Converted {name} {parameter}")
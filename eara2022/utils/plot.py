@@ -1,7 +1,144 @@
+from numbers import Number
+from typing import Any, List, Optional
+
+import numpy as np
 import pygmt
+from eara2022 import gmt_path
+
+from . import generate_tmp_file
 
 
 def plot_place_holder(fig: pygmt.Figure) -> None:
     with pygmt.config(MAP_FRAME_PEN="0.5p,white"):
         fig.basemap(region=[110, 160, 10, 60],
                     projection="X0.04i", frame=["lbrt"])
+
+
+def multi_segment_file(segments: List[np.ndarray]) -> str:
+    """write the segments to a gmt multi-segment file, so they can be plotted in one call
+
+    Args:
+        segments (List[np.ndarray]): each segment is a (npts, ncols) array, such as x and y
+
+    Returns:
+        str: the tmp file path wrapped as gmt_path
+    """
+    content = []
+    for segment in segments:
+        content.append(">")
+        content.extend(" ".join(str(item) for item in row)
+                       for row in np.asarray(segment))
+    return gmt_path(generate_tmp_file("\n".join(content)+"\n", suffix=".txt"))
+
+
+def is_plain_option(value: Any) -> bool:
+    """if the option value can be compared by ==, such as a str, a number or a list of them
+
+    Args:
+        value (Any): the option value
+
+    Returns:
+        bool: if it is a plain option
+    """
+    if value is None or isinstance(value, (str, Number)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(each is None or isinstance(each, (str, Number)) for each in value)
+    return False
+
+
+class BatchedFigure:
+    """Wrap a pygmt.Figure, and merge the consecutive fig.text and fig.plot calls with the same options
+
+    The text calls with x, y and text are merged into one call with the x, y and text arrays. The plot calls
+    with a style are merged into one call with all the symbols, and the line plots are written into one
+    multi-segment file. Any other method flushes the buffered calls first, so the drawing order is kept.
+    The GMT defaults are read when the calls are flushed, so flush before changing pygmt.config.
+
+    Usage:
+        with BatchedFigure(fig) as batch:
+            batch.text(x=1, y=1, text="a", font="16p,Helvetica,red")
+            batch.text(x=2, y=2, text="b", font="16p,Helvetica,red")
+    """
+
+    def __init__(self, fig: pygmt.Figure) -> None:
+        self.fig = fig
+        # the buffered method name, the shared options and the (x, y, text) of each call
+        self._method: Optional[str] = None
+        self._options: dict = {}
+        self._records: list = []
+
+    def __enter__(self) -> "BatchedFigure":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        # the other figure methods, such as basemap and savefig
+        self.flush()
+        return getattr(self.fig, name)
+
+    def text(self, **kwargs) -> None:
+        if not self._mergeable(kwargs, ["x", "y", "text"], ["position", "textfiles"]):
+            self.flush()
+            self.fig.text(**kwargs)
+            return
+        texts = kwargs.pop("text")
+        if isinstance(texts, str):
+            texts = [texts]
+        self._buffer("text", kwargs, list(texts))
+
+    def plot(self, **kwargs) -> None:
+        if not self._mergeable(kwargs, ["x", "y"], ["data"]):
+            self.flush()
+            self.fig.plot(**kwargs)
+            return
+        self._buffer("plot", kwargs, None)
+
+    @staticmethod
+    def _mergeable(kwargs: dict, required: List[str], excluded: List[str]) -> bool:
+        # the options except the records should be plain, such as no direction or color arrays
+        return all(key in kwargs for key in required) and all(key not in kwargs for key in excluded) and \
+            all(is_plain_option(value)
+                for key, value in kwargs.items() if key not in required)
+
+    def _buffer(self, method: str, kwargs: dict, texts: Optional[List[str]]) -> None:
+        x, y = kwargs.pop("x"), kwargs.pop("y")
+        if method != self._method or kwargs != self._options:
+            self.flush()
+            self._method = method
+            self._options = kwargs
+        self._records.append((x, y, texts))
+
+    def flush(self) -> None:
+        """draw the buffered calls
+        """
+        method, options, records = self._method, self._options, self._records
+        self._method, self._options, self._records = None, {}, []
+        if len(records) == 0:
+            return
+        if len(records) == 1:
+            # the same call as without batching
+            x, y, texts = records[0]
+            if method == "text":
+                self.fig.text(x=x, y=y, text=texts[0] if len(
+                    texts) == 1 else texts, **options)
+            else:
+                self.fig.plot(x=x, y=y, **options)
+            return
+        if method == "text":
+            self.fig.text(x=np.concatenate([np.atleast_1d(each[0]) for each in records]),
+                          y=np.concatenate([np.atleast_1d(each[1])
+                                           for each in records]),
+                          text=[text for each in records for text in each[2]], **options)
+        elif "style" in options:
+            # the symbols are independent points
+            self.fig.plot(x=np.concatenate([np.atleast_1d(each[0]) for each in records]),
+                          y=np.concatenate([np.atleast_1d(each[1])
+                                           for each in records]),
+                          **options)
+        else:
+            # each line is a segment
+            self.fig.plot(data=multi_segment_file([np.column_stack((np.atleast_1d(each[0]), np.atleast_1d(each[1])))
+                                                   for each in records]), **options)
@@ -0,0 +1,313 @@
+"""
+profile_plan.py
+
+the plan stage of the vertical cross-section figures (slab, con and vol). the plan of a figure has the tracks, the
+topography, the projected earthquakes, the slab2 depths and the eara2021 sections of each line, and the figures
+only render it, see utils.figure_plan. the lines and the panel geometry are in the plan inputs, so the plans are
+computed again when they change.
+"""
+from functools import partial
+from os.path import isfile
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pygmt
+from eara2022 import resource
+
+from .eara2021_volumes import eara2021_layouts, eara2021_volume_files
+from .figure_plan import FigurePlan, compute_plans, map_panels, plan_key, plan_path
+from .model_layout import ModelLayouts
+from .project_ehb import project_ehb_catalog
+from .sampling import get_sampling_mode, plan_profile_sampling
+from .slab2 import SLAB_NAMES, get_slab2_index
+from .slice import extend_line, get_grid_sampler, gmt_lat_as_dist, gmt_lon_as_dist, model_interp, topo_interp
+
+# the plan code is in this module, the render code in the scripts does not change the plan keys
+PLAN_MODULES = [__name__, "eara2022.utils.eara2021_volumes"]
+# the inputs not depending on the model, the figures with the same ones share the lines, see render_profile_family
+MODEL_INPUTS = ("parameter", "ref")
+
+
+def profile_plan_inputs(conf: dict, lines: Sequence[tuple], abs_height: float, relief_registration: Optional[str] = None,
+                        slab2: bool = False) -> dict:
+    """the inputs of plan_profiles, only the configurations affecting the plan, the others are used in rendering
+
+    Args:
+        conf (dict): the configuration of the figure, with parameter, ref, length and x_fig
+        lines (Sequence[tuple]): the lines as (startlon, startlat, endlon, endlat, lat or lon)
+        abs_height (float): the height of the absolute panels in inch
+        relief_registration (Optional[str], optional): the registration of the earth relief grid of the topography.
+            Defaults to None.
+        slab2 (bool, optional): if sample the slab2 depths along the lines. Defaults to False.
+
+    Returns:
+        dict: the json serialisable inputs
+    """
+    return {
+        "parameter": conf["parameter"],
+        "ref": conf["ref"],
+        "length": conf["length"],
+        "x_fig": conf["x_fig"],
+        "abs_height": abs_height,
+        "lines": [list(line) for line in lines],
+        "relief_registration": relief_registration,
+        "slab2": slab2,
+        "sampling": get_sampling_mode(),
+    }
+
+
+def profile_plan_files(inputs: dict) -> List[str]:
+    # the data files read by plan_profiles
+    files = eara2021_volume_files() + [
+        resource(["isc_ehb", "catalog", "events.npy"], normal_path=True, check=False),
+        resource(["isc_ehb", "isc_ehb.csv"], normal_path=True, check=False),
+    ]
+    if inputs["slab2"]:
+        files += [resource(["slab2", f"{slab}_slab2_depth.grd"], normal_path=True, check=False)
+                  for slab in SLAB_NAMES]
+    return files
+
+
+def prepare_profile_volumes(inputs: dict) -> None:
+    # build the shared layouts before the workers computing the plans start
+    eara2021_layouts(inputs["parameter"], inputs["ref"])
+
+
+def profile_line_preparer(inputs: dict) -> Callable[[int], FigurePlan]:
+    """issue the GMT calls of the plan, the tracks, the relief grid and the earthquake projections, and return the
+    function preparing the other arrays of a line without GMT, so it can run in the threads
+
+    The lines do not depend on the model, so they are shared by the figures with the same inputs except the
+    parameter and the reference model, see render_profile_family.
+
+    Args:
+        inputs (dict): the output of profile_plan_inputs
+
+    Returns:
+        Callable[[int], FigurePlan]: the plan of the line idx without the model sections
+    """
+    length = inputs["length"]
+
+    def prepare_plot(idx: int) -> dict:
+        # * prepare plotting for each idx
+        startlon, startlat, endlon, endlat, thetype = inputs["lines"][idx]
+        start = (startlon, startlat)
+        end = (endlon, endlat)
+        endlon, endlat = extend_line(start, end, length)
+        if (thetype == "lat" and startlat > endlat) or (thetype == "lon" and startlon > endlon):
+            startlon, startlat, endlon, endlat = endlon, endlat, startlon, startlat
+        start = (startlon, startlat)
+        end = (endlon, endlat)
+        # * generate the plotting lons, lats for interp
+        # we should project along specific direction
+        points = pygmt.project(center=list(start), endpoint=list(end), generate=0.02)
+        # * the model cross sections are sampled by the panel pixels, see utils.sampling
+        per_plan = plan_profile_sampling(length, (0, 1000), inputs["x_fig"], 2.7, mode=inputs["sampling"])
+        abs_plan = plan_profile_sampling(length, (0, 100), inputs["x_fig"], inputs["abs_height"],
+                                         mode=inputs["sampling"])
+        if per_plan.track_spacing != 0.02:
+            model_points = pygmt.project(center=list(start), endpoint=list(end), generate=per_plan.track_spacing)
+        else:
+            model_points = points
+        return {
+            "start": start,
+            "end": end,
+            "type": thetype,
+            "lons": points.r,
+            "lats": points.s,
+            "model_lons": model_points.r,
+            "model_lats": model_points.s,
+            "deps": per_plan.depths,
+            "deps_abs": abs_plan.depths,
+        }
+
+    # prepare plotting
+    relief_kwargs = {} if inputs["relief_registration"] is None else {
+        "registration": inputs["relief_registration"]}
+    grd_topo = pygmt.datasets.load_earth_relief(resolution="02m", region=[83, 160, 10, 60], **relief_kwargs)
+
+    infos = [prepare_plot(idx) for idx in range(len(inputs["lines"]))]
+    ehb_catalogs = [project_ehb_catalog(info["start"], info["end"], width=100, degree_limit=length)
+                    for info in infos]
+    # the shared sampler and index are built before the threads
+    get_grid_sampler(grd_topo, "lon", "lat")
+    slab2_index = get_slab2_index() if inputs["slab2"] else None
+
+    def prepare_line(idx: int) -> FigurePlan:
+        info = infos[idx]
+        panel = FigurePlan()
+        panel.attrs["start"] = [float(each) for each in info["start"]]
+        panel.attrs["end"] = [float(each) for each in info["end"]]
+        panel.attrs["type"] = info["type"]
+        panel["lons"] = info["lons"]
+        panel["lats"] = info["lats"]
+        panel["h"] = np.linspace(0, length, len(info["lons"]))
+        # * the points of the model cross sections
+        panel["model_lons"] = info["model_lons"]
+        panel["model_lats"] = info["model_lats"]
+        panel["model_h"] = np.linspace(0, length, len(info["model_lons"]))
+        panel["deps"] = info["deps"]
+        panel["deps_abs"] = info["deps_abs"]
+        # * topography
+        grd_interp_result = topo_interp(grd_topo, info["lons"], info["lats"])
+        panel["topo_above"] = np.where(grd_interp_result < 0, 0, grd_interp_result)
+        panel["topo_below"] = np.where(grd_interp_result > 0, 0, grd_interp_result)
+        # * ehb catalog and slab 2.0 contour
+        panel["ehb_dist"] = ehb_catalogs[idx]["dist"].to_numpy()
+        panel["ehb_dep"] = ehb_catalogs[idx]["dep"].to_numpy()
+        if slab2_index is not None:
+            panel["slab2"] = slab2_index.query(info["lons"], info["lats"])
+        return panel
+
+    return prepare_line
+
+
+def model_section(volume: ModelLayouts, line: FigurePlan, abs_panel: bool) -> np.ndarray:
+    # the perturbation or absolute cross section along the line
+    deps = line["deps_abs"] if abs_panel else line["deps"]
+    return model_interp(volume, line["model_lons"], line["model_lats"], deps)
+
+
+def profile_panel_preparer(inputs: dict) -> Callable[[int], FigurePlan]:
+    """issue the GMT calls of the plan, and return the function preparing the arrays of a line without GMT, so it
+    can run in the threads
+
+    Args:
+        inputs (dict): the output of profile_plan_inputs
+
+    Returns:
+        Callable[[int], FigurePlan]: the plan of the line idx
+    """
+    prepare_line = profile_line_preparer(inputs)
+    eara, eara_abs = eara2021_layouts(inputs["parameter"], inputs["ref"])
+
+    def prepare_panel(idx: int) -> FigurePlan:
+        panel = prepare_line(idx)
+        panel["per"] = model_section(eara, panel, abs_panel=False)
+        panel["abs"] = model_section(eara_abs, panel, abs_panel=True)
+        return panel
+
+    return prepare_panel
+
+
+def plan_profiles(inputs: dict) -> FigurePlan:
+    """the plan of a cross-section figure, the sections, topography, earthquakes and slab2 depths of each line
+
+    Args:
+        inputs (dict): the output of profile_plan_inputs
+
+    Returns:
+        FigurePlan: the arrays of the line idx are in the panel idx
+    """
+    prepare_panel = profile_panel_preparer(inputs)
+    plan = FigurePlan()
+    for idx in range(len(inputs["lines"])):
+        plan.set_panel(idx, prepare_panel(idx))
+    return plan
+
+
+def annotate_panel(panel: FigurePlan) -> str:
+    # the custom axis file of the line, along the latitude or the longitude
+    start, end = tuple(panel.attrs["start"]), tuple(panel.attrs["end"])
+    if panel.attrs["type"] == "lat":
+        return gmt_lat_as_dist(start, end, a_interval=5, g_interval=1)
+    return gmt_lon_as_dist(start, end, a_interval=5, g_interval=1)
+
+
+def annotated_panel(prepare_panel: Callable[[int], FigurePlan], idx: int) -> Tuple[FigurePlan, str]:
+    panel = prepare_panel(idx)
+    return panel, annotate_panel(panel)
+
+
+def profile_plan_path(plan_func: Callable[[dict], FigurePlan], inputs: dict) -> str:
+    key = plan_key(plan_func, inputs, profile_plan_files(inputs), PLAN_MODULES)
+    return plan_path(plan_func, key)
+
+
+def profile_panels(plan_func: Callable[[dict], FigurePlan], inputs: dict,
+                   prepare: Optional[Callable[[int], Tuple[FigurePlan, str]]] = None) -> Iterator[Tuple[FigurePlan, str]]:
+    """the panels of a cross-section figure and their axis annotations, prepared in the threads while the earlier
+    panels are drawn
+
+    The plan is cached by its inputs, data files and plan code, re-styling only renders again.
+
+    Args:
+        plan_func (Callable[[dict], FigurePlan]): the plan function of the figure, calling plan_profiles
+        inputs (dict): the output of profile_plan_inputs
+        prepare (Optional[Callable[[int], Tuple[FigurePlan, str]]], optional): prepare the panel and the axis
+            annotation of the line idx if the plan is not cached. Defaults to profile_panel_preparer and
+            annotate_panel.
+
+    Yields:
+        Iterator[Tuple[FigurePlan, str]]: the plan and the axis annotation of each line
+    """
+    path = profile_plan_path(plan_func, inputs)
+    cached = isfile(path)
+    plan = FigurePlan.load(path) if cached else FigurePlan()
+    if cached:
+        prepare = partial(annotated_panel, plan.panel)
+    elif prepare is None:
+        prepare = partial(annotated_panel, profile_panel_preparer(inputs))
+    panels = map_panels(prepare, range(len(inputs["lines"])))
+    for idx, (panel, annote) in enumerate(panels):
+        if not cached:
+            plan.set_panel(idx, panel)
+        yield panel, annote
+    if not cached:
+        plan.save(path)
+
+
+def render_profile_family(plan_func: Callable[[dict], FigurePlan], confs: Sequence[dict], inputs_list: Sequence[dict],
+                          render: Callable[[dict, Iterable[Tuple[FigurePlan, str]]], None]) -> None:
+    """render several cross-section figures, such as the reference models and parameters, in one pass
+
+    The lines (tracks, axis annotations, topography, slab2 depths and earthquakes) are prepared once for the
+    figures with the same inputs except the parameter and the reference model, and the absolute sections once for
+    each parameter, so only the perturbation sections are prepared for each figure. The figures with the cached
+    plans are rendered from them.
+
+    Args:
+        plan_func (Callable[[dict], FigurePlan]): the plan function of the figures
+        confs (Sequence[dict]): the configurations of the figures
+        inputs_list (Sequence[dict]): the plan inputs of each figure
+        render (Callable[[dict, Iterable[Tuple[FigurePlan, str]]], None]): render a figure from its configuration
+            and panels
+    """
+    families: dict = {}
+    for conf, inputs in zip(confs, inputs_list):
+        if isfile(profile_plan_path(plan_func, inputs)):
+            render(conf, profile_panels(plan_func, inputs))
+            continue
+        geometry = {key: value for key, value in inputs.items() if key not in MODEL_INPUTS}
+        families.setdefault(repr(sorted(geometry.items())), []).append((conf, inputs))
+
+    for members in families.values():
+        indexes = range(len(members[0][1]["lines"]))
+        prepare_line = profile_line_preparer(members[0][1])
+        lines = list(map_panels(prepare_line, indexes))
+        annotes = list(map_panels(annotate_panel, lines))
+        abs_sections: dict = {}
+        for conf, inputs in members:
+            eara, eara_abs = eara2021_layouts(inputs["parameter"], inputs["ref"])
+            if inputs["parameter"] not in abs_sections:
+                abs_sections[inputs["parameter"]] = list(
+                    map_panels(partial(model_section, eara_abs, abs_panel=True), lines))
+            sections = abs_sections[inputs["parameter"]]
+
+            def prepare(idx: int, eara=eara, sections=sections):
+                # a copy of the shared line, as the panel adds its own sections
+                panel = FigurePlan(lines[idx].arrays, lines[idx].attrs)
+                panel["per"] = model_section(eara, lines[idx], abs_panel=False)
+                panel["abs"] = sections[idx]
+                return panel, annotes[idx]
+
+            render(conf, profile_panels(plan_func, inputs, prepare))
+
+
+def compute_profile_plans(plan_func: Callable[[dict], FigurePlan], inputs_list: Sequence[dict],
+                          max_workers: Optional[int] = None) -> List[FigurePlan]:
+    # * the missing plans of several figures are computed in worker processes, the figures of a plan function read
+    # the same data files
+    files = profile_plan_files(inputs_list[0]) if len(inputs_list) != 0 else []
+    return compute_plans(plan_func, inputs_list, files, max_workers=max_workers, prepare=prepare_profile_volumes,
+                         modules=PLAN_MODULES)
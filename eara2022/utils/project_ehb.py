@@ -4,21 +4,33 @@ project_ehb.py
 Project the EHB catalog to the given line using pygmt.project.
 """
 
-from typing import Tuple
+from typing import Optional, Tuple
 
 import pandas as pd
 from pygmt import project
 
 from eara2022 import resource
+from eara2022.instrument import profiled
 from obspy.geodetics.base import degrees2kilometers
 
-
-def project_ehb_catalog(start:Tuple[float,float],end:Tuple[float,float],width:float=100,degree_limit=25)->pd.DataFrame:
-    ehb_catalog=resource(['isc_ehb','isc_ehb.csv'],normal_path=True)
-    df=pd.read_csv(ehb_catalog)
-    # change column names from lat,lon,dep to y,x,z
-    df.columns=['y','x','z',"id"]
-    df=df.reindex(columns=['x','y','z',"id"])
+from .ehb_catalog import get_ehb_catalog
+
+
+@profiled()
+def project_ehb_catalog(start:Tuple[float,float],end:Tuple[float,float],width:float=100,degree_limit=25,ehb_catalog:Optional[str]=None)->pd.DataFrame:
+    binary_catalog=get_ehb_catalog() if ehb_catalog is None else None
+    if binary_catalog is not None:
+        # only the events in the cells near the line, from the ingested catalog
+        events=binary_catalog.swath(start,end,width,degree_limit)
+        df=pd.DataFrame({'x':events['lon'].astype(float),'y':events['lat'].astype(float),
+                         'z':events['dep'].astype(float),'id':events['id']})
+    else:
+        if ehb_catalog is None:
+            ehb_catalog=resource(['isc_ehb','isc_ehb.csv'],normal_path=True)
+        df=pd.read_csv(ehb_catalog)
+        # change column names from lat,lon,dep to y,x,z
+        df.columns=['y','x','z',"id"]
+        df=df.reindex(columns=['x','y','z',"id"])
 
     # project the catalog to the line
     res=project(
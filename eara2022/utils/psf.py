@@ -6,6 +6,7 @@ handle the point spread function related problems.
 import numpy as np
 import xarray as xr
 from numba import float64, guvectorize, njit, prange
+from eara2022.instrument import profiled
 
 from .cache import load_cache, save_cache
 
@@ -39,6 +40,7 @@ def get_per(per_array: np.ndarray, psf_list: np.ndarray, x_array: np.ndarray, y_
                                                                 ilat, idep]+psf_list[isrc, 4]*np.exp(-dist_sq)
 
 
+@profiled()
 def get_perturbation_array(psf_input: str, psf_output: str) -> np.ndarray:
     """get psf perturbation input model
 
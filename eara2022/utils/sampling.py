@@ -0,0 +1,94 @@
+"""
+sampling.py
+
+plan the sampling of the model cross sections from the panel size, the output dpi and the model grid spacing.
+the "native" mode keeps the original sampling (0.02 degree along the track and 1 km in depth), and the "auto"
+mode samples no finer than the panel pixels or a few samples per model grid cell.
+"""
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+SAMPLING_MODES = ("native", "auto")
+# the original sampling of the profile figures
+NATIVE_TRACK_SPACING = 0.02
+NATIVE_DEPTH_SPACING = 1.
+# the eara2021 model grid, 0.25 degree and 10 km
+MODEL_GRID_SPACING = 0.25
+MODEL_DEPTH_SPACING = 10.
+SAMPLING_DPI = 300
+# the samples in each model grid cell, the cross sections are linear between the grid nodes
+SAMPLES_PER_CELL = 4
+
+_sampling_mode = "native"
+
+
+def set_sampling_mode(mode: str) -> None:
+    """set the default mode of plan_profile_sampling
+
+    Args:
+        mode (str): "native" or "auto"
+
+    Raises:
+        Exception: unknown mode
+    """
+    global _sampling_mode
+    if mode not in SAMPLING_MODES:
+        raise Exception(
+            f"sampling mode {mode} is not supported, should be one of {SAMPLING_MODES}")
+    _sampling_mode = mode
+
+
+def get_sampling_mode() -> str:
+    return _sampling_mode
+
+
+class ProfilePlan(NamedTuple):
+    """the sampling of a cross section"""
+    # the track spacing in degree, as pygmt.project(generate=track_spacing)
+    track_spacing: float
+    depths: np.ndarray
+    # the number of samples relative to the native sampling
+    work_ratio: float
+
+
+def plan_profile_sampling(length: float, depth_range: Tuple[float, float], panel_width: float, panel_height: float,
+                          mode: str = None, dpi: int = SAMPLING_DPI, grid_spacing: float = MODEL_GRID_SPACING,
+                          depth_spacing: float = MODEL_DEPTH_SPACING) -> ProfilePlan:
+    """Plan the track spacing and the depths of a cross section
+
+    In the auto mode, the spacing is the larger one of a panel pixel and a SAMPLES_PER_CELL fraction of the
+    model grid spacing, but never finer than the native sampling.
+
+    Args:
+        length (float): the track length in degree
+        depth_range (Tuple[float, float]): the min and max depth in km
+        panel_width (float): the panel width in inch
+        panel_height (float): the panel height in inch
+        mode (str, optional): "native" or "auto". Defaults to the mode set by set_sampling_mode.
+        dpi (int, optional): the output dpi. Defaults to SAMPLING_DPI.
+        grid_spacing (float, optional): the model grid spacing in degree. Defaults to MODEL_GRID_SPACING.
+        depth_spacing (float, optional): the model depth spacing in km. Defaults to MODEL_DEPTH_SPACING.
+
+    Returns:
+        ProfilePlan: the sampling plan
+    """
+    if mode is None:
+        mode = _sampling_mode
+    if mode not in SAMPLING_MODES:
+        raise Exception(
+            f"sampling mode {mode} is not supported, should be one of {SAMPLING_MODES}")
+    depth_min, depth_max = depth_range
+    native_ndep = int(round((depth_max-depth_min)/NATIVE_DEPTH_SPACING))+1
+    if mode == "native":
+        return ProfilePlan(NATIVE_TRACK_SPACING, np.linspace(depth_min, depth_max, native_ndep), 1.)
+
+    track_spacing = max(length/(abs(panel_width)*dpi),
+                        grid_spacing/SAMPLES_PER_CELL, NATIVE_TRACK_SPACING)
+    depth_step = max((depth_max-depth_min)/(abs(panel_height)*dpi),
+                     depth_spacing/SAMPLES_PER_CELL, NATIVE_DEPTH_SPACING)
+    ndep = int(np.ceil((depth_max-depth_min)/depth_step))+1
+    # the same number of track points as pygmt.project
+    ratio = (length/track_spacing+1)*ndep / \
+        ((length/NATIVE_TRACK_SPACING+1)*native_ndep)
+    return ProfilePlan(track_spacing, np.linspace(depth_min, depth_max, ndep), ratio)
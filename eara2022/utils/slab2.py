@@ -0,0 +1,235 @@
+"""
+slab2.py
+
+load the Slab2 interface grids once, sample the slab depths along tracks, and cache the slab depth contours.
+"""
+from functools import cache
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+import pygmt
+import xarray as xr
+from eara2022 import gmt_path, resource
+from eara2022.instrument import profiled
+from pygmt.clib import Session
+
+from . import generate_tmp_file
+from .cache import file_fingerprint, load_cache, save_cache
+from .plot import multi_segment_file
+from .slice import GridSampler
+
+SLAB_NAMES = ("izu", "kur", "phi", "ryu", "man")
+
+
+def clip_valid_bbox(x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Clip a gmt format grid (z in the shape of (len(y), len(x))) to the bounding box of its non-NaN values
+
+    Args:
+        x (np.ndarray): the x (longitude) axis
+        y (np.ndarray): the y (latitude) axis
+        z (np.ndarray): the grid values
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: the clipped x, y and z
+    """
+    valid = ~np.isnan(z)
+    valid_rows = np.flatnonzero(valid.any(axis=1))
+    valid_cols = np.flatnonzero(valid.any(axis=0))
+    if len(valid_rows) == 0:
+        # keep the whole grid, every query will return NaN
+        return x, y, z
+    # keep one more node on each side, so the interpolation near the edge is the same as the full grid
+    row_start, row_end = max(valid_rows[0]-1, 0), min(valid_rows[-1]+2, len(y))
+    col_start, col_end = max(valid_cols[0]-1, 0), min(valid_cols[-1]+2, len(x))
+    return x[col_start:col_end], y[row_start:row_end], z[row_start:row_end, col_start:col_end]
+
+
+class Slab2Index:
+    """The Slab2 interface depths for several slabs, loaded and clipped once
+
+    Each slab grid is clipped to the bounding box of its valid values, and the interpolator is built only once,
+    so the same index can answer the queries for all the panels (and figures) in one run.
+    """
+
+    @profiled("slab2.Slab2Index.load")
+    def __init__(self, slabs: Sequence[str] = SLAB_NAMES) -> None:
+        """load the Slab2 depth grids
+
+        Args:
+            slabs (Sequence[str], optional): the slab names, as {slab}_slab2_depth.grd. Defaults to SLAB_NAMES.
+        """
+        self.slabs: List[str] = list(slabs)
+        self.bbox: Dict[str, Tuple[float, float, float, float]] = {}
+        self.samplers: Dict[str, GridSampler] = {}
+        for slab in self.slabs:
+            with xr.open_dataset(resource(["slab2", f"{slab}_slab2_depth.grd"], normal_path=True)) as slab_model:
+                x, y, z = clip_valid_bbox(
+                    slab_model.x.data, slab_model.y.data, slab_model.z.data)
+            # the depth is positive downward
+            self.bbox[slab] = (x.min(), x.max(), y.min(), y.max())
+            self.samplers[slab] = GridSampler(
+                x, y, z, negate=True, bounds_error=False)
+
+    @profiled("slab2.Slab2Index.query")
+    def query(self, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        """get the depths of all the slab interfaces along the (lons,lats) track
+
+        Args:
+            lons (np.ndarray): the lons track
+            lats (np.ndarray): the lats track
+
+        Returns:
+            np.ndarray: the depth tracks in the shape of (len(slabs), len(lons)), NaN where no slab exists
+        """
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        res = np.full((len(self.slabs), len(lons)), np.nan)
+        for islab, slab in enumerate(self.slabs):
+            lon_min, lon_max, lat_min, lat_max = self.bbox[slab]
+            inside = (lons >= lon_min) & (lons <= lon_max) & (
+                lats >= lat_min) & (lats <= lat_max)
+            if inside.any():
+                res[islab, inside] = self.samplers[slab](
+                    lons[inside], lats[inside])
+        return res
+
+    def query_slab(self, slab: str, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        """get the depth of one slab interface along the (lons,lats) track
+
+        Args:
+            slab (str): the slab name
+            lons (np.ndarray): the lons track
+            lats (np.ndarray): the lats track
+
+        Returns:
+            np.ndarray: the depth track
+        """
+        return self.query(lons, lats)[self.slabs.index(slab)]
+
+    def query_tracks(self, tracks: Sequence[Tuple[np.ndarray, np.ndarray]]) -> List[np.ndarray]:
+        """query several tracks in one batch
+
+        Args:
+            tracks (Sequence[Tuple[np.ndarray, np.ndarray]]): a list of (lons,lats) tracks
+
+        Returns:
+            List[np.ndarray]: the depth tracks for each input track, each in the shape of (len(slabs), len(lons))
+        """
+        if len(tracks) == 0:
+            return []
+        lons = np.concatenate([np.asarray(each[0], dtype=float)
+                              for each in tracks])
+        lats = np.concatenate([np.asarray(each[1], dtype=float)
+                              for each in tracks])
+        res = self.query(lons, lats)
+        splits = np.cumsum([len(each[0]) for each in tracks])[:-1]
+        return np.split(res, splits, axis=1)
+
+
+@cache
+def get_slab2_index(slabs: Tuple[str, ...] = SLAB_NAMES) -> Slab2Index:
+    """get the shared Slab2Index, the grids are only loaded in the first call
+
+    Args:
+        slabs (Tuple[str, ...], optional): the slab names. Defaults to SLAB_NAMES.
+
+    Returns:
+        Slab2Index: the loaded index
+    """
+    return Slab2Index(slabs)
+
+
+def level_cache_key(level: Union[int, str]) -> str:
+    """convert the gmt contour level, such as 100 or +-200, to a name safe for the cache file
+
+    Args:
+        level (Union[int, str]): the gmt -C argument
+
+    Returns:
+        str: the cache key
+    """
+    return str(level).replace("+", "p").replace("-", "m")
+
+
+@profiled()
+def slab_contour_lines(slab: str, level: Union[int, str]) -> np.ndarray:
+    """Get the contour lines of a slab interface, computed by gmt grdcontour only once and cached on disk
+
+    Args:
+        slab (str): the slab name
+        level (Union[int, str]): the gmt -C argument, such as 100 for every 100 km, or +-200 for a single contour
+
+    Returns:
+        np.ndarray: (N,3) array of x, y and the segment index
+    """
+    grid_path = resource(["slab2", f"{slab}_slab2_depth.grd"], normal_path=True)
+    # the fingerprint of the grid is in the name, so an updated grid is contoured again
+    cache_name = f"slab2_contour_{slab}_{level_cache_key(level)}_{file_fingerprint(grid_path)}"
+    loaded = load_cache(cache_name)
+    if loaded is not None:
+        return loaded
+    # * no cache
+    # dump the contours as line segments, no plotting takes place
+    dump_path = generate_tmp_file(suffix=".txt")
+    with Session() as lib:
+        lib.call_module(
+            "grdcontour", f'{gmt_path(grid_path)} -C{level} -D{gmt_path(dump_path)}')
+
+    segments = []
+    current = []
+    with open(dump_path, "r") as f:
+        for each_line in f:
+            if each_line.startswith(">"):
+                if len(current) != 0:
+                    segments.append(current)
+                current = []
+            elif each_line.strip() != "" and not each_line.startswith("#"):
+                current.append([float(item)
+                               for item in each_line.split()[:2]])
+    if len(current) != 0:
+        segments.append(current)
+
+    lines = np.zeros((0, 3))
+    if len(segments) != 0:
+        lines = np.concatenate([np.column_stack((np.array(each), np.full(len(each), iseg)))
+                                for iseg, each in enumerate(segments)])
+    save_cache(file_name=cache_name, content=lines)
+    return lines
+
+
+@cache
+def slab_contour_file(slabs: Tuple[str, ...], level: str) -> str:
+    """write the cached contour lines of several slabs to one multi-segment file
+
+    Args:
+        slabs (Tuple[str, ...]): the slab names
+        level (str): the gmt -C argument
+
+    Returns:
+        str: the multi-segment file path wrapped as gmt_path, or an empty string if there is no contour
+    """
+    segments = []
+    for slab in slabs:
+        lines = slab_contour_lines(slab, level)
+        if len(lines) == 0:
+            continue
+        # the segment indexes are contiguous, so split at the first row of each segment
+        _, starts = np.unique(lines[:, 2], return_index=True)
+        segments.extend(np.split(lines[:, :2], np.sort(starts)[1:]))
+    if len(segments) == 0:
+        return ""
+    return multi_segment_file(segments)
+
+
+def plot_slab_contours(fig: pygmt.Figure, level: Union[int, str], pen: str, slabs: Sequence[str] = SLAB_NAMES) -> None:
+    """plot the slab depth contours in one fig.plot call, replacing grdcontour for each slab
+
+    Args:
+        fig (pygmt.Figure): the figure to plot
+        level (Union[int, str]): the gmt -C argument, the same as interval in grdcontour
+        pen (str): the pen of the contours
+        slabs (Sequence[str], optional): the slab names. Defaults to SLAB_NAMES.
+    """
+    contour_file = slab_contour_file(tuple(slabs), str(level))
+    if contour_file != "":
+        fig.plot(data=contour_file, pen=pen)
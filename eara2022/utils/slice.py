@@ -3,7 +3,8 @@ slice.py
 
 helper functions in cuting cross-sections, make projections.
 """
-from typing import List, Tuple
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 import pyproj
@@ -12,16 +13,111 @@ from obspy.geodetics import locations2degrees
 from obspy.geodetics.base import degrees2kilometers
 from scipy.interpolate import RegularGridInterpolator
 from scipy.spatial import KDTree
+from eara2022.instrument import profiled
 
 from . import generate_tmp_file
+from .model_layout import ModelLayouts
 
 
-def model_interp(to_interp_data: xr.DataArray, lons: np.ndarray, lats: np.ndarray, deps: np.ndarray) -> np.ndarray:
+# * the cached samplers, keyed by the id of the source grid, the source is kept to make the id stable
+GRID_SAMPLER_CACHE_SIZE = 16
+_grid_sampler_cache: "OrderedDict[tuple, Tuple[object, GridSampler]]" = OrderedDict()
+
+
+@profiled()
+def track_points(lons: np.ndarray, lats: np.ndarray, deps: Optional[np.ndarray] = None) -> np.ndarray:
+    """Build the interpolation points along a (lons,lats) track, optionally for each depth
+
+    Args:
+        lons (np.ndarray): the longitude array
+        lats (np.ndarray): the latitude array, define a line with lons on the plane
+        deps (Optional[np.ndarray], optional): the depth array. Defaults to None.
+
+    Returns:
+        np.ndarray: (len(lons),2) points, or (len(deps)*len(lons),3) points ordered as depth first
+    """
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    if deps is None:
+        return np.column_stack((lons, lats))
+    deps = np.asarray(deps, dtype=float)
+    return np.column_stack((
+        np.tile(lons, len(deps)),
+        np.tile(lats, len(deps)),
+        np.repeat(deps, len(lons)),
+    ))
+
+
+class GridSampler:
+    """Sample a 2D grid in the gmt format (values in the shape of (len(y), len(x))) at scattered points
+
+    The transposed (and optionally negated) grid and the interpolator are built only once.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, z: np.ndarray, negate: bool = False, bounds_error: bool = True) -> None:
+        """build the sampler
+
+        Args:
+            x (np.ndarray): the x (longitude) axis
+            y (np.ndarray): the y (latitude) axis
+            z (np.ndarray): the grid values in the shape of (len(y), len(x))
+            negate (bool, optional): if return the negated values, such as the slab depth. Defaults to False.
+            bounds_error (bool, optional): if raise for points outside the grid, otherwise return NaN. Defaults to True.
+        """
+        values = np.ascontiguousarray(z.T, dtype=float)
+        if negate:
+            np.negative(values, out=values)
+        self.interpolator = RegularGridInterpolator(
+            (np.asarray(x), np.asarray(y)), values, bounds_error=bounds_error)
+
+    def __call__(self, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        """sample the grid along the (lons,lats) track
+
+        Args:
+            lons (np.ndarray): the longitude array
+            lats (np.ndarray): the latitude array
+
+        Returns:
+            np.ndarray: the sampled 1d array
+        """
+        return self.interpolator(track_points(lons, lats))
+
+
+def get_grid_sampler(to_interp_data: Union[xr.DataArray, xr.Dataset], x_name: str, y_name: str, z_name: Optional[str] = None, negate: bool = False, bounds_error: bool = True) -> GridSampler:
+    """Get the cached GridSampler for a loaded grid, the grid should not be modified in place after the first call
+
+    Args:
+        to_interp_data (Union[xr.DataArray, xr.Dataset]): the loaded grid
+        x_name (str): the name of the x coordinate
+        y_name (str): the name of the y coordinate
+        z_name (Optional[str], optional): the variable name if to_interp_data is a dataset. Defaults to None.
+        negate (bool, optional): if return the negated values. Defaults to False.
+        bounds_error (bool, optional): if raise for points outside the grid. Defaults to True.
+
+    Returns:
+        GridSampler: the sampler
+    """
+    key = (id(to_interp_data), x_name, y_name, z_name, negate, bounds_error)
+    if key in _grid_sampler_cache:
+        _grid_sampler_cache.move_to_end(key)
+        return _grid_sampler_cache[key][1]
+    z = to_interp_data[z_name] if z_name is not None else to_interp_data
+    sampler = GridSampler(to_interp_data[x_name].data, to_interp_data[y_name].data,
+                          z.data, negate=negate, bounds_error=bounds_error)
+    _grid_sampler_cache[key] = (to_interp_data, sampler)
+    if len(_grid_sampler_cache) > GRID_SAMPLER_CACHE_SIZE:
+        _grid_sampler_cache.popitem(last=False)
+    return sampler
+
+
+@profiled()
+def model_interp(to_interp_data: Union[xr.DataArray, ModelLayouts], lons: np.ndarray, lats: np.ndarray, deps: np.ndarray) -> np.ndarray:
     """Give an xarray model, interp it based on the given lats, lons, deps and construct a new xarray dataset.
     mainly used to generate the vertical cross-sections
 
     Args:
-        to_interp_data (xr.DataArray): the data array to interp
+        to_interp_data (Union[xr.DataArray, ModelLayouts]): the data array to interp, or the model in the profile
+            and slice layouts, which reads only the layout suiting the points
         lons (np.ndarray): the longitude array
         lats (np.ndarray): the latitude array, define a line with lons on the plane
         deps (np.ndarray): the depth array
@@ -30,24 +126,19 @@ def model_interp(to_interp_data: xr.DataArray, lons: np.ndarray, lats: np.ndarra
         np.ndarray: the interp result
     """
     # * len(lons) should be the same as len(lats)
-    profile_list = []
-    for idep in range(len(deps)):
-        for ilon in range(len(lons)):
-            profile_list.append([lons[ilon], lats[ilon], deps[idep]])
+    if isinstance(to_interp_data, ModelLayouts):
+        return to_interp_data.interp(lons, lats, deps)
     model_interpolating_function = RegularGridInterpolator(
         (to_interp_data.longitude.data, to_interp_data.latitude.data, to_interp_data.depth.data), to_interp_data.data)
-    interp_result: np.ndarray = model_interpolating_function(profile_list)
-    cross_section = np.zeros((len(lons), len(deps)))
-
-    icount = 0
-    for idep in range(len(deps)):
-        for ilon in range(len(lons)):
-            cross_section[ilon, idep] = interp_result[icount]
-            icount += 1
+    interp_result: np.ndarray = model_interpolating_function(
+        track_points(lons, lats, deps))
+    # the points are ordered as depth first
+    cross_section = interp_result.reshape(len(deps), len(lons)).T
 
     return cross_section
 
 
+@profiled()
 def topo_interp(to_interp_data: xr.DataArray, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
     """Give the xarray topography model, interp the elevation line along the given (lons,lats) pair. 
 
@@ -59,43 +150,34 @@ def topo_interp(to_interp_data: xr.DataArray, lons: np.ndarray, lats: np.ndarray
     Returns:
         np.ndarray: the interp topo result
     """
-    profile_list = []
-    for ilon in range(len(lons)):
-        profile_list.append([lons[ilon], lats[ilon]])
     # the names and the transverse might be adjusted, this is the gmt format
-    grd_interpolating_function = RegularGridInterpolator(
-        (to_interp_data.lon.data, to_interp_data.lat.data), to_interp_data.data.T)
-
-    grd_interp_result = grd_interpolating_function(profile_list)
+    grd_interpolating_function = get_grid_sampler(to_interp_data, "lon", "lat")
 
     # * return the 1d array
-    return grd_interp_result
+    return grd_interpolating_function(lons, lats)
 
 
-def slab_interp(to_interp_data: xr.DataArray, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+@profiled()
+def slab_interp(to_interp_data: xr.Dataset, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
     """generate the depth of the slab interface along a (lons,lats) track
 
     Args:
-        to_interp_data (xr.DataArray): the loaded slab interface
+        to_interp_data (xr.Dataset): the loaded slab interface
         lons (np.ndarray): the lons track
         lats (np.ndarray): the lats track
 
     Returns:
         np.ndarray: the depth track
     """
-    profile_list = []
-    for ilon in range(len(lons)):
-        profile_list.append([lons[ilon], lats[ilon]])
     # the names and the transverse might be adjusted, this is the gmt format
-    grd_interpolating_function = RegularGridInterpolator(
-        (to_interp_data.x.data, to_interp_data.y.data), -to_interp_data.z.data.T, bounds_error=False)
-
-    grd_interp_result = grd_interpolating_function(profile_list)
+    grd_interpolating_function = get_grid_sampler(
+        to_interp_data, "x", "y", "z", negate=True, bounds_error=False)
 
     # * return the 1d array
-    return grd_interp_result
+    return grd_interpolating_function(lons, lats)
 
 
+@profiled()
 def gmt_lat_as_dist(start: Tuple[float, float], end: Tuple[float, float], a_interval: float, g_interval: float, npts: int = 1001) -> str:
     """Generate a lebel tmp file for pxc[file name], so we can have evenly sampled ticks in great circle represented as lat/lon
 
@@ -171,6 +253,7 @@ def gmt_lat_as_dist(start: Tuple[float, float], end: Tuple[float, float], a_inte
     return tmp
 
 
+@profiled()
 def gmt_lon_as_dist(start: Tuple[float, float], end: Tuple[float, float], a_interval: float, g_interval: float, npts: int = 1001) -> str:
     """Generate a lebel tmp file for pxc[file name], so we can have evenly sampled ticks in great circle represented as lat/lon
 
@@ -246,6 +329,7 @@ def gmt_lon_as_dist(start: Tuple[float, float], end: Tuple[float, float], a_inte
     return tmp
 
 
+@profiled()
 def extend_line(start: Tuple[float, float], end: Tuple[float, float], length: float) -> Tuple[float, float]:
     """Extend the current line to the specified length
 
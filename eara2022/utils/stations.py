@@ -0,0 +1,161 @@
+"""
+stations.py
+
+load the station list (stations/STATIONS_filtered) once into arrays, with the lookup by the station name
+and the vectorised region and network filters.
+"""
+from functools import cache
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from eara2022 import resource
+from eara2022.instrument import profiled
+
+STATION_DTYPE = np.dtype([("network", "U8"), ("station", "U8"), ("lat", "f8"),
+                         ("lon", "f8"), ("code", "i4")])
+
+
+def parse_station_line(line: str) -> Optional[tuple]:
+    """parse a line of lon, lat, the colour code and the station name
+
+    The name is the trailing text, either as NET.STA or as NET STA, and empty if there is no trailing text.
+
+    Args:
+        line (str): the line in the station file
+
+    Returns:
+        Optional[tuple]: the row in STATION_DTYPE, None for the comments and the segment headers
+    """
+    items = line.split()
+    if len(items) < 3 or items[0].startswith("#") or items[0].startswith(">"):
+        return None
+    lon, lat, code = float(items[0]), float(items[1]), int(float(items[2]))
+    names = items[3:]
+    if len(names) == 1 and "." in names[0]:
+        network, station = names[0].split(".", 1)
+    elif len(names) >= 2:
+        network, station = names[0], names[1]
+    else:
+        network, station = "", ""
+    return (network, station, lat, lon, code)
+
+
+class StationIndex:
+    """The stations as a structured array of network, station, lat, lon and the colour code in the cpt
+    """
+
+    def __init__(self, stations: np.ndarray) -> None:
+        self.stations = stations
+        # NET.STA -> row, the first row is used for the duplicated names
+        self._rows: Dict[str, int] = {}
+        for irow, (network, station) in enumerate(zip(stations["network"], stations["station"])):
+            if station != "":
+                self._rows.setdefault(f"{network}.{station}", irow)
+
+    @classmethod
+    def from_file(cls, station_path: str) -> "StationIndex":
+        rows = []
+        with open(station_path, "r") as f:
+            for each_line in f:
+                row = parse_station_line(each_line)
+                if row is not None:
+                    rows.append(row)
+        return cls(np.array(rows, dtype=STATION_DTYPE))
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._rows
+
+    @property
+    def has_names(self) -> bool:
+        return len(self._rows) > 0
+
+    @property
+    def lons(self) -> np.ndarray:
+        return self.stations["lon"]
+
+    @property
+    def lats(self) -> np.ndarray:
+        return self.stations["lat"]
+
+    @property
+    def codes(self) -> np.ndarray:
+        return self.stations["code"]
+
+    def lookup(self, name: str) -> np.void:
+        """the row of the station
+
+        Args:
+            name (str): the station name as NET.STA
+
+        Raises:
+            KeyError: the station is not in the index
+
+        Returns:
+            np.void: the row in STATION_DTYPE
+        """
+        if name not in self._rows:
+            raise KeyError(f"no station {name} in the station list")
+        return self.stations[self._rows[name]]
+
+    def position(self, name: str) -> Tuple[float, float]:
+        """the (lon, lat) of the station
+
+        Args:
+            name (str): the station name as NET.STA
+
+        Raises:
+            KeyError: the station is not in the index
+
+        Returns:
+            Tuple[float, float]: lon and lat
+        """
+        row = self.lookup(name)
+        return float(row["lon"]), float(row["lat"])
+
+    def region(self, lon_min: float, lon_max: float, lat_min: float, lat_max: float) -> "StationIndex":
+        """the stations inside the region, the bounds are included
+
+        Returns:
+            StationIndex: the filtered index
+        """
+        lons, lats = self.lons, self.lats
+        return StationIndex(self.stations[(lons >= lon_min) & (lons <= lon_max) & (lats >= lat_min) & (lats <= lat_max)])
+
+    def networks(self, networks: Sequence[str]) -> "StationIndex":
+        """the stations in the networks
+
+        Args:
+            networks (Sequence[str]): the network codes
+
+        Returns:
+            StationIndex: the filtered index
+        """
+        return StationIndex(self.stations[np.isin(self.stations["network"], list(networks))])
+
+
+@cache
+@profiled()
+def get_station_index(station_path: Optional[str] = None, require_names: bool = False) -> StationIndex:
+    """get the shared station index, the station list is only read in the first call
+
+    Args:
+        station_path (Optional[str], optional): the station list. Defaults to stations/STATIONS_filtered.
+        require_names (bool, optional): if the stations are looked up by name. Defaults to False.
+
+    Raises:
+        Exception: require_names is set and no line in the station list has a station name
+
+    Returns:
+        StationIndex: the index
+    """
+    if station_path is None:
+        station_path = resource(
+            ["stations", "STATIONS_filtered"], normal_path=True)
+    index = StationIndex.from_file(station_path)
+    if require_names and not index.has_names:
+        raise Exception(
+            f"no station names in {station_path}, the lookup by name needs the trailing NET.STA or NET STA column")
+    return index
@@ -0,0 +1,249 @@
+"""
+tables.py
+
+flatten the traveltime and window pickles into sorted, memory-mappable npy tables.
+the point lookups are binary searches on the key column, so the tables are never fully deserialized,
+and seisflow is only needed when converting the window pickles. the fingerprints of the source pickles are
+recorded next to each table, so a table is only used for the pickles it was converted from.
+"""
+import json
+from functools import cache
+from glob import glob
+from os import remove, replace
+from os.path import basename, isfile, join, splitext
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from eara2022.instrument import profiled
+
+from .cache import file_fingerprint
+from .load_files import load_pickle
+
+
+def table_key(*items: str) -> bytes:
+    """the sort key of a row, such as event|station|phase
+
+    Returns:
+        bytes: the key
+    """
+    return "|".join(items).encode()
+
+
+def table_sources_path(path: str) -> str:
+    """the json next to the table with the fingerprints of its source pickles
+
+    Args:
+        path (str): the .npy path
+
+    Returns:
+        str: the .sources.json path
+    """
+    return f"{splitext(path)[0]}.sources.json"
+
+
+def save_sorted_table(path: str, keys: List[bytes], columns: dict, sources: Iterable[str] = ()) -> None:
+    """save the rows sorted by the key, the order of the rows with the same key is kept
+
+    The table and the fingerprints are written to temporary files and moved into place, the old
+    fingerprints are removed first, so a table interrupted while writing is never used.
+
+    Args:
+        path (str): the .npy path
+        keys (List[bytes]): the key of each row
+        columns (dict): the other columns, name -> (numpy dtype, values)
+        sources (Iterable[str], optional): the source pickles of the table. Defaults to ().
+    """
+    width = max([len(each) for each in keys], default=1)
+    table = np.zeros(len(keys), dtype=[("key", f"S{width}")] +
+                     [(name, dtype) for name, (dtype, _) in columns.items()])
+    table["key"] = keys
+    for name, (_, values) in columns.items():
+        table[name] = values
+    table = table[np.argsort(table["key"], kind="stable")]
+    sources_path = table_sources_path(path)
+    if isfile(sources_path):
+        remove(sources_path)
+    with open(f"{path}.tmp", "wb") as f:
+        np.save(f, table)
+    replace(f"{path}.tmp", path)
+    with open(f"{sources_path}.tmp", "w") as f:
+        json.dump({each: file_fingerprint(each)
+                  for each in sources}, f, indent=2, sort_keys=True)
+    replace(f"{sources_path}.tmp", sources_path)
+
+
+@profiled()
+def convert_traveltimes(data_info_dir: str, phases: Iterable[str], output_path: str) -> None:
+    """Convert the traveltime.{phase}.pkl dicts ([event][station] -> time) to one table keyed by event|station|phase
+
+    Args:
+        data_info_dir (str): the directory of the traveltime pickles
+        phases (Iterable[str]): the phases to convert
+        output_path (str): the output .npy path
+    """
+    keys = []
+    times = []
+    sources = []
+    for phase in phases:
+        traveltime_path = join(data_info_dir, f"traveltime.{phase}.pkl")
+        sources.append(traveltime_path)
+        traveltimes: dict = load_pickle(traveltime_path)
+        for event, stations in traveltimes.items():
+            for station, value in stations.items():
+                keys.append(table_key(event, station, phase))
+                times.append(np.nan if value is None else float(value))
+    save_sorted_table(output_path, keys, {
+                      "time": ("f8", times)}, sources=sources)
+
+
+@profiled()
+def convert_windows(window_dir: str, output_path: str) -> None:
+    """Convert the windows/{event}.pkl files to one table of (event|station, category, left, right, cc)
+
+    left and right are the timestamps in seconds, as UTCDateTime.timestamp. A category without windows is
+    kept as one row of NaN, so the table knows the station and the category as the pickle does.
+
+    Args:
+        window_dir (str): the directory of the window pickles
+        output_path (str): the output .npy path
+    """
+    keys = []
+    categories = []
+    lefts = []
+    rights = []
+    ccs = []
+    window_paths = sorted(glob(join(window_dir, "*.pkl")))
+    for window_path in window_paths:
+        event = basename(window_path)[:-len(".pkl")]
+        # loading the window pickles needs seisflow
+        windows: dict = load_pickle(window_path)
+        for station, station_windows in windows.items():
+            for category, category_windows in station_windows.items():
+                for each_win in category_windows.windows:
+                    keys.append(table_key(event, station))
+                    categories.append(category.encode())
+                    lefts.append(each_win.left.timestamp)
+                    rights.append(each_win.right.timestamp)
+                    ccs.append(each_win.cc)
+                if len(category_windows.windows) == 0:
+                    keys.append(table_key(event, station))
+                    categories.append(category.encode())
+                    lefts.append(np.nan)
+                    rights.append(np.nan)
+                    ccs.append(np.nan)
+    width = max([len(each) for each in categories], default=1)
+    save_sorted_table(output_path, keys, {
+        "category": (f"S{width}", categories),
+        "left": ("f8", lefts),
+        "right": ("f8", rights),
+        "cc": ("f8", ccs),
+    }, sources=window_paths)
+
+
+class SortedTable:
+    """A table saved by save_sorted_table, memory mapped on the first lookup
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._table: Optional[np.ndarray] = None
+        self._sources: Optional[Dict[str, str]] = None
+
+    @property
+    def table(self) -> np.ndarray:
+        if self._table is None:
+            self._table = np.load(self.path, mmap_mode="r")
+        return self._table
+
+    @property
+    def sources(self) -> Dict[str, str]:
+        """the fingerprints of the source pickles when the table was converted, empty for the old tables
+        """
+        if self._sources is None:
+            sources_path = table_sources_path(self.path)
+            self._sources = {}
+            if isfile(sources_path):
+                with open(sources_path, "r") as f:
+                    self._sources = json.load(f)
+        return self._sources
+
+    def is_current(self, source_paths: Iterable[str]) -> bool:
+        """if the table exists and is converted from the current version of the source pickles
+
+        Args:
+            source_paths (Iterable[str]): the pickles needed by the lookup, such as the window pickle of the event
+
+        Returns:
+            bool: False if any pickle is new, changed or removed since the conversion
+        """
+        return isfile(self.path) and all(isfile(each) and self.sources.get(each) == file_fingerprint(each) for each in source_paths)
+
+    def rows(self, *items: str) -> np.ndarray:
+        """all the rows with the key, found by binary search
+
+        Returns:
+            np.ndarray: the rows, might be empty
+        """
+        key = table_key(*items)
+        keys = self.table["key"]
+        start = np.searchsorted(keys, key, side="left")
+        end = np.searchsorted(keys, key, side="right")
+        return self.table[start:end]
+
+
+class TraveltimeTable(SortedTable):
+    def traveltime(self, event: str, station: str, phase: str) -> float:
+        """the traveltime of the phase
+
+        Args:
+            event (str): the gcmt id
+            station (str): the station as NET.STA
+            phase (str): the phase name
+
+        Raises:
+            KeyError: no traveltime for the event, station and phase
+
+        Returns:
+            float: the traveltime
+        """
+        rows = self.rows(event, station, phase)
+        if len(rows) == 0:
+            raise KeyError(f"no {phase} traveltime for {event} {station}")
+        return float(rows["time"][0])
+
+
+class WindowTable(SortedTable):
+    def windows(self, event: str, station: str, category: Optional[str] = None) -> np.ndarray:
+        """the windows of the station, in the order of the pickle
+
+        Args:
+            event (str): the gcmt id
+            station (str): the station as NET.STA
+            category (Optional[str], optional): only return this category if given. Defaults to None.
+
+        Raises:
+            KeyError: no station for the event, or no category for the station, the same as the pickle
+
+        Returns:
+            np.ndarray: the rows with category, left, right and cc
+        """
+        rows = self.rows(event, station)
+        if len(rows) == 0:
+            raise KeyError(f"no windows for {event} {station}")
+        if category is not None:
+            rows = rows[rows["category"] == category.encode()]
+            if len(rows) == 0:
+                raise KeyError(
+                    f"no {category} windows for {event} {station}")
+        # the NaN rows only mark the categories without windows
+        return rows[~np.isnan(rows["left"])]
+
+
+@cache
+def get_traveltime_table(path: str) -> TraveltimeTable:
+    return TraveltimeTable(path)
+
+
+@cache
+def get_window_table(path: str) -> WindowTable:
+    return WindowTable(path)
@@ -0,0 +1,152 @@
+"""
+volcano.py
+
+parse the volcano catalogue once into a structured array, cached by the fingerprint of the tsv,
+with vectorised bbox and country filters and the query of the volcanoes near a profile track.
+"""
+import re
+from functools import cache
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from eara2022 import resource
+from eara2022.instrument import profiled
+
+from .cache import file_fingerprint, load_cache, save_cache
+
+VOLCANO_DTYPE = np.dtype([("name", "U64"), ("country", "U48"), ("lat", "f8"),
+                         ("lon", "f8"), ("elevation", "f8")])
+EARTH_RADIUS_KM = 6371.
+
+
+class VolcanoStore:
+    """The volcanoes as a structured array of name, country, lat, lon and elevation
+
+    The filters return a new store, so they can be chained, such as store.exclude_countries([...]).bbox(...)
+    """
+
+    def __init__(self, volcanoes: np.ndarray) -> None:
+        self.volcanoes = volcanoes
+
+    @classmethod
+    def from_tsv(cls, volcano_path: str) -> "VolcanoStore":
+        """parse the tsv with "Name" "Country" "Type" lat lon elevation columns
+
+        Args:
+            volcano_path (str): the tsv path
+
+        Returns:
+            VolcanoStore: the store
+        """
+        pattern = re.compile(
+            r""""([^"]*)"\s+"([^"]*)"\s+"[^"]*"\s+(-?\d+\.?\d*)\s+(-?\d+\.?\d*)\s+(-?\d+\.?\d*)""")
+        rows = []
+        with open(volcano_path, "r") as f:
+            for each_line in f:
+                thefind = pattern.search(each_line)
+                if thefind is not None:
+                    name, country, lat, lon, elevation = thefind.groups()
+                    rows.append((name, country, float(lat),
+                                float(lon), float(elevation)))
+        return cls(np.array(rows, dtype=VOLCANO_DTYPE))
+
+    def __len__(self) -> int:
+        return len(self.volcanoes)
+
+    @property
+    def lats(self) -> np.ndarray:
+        return self.volcanoes["lat"]
+
+    @property
+    def lons(self) -> np.ndarray:
+        return self.volcanoes["lon"]
+
+    def bbox(self, lon_min: float = -180, lon_max: float = 360, lat_min: float = -90, lat_max: float = 90) -> "VolcanoStore":
+        """the volcanoes inside the bounding box, the bounds are included
+
+        Returns:
+            VolcanoStore: the filtered store
+        """
+        lons, lats = self.lons, self.lats
+        return VolcanoStore(self.volcanoes[(lons >= lon_min) & (lons <= lon_max) & (lats >= lat_min) & (lats <= lat_max)])
+
+    def countries(self, countries: Sequence[str]) -> "VolcanoStore":
+        """the volcanoes in the countries
+
+        Args:
+            countries (Sequence[str]): the country names
+
+        Returns:
+            VolcanoStore: the filtered store
+        """
+        return VolcanoStore(self.volcanoes[np.isin(self.volcanoes["country"], list(countries))])
+
+    def exclude_countries(self, countries: Sequence[str]) -> "VolcanoStore":
+        """the volcanoes not in the countries
+
+        Args:
+            countries (Sequence[str]): the country names
+
+        Returns:
+            VolcanoStore: the filtered store
+        """
+        return VolcanoStore(self.volcanoes[~np.isin(self.volcanoes["country"], list(countries))])
+
+    @profiled("volcano.VolcanoStore.near_track")
+    def near_track(self, lons: np.ndarray, lats: np.ndarray, max_distance: float) -> Tuple["VolcanoStore", np.ndarray, np.ndarray]:
+        """the volcanoes within max_distance km to the track, such as the track from pygmt.project
+
+        Args:
+            lons (np.ndarray): the lons of the track points
+            lats (np.ndarray): the lats of the track points
+            max_distance (float): the max distance to the nearest track point in km
+
+        Returns:
+            Tuple[VolcanoStore, np.ndarray, np.ndarray]: the volcanoes, the index of their nearest track points,
+                and the distances to the track in km
+        """
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        # only the volcanoes near the bounding box of the track are compared with each point
+        margin = np.rad2deg(max_distance/EARTH_RADIUS_KM)
+        lon_margin = margin / \
+            max(np.cos(np.deg2rad(np.abs(lats).max()+margin)), 1e-3)
+        candidates = self.bbox(lons.min()-lon_margin, lons.max()+lon_margin,
+                               lats.min()-margin, lats.max()+margin)
+        if len(candidates) == 0:
+            return candidates, np.zeros(0, dtype=int), np.zeros(0)
+        # the haversine distance between each candidate and each track point
+        vol_lats = np.deg2rad(candidates.lats)[:, None]
+        vol_lons = np.deg2rad(candidates.lons)[:, None]
+        track_lats = np.deg2rad(lats)[None, :]
+        track_lons = np.deg2rad(lons)[None, :]
+        hav = np.sin((track_lats-vol_lats)/2)**2 + \
+            np.cos(vol_lats)*np.cos(track_lats) * \
+            np.sin((track_lons-vol_lons)/2)**2
+        distances = 2*EARTH_RADIUS_KM*np.arcsin(np.sqrt(np.clip(hav, 0, 1)))
+        nearest = distances.argmin(axis=1)
+        min_distances = distances[np.arange(len(candidates)), nearest]
+        keep = min_distances <= max_distance
+        return VolcanoStore(candidates.volcanoes[keep]), nearest[keep], min_distances[keep]
+
+
+@cache
+def get_volcano_store(volcano_path: Optional[str] = None) -> VolcanoStore:
+    """get the shared volcano store, the tsv is only parsed when it changes
+
+    Args:
+        volcano_path (Optional[str], optional): the tsv path. Defaults to Volcanoes/volcanoes.tsv.
+
+    Returns:
+        VolcanoStore: the store of all the volcanoes
+    """
+    if volcano_path is None:
+        volcano_path = resource(
+            ["Volcanoes", "volcanoes.tsv"], normal_path=True)
+    cache_name = f"volcanoes_{file_fingerprint(volcano_path)}"
+    loaded = load_cache(cache_name)
+    if loaded is not None:
+        return VolcanoStore(loaded)
+    store = VolcanoStore.from_tsv(volcano_path)
+    save_cache(file_name=cache_name, content=store.volcanoes)
+    return store
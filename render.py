@@ -0,0 +1,70 @@
+"""
+render.py
+
+the thin client of the render daemon started by `python run.py --daemon`. only the standard library is imported,
+so a request costs milliseconds before the daemon starts rendering.
+
+python render.py [--set key=value ...] [--sampling=native|auto] [script name]
+python render.py --clear | --stop
+"""
+import json
+import socket
+import sys
+import tempfile
+from os import getuid
+from os.path import join
+
+# the same as DEFAULT_SOCKET in eara2022.utils.daemon
+DEFAULT_SOCKET = join(tempfile.gettempdir(), f"eara2022-render-{getuid()}.sock")
+
+
+def parse_value(value: str):
+    # the values are json if possible, such as numbers and lists, otherwise strings
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+def send_request(request: dict, socket_path: str = DEFAULT_SOCKET) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps(request)+"\n").encode())
+        with client.makefile("r") as f:
+            return json.loads(f.readline())
+
+
+def main():
+    args = sys.argv[1:]
+    if args in [["--clear"], ["--stop"]]:
+        request = {"command": args[0][2:]}
+    else:
+        request, names = {"conf": {}}, []
+        while len(args) != 0:
+            arg = args.pop(0)
+            if arg == "--set" and len(args) != 0:
+                key, value = args.pop(0).split("=", 1)
+                request["conf"][key] = parse_value(value)
+            elif arg.startswith("--sampling="):
+                request["sampling"] = arg[len("--sampling="):]
+            else:
+                names.append(arg)
+        if len(names) != 1:
+            raise Exception(
+                "correct format: python render.py [--set key=value ...] [--sampling=native|auto] [script name]")
+        request["script"] = names[0]
+    try:
+        response = send_request(request)
+    except (FileNotFoundError, ConnectionRefusedError):
+        raise Exception(
+            f"no render daemon on {DEFAULT_SOCKET}, start it by python run.py --daemon")
+    if not response["ok"]:
+        raise Exception(response["error"])
+    for output in response.get("outputs", []):
+        print(output)
+    if "seconds" in response:
+        print(f"Rendered {request['script']} in {response['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
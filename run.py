@@ -1,4 +1,16 @@
 from eara2022.scripts import *
+from eara2022.instrument import PROFILER, instrument_pygmt, phase
+from eara2022.utils.ehb_catalog import ingest_ehb_catalog
+from eara2022.utils.layer_stats import build_eara2021_1d_ref
+from eara2022.utils.model_registry import convert_model_files
+from eara2022.utils.build import BuildManifest, figure_fingerprint, script_outputs
+from eara2022.utils.daemon import serve_daemon
+from eara2022.utils.sampling import get_sampling_mode, set_sampling_mode
+from eara2022.scripts.slab_base import compute_slab_plans, render_slab_family
+from eara2022.scripts.con_base import compute_con_plans, render_con_family
+from eara2022.scripts.vol_base import compute_vol_plans, render_vol_family
+from eara2022.scripts.changbaishan_models_base import plot_family as changbaishan_plot_family
+from os.path import abspath, dirname, join
 import sys
 
 scripts_mapper = {
@@ -46,19 +58,128 @@ scripts_mapper = {
 }
 
 
+def slab_plans_main() -> None:
+    # the plans of all the slab figures, so they are only rendered in the later runs
+    compute_slab_plans([scripts_mapper[key].keywords["conf"]
+                       for key in scripts_mapper if key.startswith("slab_")])
+
+
+def con_plans_main() -> None:
+    # the plans of all the con figures
+    compute_con_plans([scripts_mapper[key].keywords["conf"]
+                      for key in scripts_mapper if key.startswith("con_")])
+
+
+def vol_plans_main() -> None:
+    # the plans of all the vol figures
+    compute_vol_plans([scripts_mapper[key].keywords["conf"]
+                      for key in scripts_mapper if key.startswith("vol_")])
+
+
+def slab_family_main() -> None:
+    # the six slab figures in one pass, the layers not depending on the model are shared
+    render_slab_family([scripts_mapper[key].keywords["conf"]
+                       for key in scripts_mapper if key.startswith("slab_")])
+
+
+def con_family_main() -> None:
+    # the con figures in one pass, the layers not depending on the model are shared
+    render_con_family([scripts_mapper[key].keywords["conf"]
+                      for key in scripts_mapper if key.startswith("con_")])
+
+
+def vol_family_main() -> None:
+    # the vol figures in one pass
+    render_vol_family([scripts_mapper[key].keywords["conf"]
+                      for key in scripts_mapper if key.startswith("vol_")])
+
+
+def changbaishan_family_main() -> None:
+    # the six changbaishan model figures in one pass
+    changbaishan_plot_family([scripts_mapper[key].keywords
+                              for key in scripts_mapper if key.startswith("changbaishan_models_")])
+
+
+# * scripts not included in all, such as the batch QC figures
+extra_scripts_mapper = {
+    'waveform_batch': waveform_batch_main,
+    'waveform_tables': waveform_tables_main,
+    'ehb_ingest': ingest_ehb_catalog,
+    'eara2021_1d_ref': build_eara2021_1d_ref,
+    'slab_plans': slab_plans_main,
+    'con_plans': con_plans_main,
+    'vol_plans': vol_plans_main,
+    'model_layouts': convert_model_files,
+    'slab_family': slab_family_main,
+    'con_family': con_family_main,
+    'vol_family': vol_family_main,
+    'changbaishan_family': changbaishan_family_main,
+}
+
+
+def run_script(name: str, profile: bool = False) -> None:
+    script = scripts_mapper[name] if name in scripts_mapper else extra_scripts_mapper[name]
+    if not profile:
+        script()
+        return
+    PROFILER.reset()
+    with phase(name):
+        script()
+    report_path = PROFILER.write_report(
+        name, join(dirname(abspath(__file__)), "fig", "profile"))
+    print(f"Profile of {name} is written to {report_path}")
+
+
+def build_script(name: str, manifest: BuildManifest, memo: dict, profile: bool = False) -> None:
+    # * only run the script when the fingerprint of its inputs, configuration and source changed
+    script = scripts_mapper[name]
+    fingerprint = figure_fingerprint(
+        script, {"sampling": get_sampling_mode()}, memo)
+    if manifest.is_current(name, fingerprint, script_outputs(script, join(dirname(abspath(__file__)), "fig"), name)):
+        print(f"Skip {name}, it is up to date")
+        return
+    print(f"Plot {name} now...")
+    run_script(name, profile)
+    manifest.record(name, fingerprint)
+
+
 def main():
-    if len(sys.argv) == 2:
-        if sys.argv[1] == "all" or (sys.argv[1] in scripts_mapper):
-            if sys.argv[1] != 'all':
-                scripts_mapper[sys.argv[1]]()
+    args = sys.argv[1:]
+    profile = "--profile" in args
+    if profile:
+        args.remove("--profile")
+        PROFILER.enabled = True
+        instrument_pygmt()
+    # * --sampling=auto samples the cross sections by the output pixels, the default native is the original sampling
+    for arg in [each for each in args if each.startswith("--sampling=")]:
+        args.remove(arg)
+        set_sampling_mode(arg[len("--sampling="):])
+    # * --daemon keeps the scripts warm behind a unix socket, the figures are requested by render.py
+    if "--daemon" in args:
+        serve_daemon({**scripts_mapper, **extra_scripts_mapper})
+        return
+    # * --incremental skips the figures whose inputs and code are unchanged since the last build
+    incremental = "--incremental" in args
+    if incremental:
+        args.remove("--incremental")
+        manifest, memo = BuildManifest(), {}
+    if len(args) == 1:
+        if args[0] == "all" or (args[0] in scripts_mapper) or (args[0] in extra_scripts_mapper):
+            if incremental and args[0] in scripts_mapper:
+                build_script(args[0], manifest, memo, profile)
+            elif args[0] != 'all':
+                run_script(args[0], profile)
+            elif incremental:
+                for key in scripts_mapper:
+                    build_script(key, manifest, memo, profile)
             else:
                 for key in scripts_mapper:
                     print(f"Plot {key} now...")
-                    scripts_mapper[key]()
+                    run_script(key, profile)
         else:
-            raise Exception(f"scripts {sys.argv[1]} is not supported!")
+            raise Exception(f"scripts {args[0]} is not supported!")
     else:
-        raise Exception("correct format: python run.py [script name]")
+        raise Exception("correct format: python run.py [--daemon] | [--profile] [--incremental] [--sampling=native|auto] [script name]")
 
 
 if __name__ == "__main__":